@@ -27,6 +27,19 @@ APP_VERSION = "v1"
 
 STATUS_CHECK = {"id": "WP4966", "index": "mygeneset_current"}
 
+# Seconds during which the geneset counts of /metadata are served from memory
+METADATA_STATS_TTL = 60
+
+# Seconds between checks for a new build of the curated genesets (alias lookups)
+CURATED_BUILD_CHECK_INTERVAL = 60
+# Seconds between checks of /enrich for a new build of the curated genesets to load
+ENRICH_INDEX_CHECK_INTERVAL = 600
+
+# Largest total size in bytes of the /geneset and /query responses cached in memory
+RESPONSE_CACHE_MAX_BYTES = 128 * 1024 * 1024
+# Seconds during which responses that can include user genesets are cached
+RESPONSE_CACHE_USER_TTL = 60
+
 
 # *****************************************************************************
 # Query Customizations
@@ -41,7 +54,12 @@ APP_LIST += [
     (r"/{ver}/query/?", "web.handlers.api.MyGenesetQueryHandler"),
     (r"/{pre}/{ver}/{typ}(?:/([^/]+))?/?", "web.handlers.api.MyGenesetBiothingHandler"),
     (r"/{ver}/user_geneset/?", "web.handlers.api.UserGenesetHandler"),
+    (r"/{ver}/user_geneset/bulk/?", "web.handlers.api.UserGenesetBulkHandler"),
     (r"/{ver}/user_geneset/([^/]+)/?", "web.handlers.api.UserGenesetHandler"),
+    (r"/{ver}/enrich/?", "web.handlers.api.MyGenesetEnrichHandler"),
+    (r"/{ver}/gene2genesets/?", "web.handlers.api.MyGenesetGene2GenesetsHandler"),
+    (r"/{ver}/geneset/([^/]+)/similar/?", "web.handlers.api.MyGenesetSimilarHandler"),
+    (r"/{ver}/similar/?", "web.handlers.api.MyGenesetSimilarHandler"),
     (r"/user_info", "web.handlers.login.UserInfoHandler"),
     (r"/xsrf_token", "xsrf.XSRFToken"),
     (r"/logout", "web.handlers.login.LogoutHandler"),
@@ -111,16 +129,31 @@ INCLUDE_TYPEDEF = {
     }
 }
 
+GENE_FORMAT_TYPEDEF = {
+    "gene_format": {
+        "type": str,
+        "default": "full",
+        "enum": ("full", "summary", "ids"),
+    },
+    "gene_sample": {
+        "type": int,
+        "default": 10,
+        "max": 100,
+    },
+}
+
 ANNOTATION_DEFAULT_SCOPES = ["_id"]
 ANNOTATION_KWARGS = copy.deepcopy(ANNOTATION_KWARGS)
 ANNOTATION_KWARGS["*"].update(SPECIES_TYPEDEF)
 ANNOTATION_KWARGS["*"].update(SOURCE_TYPEDEF)
 ANNOTATION_KWARGS["*"].update(INCLUDE_TYPEDEF)
+ANNOTATION_KWARGS["*"].update(GENE_FORMAT_TYPEDEF)
 
 QUERY_KWARGS = copy.deepcopy(QUERY_KWARGS)
 QUERY_KWARGS["*"].update(SPECIES_TYPEDEF)
 QUERY_KWARGS["*"].update(SOURCE_TYPEDEF)
 QUERY_KWARGS["*"].update(INCLUDE_TYPEDEF)
+QUERY_KWARGS["*"].update(GENE_FORMAT_TYPEDEF)
 QUERY_KWARGS["*"]["_source"]["default"] = [
     "_id",
     "genes",
@@ -133,8 +166,49 @@ QUERY_KWARGS["*"]["_source"]["default"] = [
 ]
 QUERY_KWARGS["POST"]["scopes"]["default"] = ["_id", "name"]
 
+ENRICH_KWARGS = {
+    "POST": {
+        "genes": {"type": list, "required": True, "max": 1000},
+        "species": {
+            "type": str,
+            "required": True,
+            "translations": SPECIES_TYPEDEF["species"]["translations"],
+        },
+        "source": {"type": list, "default": ["all"], "max": 1000},
+        "max_fdr": {"type": float, "default": 0.05},
+        "size": {"type": int, "default": 100, "max": 1000},
+    }
+}
+
+GENE2GENESETS_KWARGS = {
+    "*": {
+        "ids": {"type": list, "required": True, "max": 5000},
+        "scopes": {
+            "type": list,
+            "default": ["mygene_id", "symbol", "ensemblgene", "uniprot"],
+            "max": 4,
+        },
+        "species": SPECIES_TYPEDEF["species"],
+        "source": SOURCE_TYPEDEF["source"],
+        "include": {"type": str, "default": "all", "enum": ("all", "curated", "user")},
+    }
+}
+
+SIMILAR_KWARGS = {
+    "*": {
+        "source": SOURCE_TYPEDEF["source"],
+        "min_jaccard": {"type": float, "default": 0.2, "min": 0, "max": 1},
+        "size": {"type": int, "default": 10, "max": 1000},
+    },
+    "POST": {
+        "genes": {"type": list, "required": True, "max": 5000},
+        "species": ENRICH_KWARGS["POST"]["species"],
+    },
+}
+
 ES_QUERY_BUILDER = "web.pipeline.MyGenesetQueryBuilder"
 ES_QUERY_BACKEND = "web.engine.MyGenesetQueryBackend"
+ES_RESULT_TRANSFORM = "web.pipeline.MyGenesetResultFormatter"
 
 # Authentication providers for BiothingsAuthnMixin
 AUTHN_PROVIDERS = [(UserCookieAuthProvider, {})]
@@ -150,6 +224,8 @@ ORCID_CLIENT_SECRET = ""
 
 # User geneset settings
 MAX_GENESET_SIZE = 2000
+# Largest number of genesets created or updated by one POST /user_geneset/bulk request
+USER_GENESET_BULK_MAX_SIZE = 1000
 
 # Web Server Hostname
 # http://localhost:8000 for dev or https://mygeneset.info for prod
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for the CTD plugin, run locally as a standalone script:
+
+    python benchmark.py [n_rows] [filename]
+
+A synthetic "CTD_chem_gene_ixns.tsv" with `n_rows` interactions (10 million
+by default) is written to `filename` (in a temporary folder by default) and
+parsed by the line-by-line reader and by `get_ctd_genesets()`, to compare
+their run time and memory use (RSS, each reader in its own process). No
+mygene.info queries are sent.
+"""
+
+import gc
+import gzip
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append("../../")
+
+import config  # noqa: F401
+
+# Importing the hub loads the local "config.py" as `biothings.config`,
+# the same way the plugin is imported when run by the hub.
+import biothings.hub  # noqa: F401
+
+import parser as ctd_parser
+from utils import dataload
+
+# Organisms in the synthetic file: most rows are from plugin organisms,
+# the others are filtered out.
+SYNTHETIC_ORGANISMS = [
+    ("Homo sapiens", "9606", 40),
+    ("Mus musculus", "10090", 20),
+    ("Rattus norvegicus", "10116", 20),
+    ("Danio rerio", "7955", 5),
+    ("Sus scrofa", "9823", 10),
+    ("Bos taurus", "9913", 5),
+]
+SYNTHETIC_GENE_FORMS = ["protein", "mRNA", "gene", "protein|mRNA", "mRNA|protein"]
+
+
+def write_synthetic_file(filename, n_rows, n_chemicals=20000, n_genes=30000, seed=0):
+    """Write a synthetic chemical–gene interactions file with `n_rows` rows."""
+    rng = random.Random(seed)
+    chemicals = [
+        (f"Chemical {i}", f"D{i:06d}", f"{i}-{i % 97:02d}-{i % 10}" if i % 3 else "")
+        for i in range(n_chemicals)
+    ]
+    organisms = [(name, tax_id) for name, tax_id, weight in SYNTHETIC_ORGANISMS for _ in range(weight)]
+    # Interactions with the same chemical come in runs, as in CTD.
+    with open(filename, "w", buffering=1 << 20) as fh:
+        fh.write("# Comparative Toxicogenomics Database (CTD)\n")
+        fh.write("# Report created: Mon Jan 01 00:00:00 EST 2024\n")
+        fh.write("#\n")
+        rows = 0
+        while rows < n_rows:
+            # A few chemicals have many interactions, most have a few.
+            chemical_name, chemical_id, cas_rn = chemicals[int(n_chemicals * rng.random() ** 3)]
+            for _ in range(min(rng.randint(1, 50), n_rows - rows)):
+                organism, tax_id = rng.choice(organisms)
+                gene_id = str(rng.randrange(1, n_genes))
+                fh.write(
+                    "\t".join(
+                        [
+                            chemical_name,
+                            chemical_id,
+                            cas_rn,
+                            f"GENE{gene_id}",
+                            gene_id,
+                            rng.choice(SYNTHETIC_GENE_FORMS),
+                            organism,
+                            tax_id,
+                            f"{chemical_name} results in increased expression of GENE{gene_id} protein",
+                            "increases^expression",
+                            str(rng.randrange(10000000, 40000000)),
+                        ]
+                    )
+                    + "\n"
+                )
+                rows += 1
+        # A malformed line, which is skipped
+        fh.write("Chemical 0\tD000000\n")
+
+
+def legacy_get_ctd_genesets(filename):
+    """Line-by-line reader that `get_ctd_genesets()` used before parsing in blocks."""
+    ctd_genesets = dict()
+    with open(filename) as fh:
+        for row in fh:
+            if row.startswith("#"):
+                continue
+            tokens = row.strip("\n").split("\t")
+            if len(tokens) != 11:
+                continue
+            tax_id = tokens[7].strip()
+            if tax_id not in ctd_parser.organisms:
+                continue
+            chemical_name = tokens[0].strip()
+            chemical_id = tokens[1].strip()
+            gene_id = tokens[4].strip()
+            entity_type = tokens[5].strip()
+            if entity_type not in ["gene", "protein"]:
+                continue
+            cas_rn = tokens[2].strip()
+            if len(cas_rn) == 0:
+                cas_rn = None
+            if tax_id not in ctd_genesets:
+                ctd_genesets[tax_id] = {"unique_genes": set(), "genesets": dict()}
+            ctd_genesets[tax_id]["unique_genes"].add(gene_id)
+            if chemical_id in ctd_genesets[tax_id]["genesets"]:
+                ctd_genesets[tax_id]["genesets"][chemical_id]["genes"].add(gene_id)
+            else:
+                ctd_genesets[tax_id]["genesets"][chemical_id] = {
+                    "chemical_name": chemical_name,
+                    "cas_rn": cas_rn,
+                    "genes": {gene_id},
+                }
+    return ctd_genesets
+
+
+def as_sets(ctd_genesets):
+    """Convert `get_ctd_genesets()` results to the format of `legacy_get_ctd_genesets()`."""
+    return {
+        tax_id: {
+            "unique_genes": set(organism_genesets.genes),
+            "genesets": {
+                chemical_id: {
+                    "chemical_name": organism_genesets.chemical_names[i],
+                    "cas_rn": organism_genesets.cas_rns[i],
+                    "genes": set(organism_genesets.get_genes(i)),
+                }
+                for i, chemical_id in enumerate(organism_genesets.chemical_ids)
+            },
+        }
+        for tax_id, organism_genesets in ctd_genesets.items()
+    }
+
+
+def bench_parsing(filename):
+    print("CTD parsing")
+    size = os.path.getsize(filename) / 2**20
+    readers = [("line by line", legacy_get_ctd_genesets)]
+    readers.append(("blocks", lambda filename: ctd_parser.get_ctd_genesets(filename)))
+    n_processes = os.cpu_count() or 1
+    if n_processes > 1:
+        readers.append(
+            (
+                f"{n_processes} processes",
+                lambda filename: ctd_parser.get_ctd_genesets(filename, processes=n_processes),
+            )
+        )
+
+    results = {}
+    for label, get_ctd_genesets in readers:
+        t0 = time.perf_counter()
+        ctd_genesets = get_ctd_genesets(filename)
+        elapsed = time.perf_counter() - t0
+        results[label] = ctd_genesets if label == "line by line" else as_sets(ctd_genesets)
+        n_genesets = sum(len(data["genesets"]) for data in results[label].values())
+        print(f"  {label:<14} {elapsed:8.3f}s  {size / elapsed:6.1f} MiB/s  {n_genesets} genesets")
+
+    expected = results.pop("line by line")
+    for label, ctd_genesets in results.items():
+        assert ctd_genesets == expected, f"Genesets differ: {label}"
+    print("  Genesets are identical.")
+
+
+def current_rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize()
+
+
+def peak_rss():
+    # Unlike ru_maxrss, VmHWM isn't inherited from the parent process
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) * 1024
+
+
+def measure_rss(reader, filename):
+    """Print the RSS held by the genesets of `reader`, and the peak RSS of the process."""
+    get_ctd_genesets = {"sets": legacy_get_ctd_genesets, "csr": ctd_parser.get_ctd_genesets}[reader]
+    gc.collect()
+    baseline = current_rss()
+    ctd_genesets = get_ctd_genesets(filename)
+    gc.collect()
+    held = current_rss() - baseline
+    print(held, peak_rss())
+    return ctd_genesets
+
+
+def bench_memory(filename):
+    print("Memory (RSS)")
+    # Each reader runs in a new process, so that memory freed by one isn't
+    # reused by the other.
+    for label, reader in [("sets", "sets"), ("CSR arrays", "csr")]:
+        output = subprocess.run(
+            [sys.executable, __file__, "--rss", reader, filename],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        held, peak = map(int, output.split()[-2:])
+        print(f"  {label:<14} genesets {held / 2**20:8.1f} MiB  peak {peak / 2**20:8.1f} MiB")
+
+
+def bench_compressed(filename, tmp_dir):
+    print("Compressed input")
+    gz_filename = os.path.join(tmp_dir, "CTD_chem_gene_ixns.tsv.gz")
+    with open(filename, "rb") as in_f, gzip.open(gz_filename, "wb", compresslevel=6) as out_f:
+        shutil.copyfileobj(in_f, out_f, 1 << 20)
+
+    def uncompress_then_parse():
+        # What the dumper did with "uncompress": true
+        tsv_filename = os.path.join(tmp_dir, "uncompressed.tsv")
+        with gzip.open(gz_filename, "rb") as in_f, open(tsv_filename, "wb") as out_f:
+            shutil.copyfileobj(in_f, out_f, 1 << 20)
+        try:
+            return ctd_parser.get_ctd_genesets(tsv_filename)
+        finally:
+            os.remove(tsv_filename)
+
+    def parse_gz(igzip_threaded):
+        def parse():
+            dataload.igzip_threaded, default = igzip_threaded, dataload.igzip_threaded
+            try:
+                return ctd_parser.get_ctd_genesets(gz_filename)
+            finally:
+                dataload.igzip_threaded = default
+
+        return parse
+
+    readers = [("uncompress", uncompress_then_parse), ("gzip stream", parse_gz(None))]
+    if dataload.igzip_threaded is not None:
+        readers.append(("isal stream", parse_gz(dataload.igzip_threaded)))
+
+    results = {}
+    for label, parse in readers:
+        t0 = time.perf_counter()
+        results[label] = parse()
+        print(f"  {label:<14} {time.perf_counter() - t0:8.3f}s")
+
+    expected = as_sets(results.pop("uncompress"))
+    for label, ctd_genesets in results.items():
+        assert as_sets(ctd_genesets) == expected, f"Genesets differ: {label}"
+    print("  Genesets are identical.")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--rss"]:
+        measure_rss(*sys.argv[2:4])
+        sys.exit()
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        filename = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tmp_dir, "CTD_chem_gene_ixns.tsv")
+        if not os.path.exists(filename):
+            t0 = time.perf_counter()
+            write_synthetic_file(filename, n_rows)
+            print(f"Wrote {n_rows} rows to {filename} in {time.perf_counter() - t0:.1f}s")
+        bench_parsing(filename)
+        bench_memory(filename)
+        bench_compressed(filename, tmp_dir)
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
 import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from biothings.utils.dataload import dict_sweep, unlist
+from pyarrow import csv as pa_csv
 
 if __name__ == "__main__":
     # Run locally as a standalone script
@@ -22,6 +28,7 @@ else:
 
     logging = config.logger
 
+from utils.dataload import open_binary
 from utils.mygene_lookup import MyGeneLookup
 
 # Organisms (key is species taxonomy ID, value is species common name)
@@ -38,7 +45,182 @@ organisms = {
 }
 
 
-def get_ctd_genesets(filename):
+# Columns of "CTD_chem_gene_ixns.tsv" read by `parse_ctd_block()`
+CTD_COLUMNS = 11
+CTD_USECOLS = {
+    0: "chemical_name",
+    1: "chemical_id",
+    2: "cas_rn",
+    4: "gene_id",
+    5: "gene_forms",
+    7: "tax_id",
+}
+# Interactions with these gene forms are kept
+CTD_GENE_FORMS = ["gene", "protein"]
+# Size in bytes of the blocks of lines parsed at once
+CTD_BLOCK_SIZE = 16 << 20
+
+
+def iter_ctd_blocks(fh, block_size=CTD_BLOCK_SIZE):
+    """
+    Generator that reads the binary file object `fh` in blocks of complete
+    lines of about `block_size` bytes, and yields (line number of the first
+    line, block) tuples.
+    """
+    row_num = 1
+    while True:
+        block = fh.read(block_size)
+        if not block:
+            break
+        if not block.endswith(b"\n"):
+            block += fh.readline()
+        yield row_num, block
+        row_num += block.count(b"\n")
+
+
+def parse_ctd_block(block, row_num=1):
+    """
+    Parse a block of lines from `iter_ctd_blocks()` column-wise, and return
+    an Arrow table of the unique (tax_id, chemical_id, gene_id) rows of the
+    organisms in `organisms` (see `unique_interactions()`). Comment lines and
+    lines with the wrong number of columns are skipped.
+    """
+
+    def skip_invalid_row(row):
+        if not row.text.startswith("#"):
+            line_num = row_num + row.number - 1
+            logging.warning(f"Line #{line_num} has {row.actual_columns} columns, skipped")
+        return "skip"
+
+    column_names = [CTD_USECOLS.get(i, f"column_{i}") for i in range(CTD_COLUMNS)]
+    table = pa_csv.read_csv(
+        pa.py_buffer(block),
+        read_options=pa_csv.ReadOptions(column_names=column_names, use_threads=False),
+        parse_options=pa_csv.ParseOptions(
+            delimiter="\t", quote_char=False, invalid_row_handler=skip_invalid_row
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(CTD_USECOLS.values()),
+            column_types={name: pa.string() for name in CTD_USECOLS.values()},
+            strings_can_be_null=False,
+        ),
+    )
+    # Filter and strip the columns in Arrow, before building Python objects
+    columns = {name: pc.utf8_trim_whitespace(table[name]) for name in CTD_USECOLS.values()}
+    keep = pc.and_(
+        pc.is_in(columns["tax_id"], value_set=pa.array(list(organisms))),
+        pc.is_in(columns["gene_forms"], value_set=pa.array(CTD_GENE_FORMS)),
+    )
+    # Skip comment lines that happen to have 11 columns
+    keep = pc.and_not(keep, pc.starts_with(table["chemical_name"], "#"))
+    del columns["gene_forms"]
+    return unique_interactions(pa.table(columns).filter(keep))
+
+
+def unique_interactions(table):
+    """
+    Return the unique (tax_id, chemical_id, gene_id) rows of `table`, in the
+    order of their first row, with the chemical name and CAS RN of that row.
+    """
+    # Ordered aggregations ("first") need use_threads=False
+    table = table.group_by(["tax_id", "chemical_id", "gene_id"], use_threads=False).aggregate(
+        [("chemical_name", "first"), ("cas_rn", "first")]
+    )
+    return table.rename_columns(
+        ["tax_id", "chemical_id", "gene_id", "chemical_name", "cas_rn"]
+    )
+
+
+def iter_parsed_blocks(filename, processes=1):
+    """
+    Generator that yields the `parse_ctd_block()` result of each block of
+    `filename`, in file order. With `processes` > 1, blocks are parsed in a
+    process pool, with at most 2 blocks per process waiting in memory.
+    A ".gz" file is decompressed as it is read.
+    """
+    with open_binary(filename) as fh:
+        blocks = iter_ctd_blocks(fh)
+        if processes <= 1:
+            for row_num, block in blocks:
+                yield parse_ctd_block(block, row_num)
+            return
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            pending = deque()
+            for row_num, block in blocks:
+                pending.append(executor.submit(parse_ctd_block, block, row_num))
+                if len(pending) >= 2 * processes:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+class OrganismGenesets:
+    """
+    CTD genesets of one organism, with gene membership stored in CSR form:
+    the genes of the i-th chemical are `genes[gene_idx[offsets[i]:offsets[i + 1]]]`.
+
+    Attributes:
+        genes (list): Unique gene ids (str) of the organism, in file order.
+        chemical_ids (list): Chemical ids (str), in file order.
+        chemical_names (list): Chemical name of each chemical.
+        cas_rns (list): CAS RN of each chemical, or None.
+        offsets (numpy.ndarray): Start of the genes of each chemical in
+            `gene_idx`, with one more value for the end of the last one.
+        gene_idx (numpy.ndarray): Positions in `genes` of the genes of each
+            chemical.
+    """
+
+    __slots__ = ("genes", "chemical_ids", "chemical_names", "cas_rns", "offsets", "gene_idx")
+
+    def __init__(self, genes, chemical_ids, chemical_names, cas_rns, offsets, gene_idx):
+        self.genes = genes
+        self.chemical_ids = chemical_ids
+        self.chemical_names = chemical_names
+        self.cas_rns = cas_rns
+        self.offsets = offsets
+        self.gene_idx = gene_idx
+
+    @classmethod
+    def from_table(cls, table):
+        """
+        Build the genesets from an Arrow table of (chemical_id, gene_id) rows
+        of one organism, in file order (see `unique_interactions()`). Rows from
+        different blocks may repeat the same pair.
+        """
+        # Integer codes of chemicals and genes, numbered in file order
+        chemicals = table["chemical_id"].combine_chunks().dictionary_encode()
+        genes = table["gene_id"].combine_chunks().dictionary_encode()
+        chemical_codes = chemicals.indices.to_numpy()
+        gene_codes = genes.indices.to_numpy()
+        n_chemicals = len(chemicals.dictionary)
+
+        # The chemical name and CAS RN come from the first row of each chemical
+        _, first_rows = np.unique(chemical_codes, return_index=True)
+        # Unique (chemical, gene) pairs, sorted by chemical and then gene code
+        pairs = chemical_codes.astype(np.int64) * len(genes.dictionary) + gene_codes
+        pairs = np.unique(pairs)
+        offsets = np.zeros(n_chemicals + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs // len(genes.dictionary), minlength=n_chemicals), out=offsets[1:])
+        return cls(
+            genes=genes.dictionary.to_pylist(),
+            chemical_ids=chemicals.dictionary.to_pylist(),
+            chemical_names=table["chemical_name"].take(first_rows).to_pylist(),
+            cas_rns=[cas_rn or None for cas_rn in table["cas_rn"].take(first_rows).to_pylist()],
+            offsets=offsets,
+            gene_idx=(pairs % len(genes.dictionary)).astype(np.int32),
+        )
+
+    def __len__(self):
+        return len(self.chemical_ids)
+
+    def get_genes(self, i):
+        """Return the gene ids (str) of the i-th chemical."""
+        genes = self.genes
+        return [genes[j] for j in self.gene_idx[self.offsets[i] : self.offsets[i + 1]].tolist()]
+
+
+def get_ctd_genesets(filename, processes=1):
     """
     Reads the chemical–gene interactions tsv file, which includes 11 fields:
       (0)  ChemicalName
@@ -53,99 +235,65 @@ def get_ctd_genesets(filename):
       (9)  InteractionActions ('|'-delimited list)
       (10) PubMedIDs ('|'-delimited list)
 
-    and returns the genetsets as a dict in this format:
-      {
-          tax_id: {
-              'unique_genes': set,
-              'genesets': {
-                   chemical_id: {
-                       'chemical_name': str,
-                       'genes': set,
-                       'cas_rn': str,
-                   },
-                   ... ...
-              }
-          }
-      }
+    and returns the genetsets as a dict of tax_id to `OrganismGenesets`,
+    in file order.
+
+    The file is parsed in blocks (see `parse_ctd_block()`), optionally by
+    `processes` worker processes.
     """
+    parsed = list(iter_parsed_blocks(filename, processes))
+    if not parsed:
+        return dict()
+    table = pa.concat_tables(parsed)
+    del parsed
 
     ctd_genesets = dict()
-    with open(filename) as fh:
-        for row_num, row in enumerate(fh, start=1):
-            if row.startswith("#"):  # skip comment lines
-                continue
-
-            tokens = row.strip("\n").split("\t")
-            if len(tokens) != 11:
-                logging.warning(f"Line #{row_num} has {len(tokens)} columns, skipped")
-                continue
-
-            tax_id = tokens[7].strip()
-            if tax_id not in organisms:
-                continue
-
-            chemical_name = tokens[0].strip()
-            chemical_id = tokens[1].strip()
-            gene_id = tokens[4].strip()
-            entity_type = tokens[5].strip()
-
-            if chemical_id is None or gene_id is None:
-                continue
-
-            if entity_type not in ["gene", "protein"]:
-                continue
-
-            cas_rn = tokens[2].strip()
-            if len(cas_rn) == 0:
-                cas_rn = None
-
-            if tax_id not in ctd_genesets:
-                ctd_genesets[tax_id] = {"unique_genes": set(), "genesets": dict()}
-            # uique_genes contains all the unique genes for a given tax_id
-            ctd_genesets[tax_id]["unique_genes"].add(gene_id)
-            # genesets contains the geneset chemical ids and associated genes
-            if chemical_id in ctd_genesets[tax_id]["genesets"]:
-                ctd_genesets[tax_id]["genesets"][chemical_id]["genes"].add(gene_id)
-            else:
-                ctd_genesets[tax_id]["genesets"][chemical_id] = {
-                    "chemical_name": chemical_name,
-                    "cas_rn": cas_rn,
-                    "genes": {gene_id},
-                }
-
+    for tax_id in pc.unique(table["tax_id"]).to_pylist():
+        tax_table = table.filter(pc.equal(table["tax_id"], tax_id))
+        ctd_genesets[tax_id] = OrganismGenesets.from_table(tax_table)
+    del table
+    # Give the memory of the parsed blocks back to the OS, instead of keeping
+    # it in the Arrow memory pool while the documents are emitted.
+    pa.default_memory_pool().release_unused()
     return ctd_genesets
 
 
-def load_data(data_dir):
-    """Read CTD data file and yield genesets."""
+def load_data(data_dir, processes=1):
+    """
+    Read CTD data file and yield genesets.
+    The data file is parsed by `processes` worker processes, which can be set
+    with "parser_kwargs" in the manifest.
+    """
 
-    filename = os.path.join(data_dir, "CTD_chem_gene_ixns.tsv")
-    ctd_genesets = get_ctd_genesets(filename)
-    for tax_id, data in ctd_genesets.items():
-        # 'data' dictionary contains the genesets for a given tax_id,
+    # The data file is read from the downloaded archive directly. Release
+    # folders from before the dumper stopped uncompressing it only have the TSV.
+    filename = os.path.join(data_dir, "CTD_chem_gene_ixns.tsv.gz")
+    if not os.path.exists(filename):
+        filename = os.path.join(data_dir, "CTD_chem_gene_ixns.tsv")
+    ctd_genesets = get_ctd_genesets(filename, processes)
+    for tax_id, organism_genesets in ctd_genesets.items():
+        # 'organism_genesets' contains the genesets for a given tax_id,
         # and all the unique genes for that tax_id
         organism_name = organisms[tax_id]
         logging.info("=" * 60)
         logging.info(f"Building '{organism_name}' genesets (taxid = {tax_id})")
-        entrez_set = data["unique_genes"]
 
         # Lookup all unique genes for the organism.
         # Some genesets in CTD have homolog ids, so we must convert them to tax_id
-        organism_genes = [str(gene) for gene in entrez_set]
+        organism_genes = organism_genesets.genes
         gene_lookup = MyGeneLookup(tax_id)
         gene_lookup.query_mygene_homologs(organism_genes, "entrezgene,retired", new_species=tax_id)
 
         # Build individual genesets
-        genesets = data["genesets"]
-        for chemical_id, ctd_info in genesets.items():
-            gid_set = ctd_info["genes"]  # set of gene ids for this chemical
-            genes = [str(gene) for gene in gid_set]
+        for i, chemical_id in enumerate(organism_genesets.chemical_ids):
+            # Gene id strings are only built here, one geneset at a time
+            genes = organism_genesets.get_genes(i)
 
             # Get gene lookup results for all genes in this geneset
             lookup_results = gene_lookup.get_results(genes)
 
-            chemical_name = ctd_info["chemical_name"]
-            cas_rn = ctd_info["cas_rn"]
+            chemical_name = organism_genesets.chemical_names[i]
+            cas_rn = organism_genesets.cas_rns[i]
             my_geneset = dict()
             my_geneset["_id"] = chemical_id + "_" + tax_id
             my_geneset["is_public"] = True
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for the DO plugin, run locally as a standalone script:
+
+    python benchmark.py [data_dir]
+
+`data_dir` must contain "HumanDO.obo" and "genemap2.txt". It defaults to the
+current release folder under `config.DATA_ARCHIVE_ROOT`. No mygene.info
+queries are sent.
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append("../../")
+
+import config
+
+# Importing the hub loads the local "config.py" as `biothings.config`,
+# the same way the plugin is imported when run by the hub.
+import biothings.hub  # noqa: F401
+
+import parser as do_parser
+from utils.mygene_lookup import MyGeneLookup
+
+
+def legacy_parse(disease_ontology, obo_filename):
+    """Line-by-line OBO parsing that `GO.parse()` used before `utils.obo`."""
+    inside = False
+    gterm = None
+    with open(obo_filename) as obo_fh:
+        for line in obo_fh:
+            fields = line.rstrip().split()
+            if len(fields) < 1:
+                continue
+            elif fields[0] == "[Term]":
+                inside = True
+            elif fields[0] == "[Typedef]":
+                inside = False
+            elif inside and fields[0] == "id:":
+                gterm = disease_ontology.add_term(fields[1])
+            elif inside and fields[0] == "def:":
+                gterm.description = " ".join(fields[1:]).split('"')[1]
+            elif inside and fields[0] == "name:":
+                fields.pop(0)
+                name = "_".join(fields)
+                name = re.sub(r"[^\w\s_-]", "_", name).strip().lower()
+                name = re.sub(r"[-\s_]+", "_", name)
+                gterm.name = name
+                gterm.full_name = " ".join(fields)
+            elif inside and fields[0] == "namespace:":
+                gterm.namespace = fields[1]
+            elif inside and fields[0] == "alt_id:":
+                gterm.alt_id.append(fields[1])
+                disease_ontology.alt_id2std_id[fields[1]] = gterm.get_id()
+            elif inside and fields[0] == "is_a:":
+                pterm = disease_ontology.add_term(fields[1])
+                gterm.is_a.append(pterm.index)
+                disease_ontology.add_edge(pterm, gterm)
+            elif inside and fields[0] == "relationship:":
+                if fields[1].find("has_part") != -1:
+                    continue
+                pterm = disease_ontology.add_term(fields[2])
+                if fields[1] in ("regulates", "positively_regulates", "negatively_regulates"):
+                    gterm.relationship_regulates.append(pterm.index)
+                elif fields[1] == "part_of":
+                    gterm.relationship_part_of.append(pterm.index)
+                disease_ontology.add_edge(pterm, gterm)
+            elif inside and fields[0] == "is_obsolete:":
+                gterm.head = False
+                del disease_ontology.go_terms[gterm.get_id()]
+    disease_ontology.heads = [t for t in disease_ontology.go_terms.values() if t.head]
+
+
+def legacy_build_doid_mim_dict(obo_filename):
+    """Second pass over the OBO file that `build_doid_mim_dict()` used before `utils.obo`."""
+    obo_fh = open(obo_filename, "r")
+    doid_mim_dict = {}
+    obo_reversed_str_array = obo_fh.readlines()[::-1]
+    while obo_reversed_str_array:
+        line = obo_reversed_str_array.pop()
+        line = line.strip()
+        if line == "[Term]":
+            while line != "" and obo_reversed_str_array:
+                line = obo_reversed_str_array.pop()
+                if line.startswith("id:"):
+                    doid = re.search("DOID:[0-9]+", line)
+                    if doid:
+                        doid = doid.group(0)
+                if line.startswith("xref: MIM:"):
+                    mim = re.search("[0-9]+", line).group(0)
+                    if doid not in doid_mim_dict:
+                        doid_mim_dict[doid] = set()
+                    if mim not in doid_mim_dict[doid]:
+                        doid_mim_dict[doid].add(mim)
+    obo_fh.close()
+    return doid_mim_dict
+
+
+def legacy_build_mim_diseases_dict(genemap_filename):
+    """Line-by-line genemap2 parsing that `build_mim_diseases_dict()` used before
+    `Genemap2Index`. Returns MIM disease IDs mapped to lists of Entrez IDs."""
+    mim_genes = {}
+    with open(genemap_filename, "r") as genemap_fh:
+        for line in genemap_fh:
+            tokens = line.strip("\n").split("\t")
+            try:
+                entrez_id = tokens[9].strip()
+                disorders = tokens[12].strip()
+            except IndexError:
+                continue
+            if disorders == "" or entrez_id == "":
+                continue
+            for disorder in disorders.split(";"):
+                if "[" in disorder or "?" in disorder:
+                    continue
+                mim_info = re.search(r"\, [0-9]* \([1-4]\)", disorder)
+                if mim_info:
+                    split_mim_info = mim_info.group(0).split(" ")
+                    mim_disease_id = split_mim_info[1].strip()
+                    if split_mim_info[2].strip() != do_parser.PHENOTYPE_FILTER:
+                        continue
+                    genes = mim_genes.setdefault(mim_disease_id, [])
+                    if entrez_id not in genes:
+                        genes.append(entrez_id)
+    return mim_genes
+
+
+def bench_genemap2(genemap_filename):
+    print("genemap2 parsing")
+    t0 = time.perf_counter()
+    legacy_mim_genes = legacy_build_mim_diseases_dict(genemap_filename)
+    print(f"  line by line {time.perf_counter() - t0:8.3f}s")
+
+    t0 = time.perf_counter()
+    genemap2_index = do_parser.Genemap2Index.from_genemap2(genemap_filename)
+    print(f"  indexed      {time.perf_counter() - t0:8.3f}s")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        do_parser.load_genemap2_index(genemap_filename, cache_dir)
+        t0 = time.perf_counter()
+        cached_index = do_parser.load_genemap2_index(genemap_filename, cache_dir)
+        print(f"  saved index  {time.perf_counter() - t0:8.3f}s  (release {cached_index.release!r})")
+
+    legacy_mim_genes = {mim_id: set(genes) for mim_id, genes in legacy_mim_genes.items()}
+    assert legacy_mim_genes == genemap2_index.mim_genes, "MIM diseases differ."
+    assert cached_index.mim_genes == genemap2_index.mim_genes, "Saved index differs."
+    assert cached_index.gene_mims == genemap2_index.gene_mims, "Saved index differs."
+    print(f"  {len(genemap2_index.mim_genes)} MIM diseases are identical.")
+
+
+def term_summary(disease_ontology):
+    terms = disease_ontology.terms
+    return {
+        term_id: (
+            term.name,
+            term.full_name,
+            term.description,
+            sorted(terms[i].go_id for i in term.parent_of),
+            sorted(terms[i].go_id for i in term.child_of),
+        )
+        for term_id, term in disease_ontology.go_terms.items()
+    }
+
+
+def bench_obo_parsing(obo_filename):
+    print("OBO parsing")
+    size = os.path.getsize(obo_filename) / 2**20
+
+    t0 = time.perf_counter()
+    legacy_ontology = do_parser.GO()
+    legacy_parse(legacy_ontology, obo_filename)
+    legacy_mim_dict = legacy_build_doid_mim_dict(obo_filename)
+    elapsed = time.perf_counter() - t0
+    print(f"  two passes   {elapsed:8.3f}s  {size / elapsed:6.1f} MiB/s")
+
+    t0 = time.perf_counter()
+    disease_ontology = do_parser.GO()
+    doid_mim_dict = {}
+    obo_terms = do_parser.read_obo(obo_filename)
+    disease_ontology.parse(do_parser.collect_doid_mim_xrefs(obo_terms, doid_mim_dict))
+    elapsed = time.perf_counter() - t0
+    print(f"  single pass  {elapsed:8.3f}s  {size / elapsed:6.1f} MiB/s")
+
+    assert legacy_mim_dict == doid_mim_dict, "MIM xrefs differ."
+    assert term_summary(legacy_ontology) == term_summary(disease_ontology), "Terms differ."
+    print("  Parsed terms and MIM xrefs are identical.")
+
+
+def legacy_propagate(disease_ontology):
+    """Recursive propagation that copies `Annotation` objects along every path.
+
+    This is the algorithm `GO.propagate()` replaced, kept here as a baseline.
+    """
+
+    terms = disease_ontology.terms
+
+    def propagate_recurse(gterm):
+        for child_idx in gterm.parent_of:
+            child_term = terms[child_idx]
+            propagate_recurse(child_term)
+            new_annotations = set()
+
+            regulates_relation = gterm.index in child_term.relationship_regulates
+            part_of_relation = gterm.index in child_term.relationship_part_of
+
+            for annotation in child_term.annotations:
+                if regulates_relation:
+                    if annotation.ready_regulates_cutoff:
+                        continue
+                    copied_annotation = annotation.prop_copy(ready_regulates_cutoff=True)
+                elif part_of_relation:
+                    copied_annotation = annotation.prop_copy(ready_regulates_cutoff=True)
+                else:
+                    copied_annotation = annotation.prop_copy()
+                new_annotations.add(copied_annotation)
+            gterm.annotations = gterm.annotations | new_annotations
+
+    for head_gterm in disease_ontology.heads:
+        propagate_recurse(head_gterm)
+
+    return {
+        term_id: {annotation.gid for annotation in term.annotations}
+        for term_id, term in disease_ontology.go_terms.items()
+    }
+
+
+def current_propagate(disease_ontology):
+    disease_ontology.propagate()
+    return {
+        term_id: term.get_annotated_genes()
+        for term_id, term in disease_ontology.go_terms.items()
+    }
+
+
+def load_annotated_ontology(obo_filename, genemap_filename):
+    disease_ontology = do_parser.GO()
+    disease_ontology.load_obo(obo_filename)
+    doid_mim_dict = do_parser.build_doid_mim_dict(obo_filename)
+    mim_diseases = do_parser.build_mim_diseases_dict(genemap_filename)
+    do_parser.add_term_annotations(doid_mim_dict, disease_ontology, mim_diseases)
+    return disease_ontology
+
+
+def bench_memory(obo_filename, genemap_filename):
+    print("Memory")
+    tracemalloc.start()
+    disease_ontology = load_annotated_ontology(obo_filename, genemap_filename)
+    loaded, _ = tracemalloc.get_traced_memory()
+    disease_ontology.propagate()
+    propagated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n_terms = len(disease_ontology.terms)
+    print(f"  {n_terms} terms")
+    print(f"  loaded:     {loaded / 2**20:8.2f} MiB  ({loaded / n_terms:.0f} bytes/term)")
+    print(f"  propagated: {propagated / 2**20:8.2f} MiB  (peak {peak / 2**20:.2f} MiB)")
+
+
+def bench_propagation(obo_filename, genemap_filename):
+    print("Propagation")
+    results = {}
+    for label, propagate in [("recursive", legacy_propagate), ("post-order", current_propagate)]:
+        disease_ontology = load_annotated_ontology(obo_filename, genemap_filename)
+        t0 = time.perf_counter()
+        results[label] = propagate(disease_ontology)
+        elapsed = time.perf_counter() - t0
+        n_genesets = sum(1 for gids in results[label].values() if gids)
+        print(f"  {label:<12} {elapsed:8.3f}s  {n_genesets} genesets")
+
+    assert results["recursive"] == results["post-order"], "Propagated genesets differ."
+    print("  Propagated genesets are identical.")
+
+
+def offline_gene_lookup(entrez_set):
+    """`MyGeneLookup` with a prefilled cache, so no mygene.info queries are sent."""
+    cache = {
+        str(gid): {
+            "mygene_id": str(gid),
+            "source_id": str(gid),
+            "symbol": f"GENE{gid}",
+            "name": f"gene {gid}",
+            "ncbigene": str(gid),
+            "taxid": int(do_parser.TAX_ID),
+        }
+        for gid in entrez_set
+    }
+    return MyGeneLookup(do_parser.TAX_ID, cache_dict=cache)
+
+
+def bench_emission(obo_filename, genemap_filename):
+    print("Geneset emission")
+    disease_ontology, doid_mim_dict, entrez_set = do_parser.build_disease_ontology(
+        obo_filename, genemap_filename
+    )
+    gene_lookup = offline_gene_lookup(entrez_set)
+
+    def streamed():
+        return do_parser.iter_genesets(disease_ontology, doid_mim_dict, gene_lookup)
+
+    def materialized():
+        return list(streamed())
+
+    for label, get_genesets in [("list", materialized), ("generator", streamed)]:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        genesets = get_genesets()
+        first = None
+        n_genesets = 0
+        for _ in genesets:
+            if first is None:
+                first = time.perf_counter() - t0
+            n_genesets += 1
+        elapsed = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"  {label:<12} first document {first:8.3f}s  total {elapsed:8.3f}s  "
+            f"peak {peak / 2**20:8.2f} MiB  {n_genesets} genesets"
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        data_dir = sys.argv[1]
+    else:
+        from version import get_release
+
+        data_dir = os.path.join(config.DATA_ARCHIVE_ROOT, "do", get_release(None))
+
+    obo_filename = os.path.join(data_dir, "HumanDO.obo")
+    genemap_filename = os.path.join(data_dir, "genemap2.txt")
+    bench_obo_parsing(obo_filename)
+    bench_genemap2(genemap_filename)
+    bench_memory(obo_filename, genemap_filename)
+    bench_propagation(obo_filename, genemap_filename)
+    bench_emission(obo_filename, genemap_filename)
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 
+import json
 import os
 import re
+from array import array
 
 from biothings.utils.dataload import dict_sweep, unlist
 
@@ -24,13 +26,34 @@ else:
     logging = config.logger
 
 from utils.mygene_lookup import MyGeneLookup
+from utils.obo import read_obo
+
+try:
+    from do.version import get_genemap2_release
+except ImportError:
+    # Run as a standalone script from the plugin folder
+    from version import get_genemap2_release
 
 TAX_ID = "9606"  # Taxonomy ID of human being
 
 # Varibles when searching MIM Disease ID from "Phenotypes" column
 # in "genemap2.txt"
-FIND_MIMID = re.compile("\, [0-9]* \([1-4]\)")  # Regex pattern
+FIND_MIMID = re.compile(r", ([0-9]*) \(([1-4])\)")  # MIM ID and phenotype mapping key
 PHENOTYPE_FILTER = "(3)"
+# Columns of "genemap2.txt" read by `Genemap2Index.from_genemap2()`
+GENEMAP2_ENTREZ_COL = 9
+GENEMAP2_PHENOTYPES_COL = 12
+# Folder next to the release folders where genemap2 indexes are saved
+GENEMAP2_INDEX_DIR = "genemap2_index"
+# Version of the saved genemap2 indexes, to increment when `Genemap2Index`,
+# FIND_MIMID or PHENOTYPE_FILTER change, so that older indexes are parsed again
+GENEMAP2_INDEX_FORMAT = 1
+
+# Term name normalization in `GO.parse()`
+NAME_INVALID_CHARS = re.compile(r"[^\w\s_-]")
+NAME_SEPARATORS = re.compile(r"[-\s_]+")
+# MIM number in a MIM xref, e.g. "MIM:601665"
+MIM_NUMBER = re.compile("[0-9]+")
 
 
 # Based on `go` class in "annotation-refinery/go.py".
@@ -50,164 +73,136 @@ class GO:
         """
         self.heads = []
         self.go_terms = {}
+        # All terms ever created, indexed by `GOTerm.index`. Unlike `go_terms`,
+        # obsolete terms are kept here so that indices stay valid.
+        self.terms = []
         self.alt_id2std_id = {}
         self.populated = False
         self.s_orgs = []
 
     def load_obo(self, path):
         """Load obo from the defined location."""
-        obo_fh = None
         try:
-            obo_fh = open(path)
+            self.parse(read_obo(path))
         except IOError:
             logging.error("Could not open %s on the local filesystem.", path)
-
-        if obo_fh is None:
-            logging.error("Could not open %s.", path)
             return False
-
-        self.parse(obo_fh)
-        obo_fh.close()
         return True
 
-    def parse(self, obo_fh):
+    def add_term(self, go_id):
+        """Return the term with `go_id`, creating it if it doesn't exist."""
+        gterm = self.go_terms.get(go_id)
+        if gterm is None:
+            gterm = GOTerm(go_id, len(self.terms))
+            self.terms.append(gterm)
+            self.go_terms[go_id] = gterm
+        return gterm
+
+    @staticmethod
+    def add_edge(parent_term, child_term):
+        """Link `child_term` to `parent_term` in the index arrays of both terms."""
+        child_term.head = False
+        if child_term.index not in parent_term.parent_of:
+            parent_term.parent_of.append(child_term.index)
+        if parent_term.index not in child_term.child_of:
+            child_term.child_of.append(parent_term.index)
+
+    def parse(self, obo_terms):
         """
-        Parse the passed obo handle.
+        Build the tree from `OboTerm` objects, as returned by `utils.obo.read_obo()`.
         """
-        inside = False
-        gterm = None
-        for line in obo_fh:
-            fields = line.rstrip().split()
-
-            if len(fields) < 1:
-                continue
-            elif fields[0] == "[Term]":
-                if gterm:
-                    if gterm.head:
-                        self.heads.append(gterm)
-                inside = True
-            elif fields[0] == "[Typedef]":
-                if gterm:
-                    if gterm.head:
-                        self.heads.append(gterm)
-                inside = False
-
-            elif inside and fields[0] == "id:":
-                if fields[1] in self.go_terms:
-                    # logging.debug("Term %s exists in GO()", fields[1])
-                    gterm = self.go_terms[fields[1]]
-                else:
-                    # logging.debug("Adding term %s to GO()", fields[1])
-                    gterm = GOTerm(fields[1])
-                    self.go_terms[gterm.get_id()] = gterm
-            elif inside and fields[0] == "def:":
-                desc = " ".join(fields[1:])
-                desc = desc.split('"')[1]
-                gterm.description = desc
-            elif inside and fields[0] == "name:":
-                fields.pop(0)
+        for obo_term in obo_terms:
+            gterm = self.add_term(obo_term.id)
+            if obo_term.definition is not None:
+                gterm.description = " ".join(obo_term.definition.split())
+            if obo_term.name is not None:
+                fields = obo_term.name.split()
                 name = "_".join(fields)
-                name = re.sub("[^\w\s_-]", "_", name).strip().lower()
-                name = re.sub("[-\s_]+", "_", name)
+                name = NAME_INVALID_CHARS.sub("_", name).strip().lower()
+                name = NAME_SEPARATORS.sub("_", name)
                 gterm.name = name
                 gterm.full_name = " ".join(fields)
-            elif inside and fields[0] == "namespace:":
-                gterm.namespace = fields[1]
-            elif inside and fields[0] == "def:":
-                gterm.desc = " ".join(fields[1:]).split('"')[1]
-            elif inside and fields[0] == "alt_id:":
-                gterm.alt_id.append(fields[1])
-                self.alt_id2std_id[fields[1]] = gterm.get_id()
-            elif inside and fields[0] == "is_a:":
-                # logging.debug("Making term.head for term %s = False", gterm)
-                gterm.head = False
-                fields.pop(0)
-                pgo_id = fields.pop(0)
-                if pgo_id not in self.go_terms:
-                    self.go_terms[pgo_id] = GOTerm(pgo_id)
-
-                gterm.is_a.append(self.go_terms[pgo_id])
-                self.go_terms[pgo_id].parent_of.add(gterm)
-                gterm.child_of.add(self.go_terms[pgo_id])
-            elif inside and fields[0] == "relationship:":
-                if fields[1].find("has_part") != -1:
+            if obo_term.namespace is not None:
+                gterm.namespace = obo_term.namespace
+            for alt_id in obo_term.alt_ids:
+                gterm.alt_id.append(alt_id)
+                self.alt_id2std_id[alt_id] = gterm.get_id()
+            for pgo_id in obo_term.is_a:
+                pterm = self.add_term(pgo_id)
+                gterm.is_a.append(pterm.index)
+                self.add_edge(pterm, gterm)
+            for relationship, pgo_id in obo_term.relationships:
+                if relationship.find("has_part") != -1:
                     # Has part is not a parental relationship --
                     # it is actually for children.
                     continue
-                # logging.debug("Making term.head for term %s = False", gterm)
-                gterm.head = False
-                pgo_id = fields[2]
-                if pgo_id not in self.go_terms:
-                    self.go_terms[pgo_id] = GOTerm(pgo_id)
+                pterm = self.add_term(pgo_id)
                 # Check which relationship you are with this parent go term
                 if (
-                    fields[1] == "regulates"
-                    or fields[1] == "positively_regulates"
-                    or fields[1] == "negatively_regulates"
+                    relationship == "regulates"
+                    or relationship == "positively_regulates"
+                    or relationship == "negatively_regulates"
                 ):
-                    gterm.relationship_regulates.append(self.go_terms[pgo_id])
-                elif fields[1] == "part_of":
-                    gterm.relationship_part_of.append(self.go_terms[pgo_id])
+                    gterm.relationship_regulates.append(pterm.index)
+                elif relationship == "part_of":
+                    gterm.relationship_part_of.append(pterm.index)
                 else:
-                    logging.info("Unkown relationship %s", self.go_terms[pgo_id].name)
+                    logging.info("Unkown relationship %s", pterm.name)
 
-                self.go_terms[pgo_id].parent_of.add(gterm)
-                gterm.child_of.add(self.go_terms[pgo_id])
-            elif inside and fields[0] == "is_obsolete:":
-                # logging.debug("Making term.head for term %s = False", gterm)
+                self.add_edge(pterm, gterm)
+            if obo_term.is_obsolete:
                 gterm.head = False
                 del self.go_terms[gterm.get_id()]
 
-        # This loop checks that all terms that have been marked as head=True
-        # have been added to self.heads
-        for term_id, term in self.go_terms.items():
-            if term.head:
-                if term not in self.heads:
-                    # logging.debug("Term %s not in self.heads, adding now", term)
-                    self.heads.append(term)
-
-        # logging.debug("Terms that are heads: %s", self.heads)
+        self.heads = [term for term in self.go_terms.values() if term.head]
 
     def propagate(self):
         """
-        propagate all gene annotations
+        Propagate gene annotations from child terms up to all of their ancestors.
+
+        Terms are visited in iterative post-order starting from each head term,
+        so every term is merged into its parents exactly once, after all of its
+        own descendants are complete. Annotations are tracked per term as two
+        sets of gene ids (see `GOTerm.gids` and `GOTerm.cutoff_gids`), which
+        gives the same result as copying `Annotation` objects along every path.
         """
         logging.info("Propagate gene annotations")
         logging.debug("Head term(s) = %s", self.heads)
+        terms = self.terms
+        # 0: not visited yet, 1: on the stack, 2: complete
+        state = bytearray(len(terms))
         for head_gterm in self.heads:
             logging.info("Propagating %s", head_gterm.name)
-            self.propagate_recurse(head_gterm)
-
-    def propagate_recurse(self, gterm):
-        if not len(gterm.parent_of):
-            # logging.debug("Base case with term %s", gterm.name)
-            return
-
-        for child_term in gterm.parent_of:
-            self.propagate_recurse(child_term)
-            new_annotations = set()
-
-            regulates_relation = gterm in child_term.relationship_regulates
-            part_of_relation = gterm in child_term.relationship_part_of
-
-            for annotation in child_term.annotations:
-                copied_annotation = None
-                # If this relation with child is a regulates(and its sub class)
-                # filter annotations
-                if regulates_relation:
-                    # only add annotations that didn't come from a part of or
-                    # regulates relationship
-                    if annotation.ready_regulates_cutoff:
-                        continue
-                    else:
-                        copied_annotation = annotation.prop_copy(ready_regulates_cutoff=True)
-                elif part_of_relation:
-                    copied_annotation = annotation.prop_copy(ready_regulates_cutoff=True)
+            state[head_gterm.index] = 1
+            stack = [(head_gterm, iter(head_gterm.parent_of))]
+            while stack:
+                gterm, children = stack[-1]
+                for child_idx in children:
+                    if not state[child_idx]:
+                        state[child_idx] = 1
+                        child_term = terms[child_idx]
+                        stack.append((child_term, iter(child_term.parent_of)))
+                        break
                 else:
-                    copied_annotation = annotation.prop_copy()
-
-                new_annotations.add(copied_annotation)
-            gterm.annotations = gterm.annotations | new_annotations
+                    # All children are complete, merge them into this term.
+                    stack.pop()
+                    state[gterm.index] = 2
+                    for child_idx in gterm.parent_of:
+                        self.merge_child(gterm, terms[child_idx])
+
+    @staticmethod
+    def merge_child(gterm, child_term):
+        """Merge the (already propagated) gene ids of `child_term` into `gterm`."""
+        if gterm.index in child_term.relationship_regulates:
+            # Only genes that didn't come from a part_of or regulates
+            # relationship can cross a regulates relationship.
+            gterm.cutoff_gids |= child_term.gids
+        elif gterm.index in child_term.relationship_part_of:
+            gterm.cutoff_gids |= child_term.gids
+            gterm.cutoff_gids |= child_term.cutoff_gids
+        else:
+            gterm.gids |= child_term.gids
+            gterm.cutoff_gids |= child_term.cutoff_gids
 
     def get_term(self, tid):
         # logging.debug('get_term: %s', tid)
@@ -222,9 +217,24 @@ class GO:
         return term
 
 
-# Copied from "annotation-refinery/go.py".
+# Based on `Annotation` class in "annotation-refinery/go.py".
 # See https://github.com/greenelab/annotation-refinery
 class Annotation(object):
+    # Fields that define an annotation, in the order they are hashed/compared.
+    _fields = (
+        "xdb",
+        "gid",
+        "ref",
+        "evidence",
+        "date",
+        "direct",
+        "cross_annotated",
+        "ortho_evidence",
+        "ready_regulates_cutoff",
+        "origin",
+    )
+    __slots__ = _fields + ("_key", "_hash")
+
     def __init__(
         self,
         xdb=None,
@@ -238,16 +248,22 @@ class Annotation(object):
         ortho_evidence=None,
         ready_regulates_cutoff=False,
     ):
-        super(Annotation, self).__setattr__("xdb", xdb)
-        super(Annotation, self).__setattr__("gid", gid)
-        super(Annotation, self).__setattr__("ref", ref)
-        super(Annotation, self).__setattr__("evidence", evidence)
-        super(Annotation, self).__setattr__("date", date)
-        super(Annotation, self).__setattr__("direct", direct)
-        super(Annotation, self).__setattr__("cross_annotated", cross_annotated)
-        super(Annotation, self).__setattr__("origin", origin)
-        super(Annotation, self).__setattr__("ortho_evidence", ortho_evidence)
-        super(Annotation, self).__setattr__("ready_regulates_cutoff", ready_regulates_cutoff)
+        key = (
+            xdb,
+            gid,
+            ref,
+            evidence,
+            date,
+            direct,
+            cross_annotated,
+            ortho_evidence,
+            ready_regulates_cutoff,
+            origin,
+        )
+        for field, value in zip(self._fields, key):
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_hash", hash(key))
 
     def prop_copy(self, ready_regulates_cutoff=None):
         if ready_regulates_cutoff is None:
@@ -266,47 +282,10 @@ class Annotation(object):
         )
 
     def __hash__(self):
-        return hash(
-            (
-                self.xdb,
-                self.gid,
-                self.ref,
-                self.evidence,
-                self.date,
-                self.direct,
-                self.cross_annotated,
-                self.ortho_evidence,
-                self.ready_regulates_cutoff,
-                self.origin,
-            )
-        )
+        return self._hash
 
     def __eq__(self, other):
-        return (
-            self.xdb,
-            self.gid,
-            self.ref,
-            self.evidence,
-            self.date,
-            self.direct,
-            self.cross_annotated,
-            self.ortho_evidence,
-            self.ready_regulates_cutoff,
-            self.origin,
-        ).__eq__(
-            (
-                other.xdb,
-                other.gid,
-                other.ref,
-                other.evidence,
-                other.date,
-                other.direct,
-                other.cross_annotated,
-                other.ortho_evidence,
-                other.ready_regulates_cutoff,
-                other.origin,
-            )
-        )
+        return self._hash == other._hash and self._key == other._key
 
     def __setattr__(self, *args):
         raise TypeError("Attempt to modify immutable object.")
@@ -314,68 +293,82 @@ class Annotation(object):
     __delattr__ = __setattr__
 
 
-# Copied from "annotation-refinery/go.py".
+# Based on `GOTerm` class in "annotation-refinery/go.py".
 # See https://github.com/greenelab/annotation-refinery
 class GOTerm:
-    go_id = ""
-    is_a = None
-    relationship = None
-    parent_of = None
-    child_of = None
-    annotations = None
-    alt_id = None
-    namespace = ""
-    included_in_all = None
-    valid_go_term = None
-    cross_annotated_genes = None
-    head = None
-    name = None
-    full_name = None
-    description = None
-    base_counts = None
-    counts = None
-    summary = None
-    desc = None
-    votes = None
-
-    def __init__(self, go_id):
+    """A single ontology term.
+
+    Relationships to other terms are stored as arrays of `GOTerm.index`
+    values, which point into `GO.terms`.
+    """
+
+    __slots__ = (
+        "go_id",
+        "index",
+        "head",
+        "name",
+        "full_name",
+        "description",
+        "namespace",
+        "alt_id",
+        "is_a",
+        "relationship_regulates",
+        "relationship_part_of",
+        "parent_of",
+        "child_of",
+        "annotations",
+        "cross_annotated_genes",
+        "gids",
+        "cutoff_gids",
+    )
+
+    def __init__(self, go_id, index=0):
         self.head = True
         self.go_id = go_id
-        self.annotations = set([])
-        self.cross_annotated_genes = set([])
-        self.is_a = []
-        self.relationship_regulates = []
-        self.relationship_part_of = []
-        self.parent_of = set()
-        self.child_of = set()
-        self.alt_id = []
-        self.included_in_all = True
-        self.valid_go_term = True
+        self.index = index
         self.name = None
         self.full_name = None
         self.description = None
-        self.base_counts = None
-        self.counts = None
-        self.desc = None
-        self.votes = set([])
+        self.namespace = ""
+        self.alt_id = []
+        # Parent term indices, by relationship type
+        self.is_a = array("I")
+        self.relationship_regulates = array("I")
+        self.relationship_part_of = array("I")
+        # Child and parent term indices, over all relationship types
+        self.parent_of = array("I")
+        self.child_of = array("I")
+        self.annotations = set()
+        self.cross_annotated_genes = set()
+        # Gene ids annotated to this term (directly or through propagation).
+        # `gids` may still propagate through a "regulates" relationship,
+        # `cutoff_gids` came through "part_of" or "regulates" and may not.
+        self.gids = set()
+        self.cutoff_gids = set()
 
     def __hash__(self):
         return self.go_id.__hash__()
 
     def __repr__(self):
-        return self.go_id + ": " + self.name
+        return self.go_id + ": " + str(self.name)
 
     def get_id(self):
         return self.go_id
 
     def map_genes(self, id_name):
         mapped_annotations_set = set([])
+        self.gids = set()
+        self.cutoff_gids = set()
+        self.cross_annotated_genes = set()
         for annotation in self.annotations:
             mapped_genes = id_name.get(annotation.gid)
             if mapped_genes is None:
                 logging.warning("No matching gene id: %s", annotation.gid)
                 continue
             for mgene in mapped_genes:
+                if annotation.cross_annotated:
+                    self.cross_annotated_genes.add(mgene)
+                self.gids.add(mgene)
                 mapped_annotations_set.add(
                     Annotation(
                         xdb=None,
@@ -390,11 +383,9 @@ class GOTerm:
         self.annotations = mapped_annotations_set
 
     def get_annotated_genes(self, include_cross_annotated=True):
-        genes = []
-        for annotation in self.annotations:
-            if (not include_cross_annotated) and annotation.cross_annotated:
-                continue
-            genes.append(annotation.gid)
+        genes = self.gids | self.cutoff_gids
+        if not include_cross_annotated:
+            genes = genes - self.cross_annotated_genes
         return genes
 
     def add_annotation(
@@ -410,6 +401,9 @@ class GOTerm:
             for annotated in self.annotations:
                 if annotated.gid == gid:
                     return
+        self.gids.add(gid)
+        if cross_annotated:
+            self.cross_annotated_genes.add(gid)
         self.annotations.add(
             Annotation(
                 gid=gid,
@@ -427,7 +421,27 @@ class GOTerm:
         return self.namespace
 
 
-# Copied from "annotation-refinery/process_do.py"
+def collect_doid_mim_xrefs(obo_terms, doid_mim_dict):
+    """
+    Generator that passes `obo_terms` through unchanged while recording
+    the MIM xrefs of each term in `doid_mim_dict`. This lets the DO OBO file
+    be read only once for both the ontology and the MIM xrefs.
+
+    Arguments:
+    obo_terms -- An iterable of `OboTerm` objects from `utils.obo.read_obo()`.
+
+    doid_mim_dict -- A dictionary to fill in. The keys are DOIDs, and the
+    values are sets of MIM xref IDs.
+    """
+    for obo_term in obo_terms:
+        for mim_xref in obo_term.xrefs_with_prefix("MIM"):
+            mim = MIM_NUMBER.search(mim_xref)
+            if mim:
+                doid_mim_dict.setdefault(obo_term.id, set()).add(mim.group(0))
+        yield obo_term
+
+
+# Based on `build_doid_mim_dict()` in "annotation-refinery/process_do.py"
 # See https://github.com/greenelab/annotation-refinery
 def build_doid_mim_dict(obo_filename):
     """
@@ -442,38 +456,9 @@ def build_doid_mim_dict(obo_filename):
     that have MIM xrefs. The keys in the dictionary are DOIDs, and the
     values are sets of MIM xref IDs.
     """
-    obo_fh = open(obo_filename, "r")
     doid_mim_dict = {}
-
-    # This statement builds a list of the lines in the file and reverses
-    # its order. This is because the list 'pop()' method pops out list
-    # elements starting from the end. This way the lines will be read in
-    # the following loop in order, from top to bottom of the file.
-    obo_reversed_str_array = obo_fh.readlines()[::-1]
-
-    while obo_reversed_str_array:  # Loop adapted from Dima @ Princeton
-        line = obo_reversed_str_array.pop()
-        line = line.strip()
-        if line == "[Term]":
-            while line != "" and obo_reversed_str_array:
-                line = obo_reversed_str_array.pop()
-
-                if line.startswith("id:"):
-                    doid = re.search("DOID:[0-9]+", line)
-                    if doid:
-                        doid = doid.group(0)
-
-                if line.startswith("xref: MIM:"):
-                    # If term has MIM xref, get it and add it to the
-                    # doid_mim_dict. Otherwise, ignore.
-                    mim = re.search("[0-9]+", line).group(0)
-
-                    if doid not in doid_mim_dict:
-                        doid_mim_dict[doid] = set()
-                    if mim not in doid_mim_dict[doid]:
-                        doid_mim_dict[doid].add(mim)
-
-    obo_fh.close()
+    for _ in collect_doid_mim_xrefs(read_obo(obo_filename), doid_mim_dict):
+        pass
     return doid_mim_dict
 
 
@@ -483,12 +468,131 @@ class MIMdisease:
     def __init__(self):
         self.id = ""
         self.phenotype = ""  # Phenotype mapping method
-        self.genes = []  # list of gene IDs
+        self.genes = set()  # set of gene IDs
+
+
+class Genemap2Index:
+    """
+    Indexes of the MIM disease to Entrez gene associations in "genemap2.txt",
+    in both directions:
+
+    mim_genes -- A dictionary of MIM disease IDs to sets of Entrez gene IDs.
+    gene_mims -- A dictionary of Entrez gene IDs to sets of MIM disease IDs.
+
+    Only the associations with the phenotype mapping key in PHENOTYPE_FILTER
+    are indexed. IDs are kept as strings, the same as in "genemap2.txt".
+    """
+
+    def __init__(self, mim_genes=None, release=""):
+        self.release = release
+        self.mim_genes = mim_genes or {}
+        self.gene_mims = {}
+        for mim_id, genes in self.mim_genes.items():
+            for entrez_id in genes:
+                self.gene_mims.setdefault(entrez_id, set()).add(mim_id)
+
+    @classmethod
+    def from_genemap2(cls, genemap_filename):
+        """Parse "genemap2.txt" in a single pass."""
+        find_mimid = FIND_MIMID.search
+        phenotype_key = PHENOTYPE_FILTER.strip("()")
+        mim_genes = {}
+        release = ""
+        with open(genemap_filename, "r", buffering=1 << 20) as genemap_fh:
+            for line in genemap_fh:
+                if line.startswith("#"):
+                    if not release:
+                        release = get_genemap2_release([line])
+                    continue
+                tokens = line.rstrip("\n").split("\t", GENEMAP2_PHENOTYPES_COL + 1)
+                if len(tokens) <= GENEMAP2_PHENOTYPES_COL:
+                    continue
+                entrez_id = tokens[GENEMAP2_ENTREZ_COL].strip()
+                disorders = tokens[GENEMAP2_PHENOTYPES_COL].strip()
+                # Skip line if "Entrez Gene ID" or "Phenotypes" column is empty
+                if not entrez_id or not disorders:
+                    continue
+
+                for disorder in disorders.split(";"):
+                    # Skip nondiseases ("[...]") and provisional associations ("?...")
+                    if "[" in disorder or "?" in disorder:
+                        continue
+                    # e.g. "Breast cancer, 114480 (3)"
+                    mim_info = find_mimid(disorder)
+                    if mim_info and mim_info.group(2) == phenotype_key:
+                        mim_id = mim_info.group(1)
+                        genes = mim_genes.get(mim_id)
+                        if genes is None:
+                            genes = mim_genes[mim_id] = set()
+                        genes.add(entrez_id)
+        return cls(mim_genes, release)
+
+    @classmethod
+    def load(cls, index_filename):
+        """Load an index saved by `save()`, raising ValueError if it has another format."""
+        with open(index_filename, "r") as index_fh:
+            saved = json.load(index_fh)
+        if saved.get("format") != GENEMAP2_INDEX_FORMAT:
+            raise ValueError(f"Unknown genemap2 index format {saved.get('format')}")
+        mim_genes = {mim_id: set(genes) for mim_id, genes in saved["mim_genes"].items()}
+        return cls(mim_genes, saved["release"])
+
+    def save(self, index_filename):
+        """Save the index as JSON, replacing any existing file atomically."""
+        saved = {
+            "format": GENEMAP2_INDEX_FORMAT,
+            "release": self.release,
+            "mim_genes": {mim_id: sorted(genes) for mim_id, genes in self.mim_genes.items()},
+        }
+        tmp_filename = index_filename + ".tmp"
+        with open(tmp_filename, "w") as index_fh:
+            json.dump(saved, index_fh)
+        os.replace(tmp_filename, index_filename)
+
+    def mim_diseases(self):
+        """Return a dictionary of MIM disease IDs to `MIMdisease` objects."""
+        mim_diseases = {}
+        for mim_id, genes in self.mim_genes.items():
+            mim_disease = MIMdisease()
+            mim_disease.id = mim_id
+            mim_disease.phenotype = PHENOTYPE_FILTER
+            mim_disease.genes = genes
+            mim_diseases[mim_id] = mim_disease
+        return mim_diseases
+
+
+def load_genemap2_index(genemap_filename, cache_dir=None):
+    """
+    Return the `Genemap2Index` of `genemap_filename`.
+
+    If `cache_dir` is given, the index is saved there under the release date
+    of "genemap2.txt", and loaded from there instead of parsing the file again
+    as long as the release and GENEMAP2_INDEX_FORMAT don't change.
+    """
+    index_filename = None
+    if cache_dir:
+        with open(genemap_filename, "r") as genemap_fh:
+            release = get_genemap2_release(genemap_fh)
+        if release:
+            index_filename = os.path.join(cache_dir, f"genemap2_{release}.json")
+            if os.path.exists(index_filename):
+                try:
+                    genemap2_index = Genemap2Index.load(index_filename)
+                    logging.info("Loaded genemap2 index from %s", index_filename)
+                    return genemap2_index
+                except ValueError as exc:
+                    logging.info("Parse genemap2 again, %s: %s", index_filename, exc)
+
+    genemap2_index = Genemap2Index.from_genemap2(genemap_filename)
+    if index_filename:
+        os.makedirs(cache_dir, exist_ok=True)
+        genemap2_index.save(index_filename)
+    return genemap2_index
 
 
 # Based on `build_mim_diseases_dict()` in "annotation-refinery/process_do.py".
 # See https://github.com/greenelab/annotation-refinery
-def build_mim_diseases_dict(genemap_filename):
+def build_mim_diseases_dict(genemap_filename, cache_dir=None):
     """
     Function to parse genemap file and build a dictionary of MIM
     diseases.
@@ -496,6 +600,9 @@ def build_mim_diseases_dict(genemap_filename):
     Arguments:
     genemap_filename -- A string. Location of the genemap file to read in.
 
+    cache_dir -- Optional folder to save/load the parsed genemap file in,
+    see `load_genemap2_index()`.
+
     Returns:
     mim_diseases -- A dictionary. The keys are MIM disease IDs, and the
     values are `MIMdisease` objects, defined by the class above.
@@ -503,59 +610,7 @@ def build_mim_diseases_dict(genemap_filename):
     *N.B. MIM IDs are not all one type of object (unlike Entrez IDs,
     for example) - they can refer to phenotypes/diseases, genes, etc.
     """
-
-    mim_diseases = {}
-
-    genemap_fh = open(genemap_filename, "r")
-    for line in genemap_fh:  # Loop based on Dima's @ Princeton
-        tokens = line.strip("\n").split("\t")
-
-        try:
-            # mim_geneid = tokens[5].strip()
-            entrez_id = tokens[9].strip()
-            disorders = tokens[12].strip()
-        except IndexError:
-            continue
-
-        # Skip line if disorders field is empty
-        if disorders == "":
-            continue
-
-        # Log message for empty "Entrez Gene ID" column
-        if entrez_id == "":
-            # logging.info(f"Empty Entrez Gene ID for MIM Number {mim_geneid}")
-            continue
-
-        # Split disorders and handle them one by one
-        disorders_list = disorders.split(";")
-        for disorder in disorders_list:
-            if "[" in disorder or "?" in disorder:
-                continue
-
-            # This next line returns a re Match object:
-            # It will be None if no match is found.
-            mim_info = re.search(FIND_MIMID, disorder)
-
-            if mim_info:
-                split_mim_info = mim_info.group(0).split(" ")
-                mim_disease_id = split_mim_info[1].strip()
-                mim_phenotype = split_mim_info[2].strip()
-
-                # Check if the mim_phenotype number is the one
-                # in our filter. If not, skip and continue
-                if mim_phenotype != PHENOTYPE_FILTER:
-                    continue
-
-                if mim_disease_id not in mim_diseases:
-                    mim_diseases[mim_disease_id] = MIMdisease()
-                    mim_diseases[mim_disease_id].id = mim_disease_id
-                    mim_diseases[mim_disease_id].phenotype = mim_phenotype
-
-                if entrez_id not in mim_diseases[mim_disease_id].genes:
-                    mim_diseases[mim_disease_id].genes.append(entrez_id)
-
-    genemap_fh.close()
-    return mim_diseases
+    return load_genemap2_index(genemap_filename, cache_dir).mim_diseases()
 
 
 # Based on `add_do_term_annotations()` in "annotation-refinery/process_do.py"
@@ -659,34 +714,41 @@ def create_gs_abstract(do_term, doid_mim_dict):
     return abstract
 
 
-# Based on `process_do_terms()` in "annotation-refinery/process_do.py".
-# See https://github.com/greenelab/annotation-refinery
-# Changed from a regular function to generator to work with Biothings SDK.
-def get_genesets(obo_filename, genemap_filename):
-    disease_ontology = GO()
-    obo_is_loaded = disease_ontology.load_obo(obo_filename)
-
-    if obo_is_loaded is False:
-        logging.error("Failed to load OBO file.")
+def build_disease_ontology(obo_filename, genemap_filename, cache_dir=None):
+    """
+    Function to build the annotated and propagated disease ontology.
+    `cache_dir` is passed to `build_mim_diseases_dict()`.
 
-    doid_mim_dict = build_doid_mim_dict(obo_filename)
+    Returns:
+    A tuple of the `GO` object, the doid_mim_dict (see `build_doid_mim_dict()`)
+    and the set of Entrez gene IDs annotated to any term.
+    """
+    # Read the OBO file once, collecting MIM xrefs while building the ontology.
+    disease_ontology = GO()
+    doid_mim_dict = {}
+    disease_ontology.parse(collect_doid_mim_xrefs(read_obo(obo_filename), doid_mim_dict))
 
-    mim_diseases = build_mim_diseases_dict(genemap_filename)
+    mim_diseases = build_mim_diseases_dict(genemap_filename, cache_dir)
 
     entrez_set = add_term_annotations(doid_mim_dict, disease_ontology, mim_diseases)
 
-    gene_lookup = MyGeneLookup(TAX_ID)
-    gene_lookup.query_mygene(list(map(str, entrez_set)), "entrezgene,retired")
-
     disease_ontology.populated = True
     disease_ontology.propagate()
 
-    genesets = list()
+    return disease_ontology, doid_mim_dict, entrez_set
+
+
+# Based on `process_do_terms()` in "annotation-refinery/process_do.py".
+# See https://github.com/greenelab/annotation-refinery
+# Changed from a regular function to generator to work with Biothings SDK.
+def iter_genesets(disease_ontology, doid_mim_dict, gene_lookup):
+    """
+    Generator that yields one geneset document per DO term with genes,
+    using `gene_lookup` (a `MyGeneLookup` that already queried all genes).
+    """
     for term_id, term in disease_ontology.go_terms.items():
         # If a term includes anyvalid gene IDs, add it as a geneset.
-        gid_set = set()
-        for annotation in term.annotations:
-            gid_set.add(annotation.gid)
+        gid_set = term.get_annotated_genes()
 
         if gid_set:
             my_geneset = {}
@@ -700,15 +762,25 @@ def get_genesets(obo_filename, genemap_filename):
             my_geneset["do"] = {"id": term_id, "abstract": do_abstract}
 
             # Add the gene lookup info to the geneset.
-            genes = [str(gid) for gid in gid_set]
+            genes = [str(gid) for gid in sorted(gid_set)]
             lookup_results = gene_lookup.get_results(genes)
             my_geneset.update(lookup_results)
 
             my_geneset = dict_sweep(my_geneset, vals=[None], remove_invalid_list=True)
             my_geneset = unlist(my_geneset)
-            genesets.append(my_geneset)
+            yield my_geneset
+
 
-    return genesets
+def get_genesets(obo_filename, genemap_filename, cache_dir=None):
+    """Generator that yields DO geneset documents as soon as each one is built."""
+    disease_ontology, doid_mim_dict, entrez_set = build_disease_ontology(
+        obo_filename, genemap_filename, cache_dir
+    )
+
+    gene_lookup = MyGeneLookup(TAX_ID)
+    gene_lookup.query_mygene(list(map(str, entrez_set)), "entrezgene,retired")
+
+    yield from iter_genesets(disease_ontology, doid_mim_dict, gene_lookup)
 
 
 def load_data(data_dir):
@@ -721,9 +793,11 @@ def load_data(data_dir):
     assert os.path.exists(obo_filename), f"Could not find file: {obo_filename}"
     assert os.path.exists(genemap_filename), f"Could not find file: {genemap_filename}"
 
-    genesets = get_genesets(obo_filename, genemap_filename)
-    for gs in genesets:
-        yield gs
+    # genemap2 indexes are kept next to the release folders, so that a new
+    # DO release with the same genemap2 release doesn't parse it again.
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(data_dir)), GENEMAP2_INDEX_DIR)
+
+    yield from get_genesets(obo_filename, genemap_filename, cache_dir)
 
 
 # Test harness
@@ -737,8 +811,9 @@ if __name__ == "__main__":
     version = get_release(None)
     data_dir = os.path.join(config.DATA_ARCHIVE_ROOT, "do", version)
 
-    genesets = list(load_data(data_dir))
-    for gs in genesets:
+    total = 0
+    for gs in load_data(data_dir):
         print(json.dumps(gs, indent=2))
+        total += 1
 
-    print("\nTotal number of gs:", len(genesets))
+    print("\nTotal number of gs:", total)
@@ -1,6 +1,22 @@
 #!/usr/bin/env python3
 
 
+def get_genemap2_release(text_lines):
+    """
+    Return the release date of "genemap2.txt" from its header lines.
+    """
+    # Find the line that is in the following format:
+    # "# Genearated: YYYY-MM-DD"
+    # and extract "YYYY-MM-DD" part as the release string in "genemap2.txt":
+    for line in text_lines:
+        if line.startswith("# Generated: "):
+            return line.strip().split(": ")[1]
+        if not line.startswith("#"):
+            # The header is over
+            break
+    return ""
+
+
 def get_release(self):
     """
     Return a string that combines the release dates of both "HumanDO.obo"
@@ -28,15 +44,7 @@ def get_release(self):
     genemap2_url = "https://data.omim.org/downloads/BQtb2GI3Tz6aKpp8PLrYcg/genemap2.txt"
     genemap2_resp = requests.get(genemap2_url)
     genemap2_text_lines = genemap2_resp.text.strip("\n").split("\n")
-    genemap2_release = ""
-
-    # Find the line that is in the following format:
-    # "# Genearated: YYYY-MM-DD"
-    # and extract "YYYY-MM-DD" part as the release string in "genemap2.txt":
-    for line in genemap2_text_lines:
-        if line.startswith("# Generated: "):
-            genemap2_release = line.strip().split(": ")[1]
-            break
+    genemap2_release = get_genemap2_release(genemap2_text_lines)
 
     # Return a string that combines both release dates
     return "obo-" + obo_release + "_" + "genemap2-" + genemap2_release
@@ -5,7 +5,8 @@ import os
 import sys
 
 sys.path.append("../../")
-from biothings.utils.dataload import dict_sweep, tabfile_feeder, unlist
+from biothings.utils.dataload import dict_sweep, unlist
+from utils.dataload import tabfile_feeder
 from utils.mygene_lookup import MyGeneLookup
 
 
@@ -0,0 +1,2 @@
+from .dump import KEGGDumper
+from .upload import KEGGUploader
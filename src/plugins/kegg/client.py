@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+
+"""
+Settings of the requests to the KEGG REST API
+(https://www.kegg.jp/kegg/rest/keggapi.html), shared by the dumper and the
+parser, which reads the responses from the files the dumper saved.
+"""
+
+from urllib3.util.retry import Retry
+
+BASE_URL = "http://rest.kegg.jp/"
+# Number of requests sent at the same time
+MAX_WORKERS = 3
+# KEGG blocks clients that send more than 3 requests per second
+MAX_REQUESTS_PER_SECOND = 3
+# KEGG answers 403 when too many requests are sent
+RETRY_STATUS = [403, 429, 500, 502, 503, 504]
+
+
+def kegg_filename(path):
+    """
+    Return the name of the file that saves the response to `path`,
+    e.g. "link_hsa_pathway.txt" for "link/hsa/pathway".
+    """
+    return path.strip("/").replace("/", "_") + ".txt"
+
+
+def make_retry():
+    """Return the retry policy of the requests KEGG refuses when it is busy."""
+    return Retry(total=5, backoff_factor=1, status_forcelist=RETRY_STATUS)
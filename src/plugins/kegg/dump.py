@@ -0,0 +1,45 @@
+import os
+
+import biothings
+import config
+
+biothings.config_for_app(config)
+
+from biothings.hub.dataload.dumper import HTTPDumper
+from config import DATA_ARCHIVE_ROOT
+from requests.adapters import HTTPAdapter
+
+from .client import BASE_URL, MAX_REQUESTS_PER_SECOND, MAX_WORKERS, kegg_filename, make_retry
+from .species import get_request_paths
+from .version import get_release
+
+
+class KEGGDumper(HTTPDumper):
+    """
+    Mirror the KEGG REST API responses of all organisms in `species.py`
+    into the release data folder, one file per request (see `kegg_filename()`),
+    so that the uploader reads them from disk.
+    """
+
+    SRC_NAME = "kegg"
+    SRC_ROOT_FOLDER = os.path.join(DATA_ARCHIVE_ROOT, SRC_NAME)
+    SCHEDULE = "13 2 * * 6"
+    # KEGG blocks clients that send more than 3 requests per second
+    MAX_PARALLEL_DUMP = MAX_WORKERS
+    SLEEP_BETWEEN_DOWNLOAD = 1.0 / MAX_REQUESTS_PER_SECOND
+
+    def prepare_client(self):
+        super().prepare_client()
+        # Retry the requests KEGG refuses when it is busy
+        self.client.mount("http://", HTTPAdapter(max_retries=make_retry()))
+        self.client.mount("https://", HTTPAdapter(max_retries=make_retry()))
+
+    def get_remote_version(self):
+        return get_release(self)
+
+    def create_todump_list(self, force=False):
+        self.release = self.get_remote_version()
+        if force or not self.current_release or self.release != self.current_release:
+            for path in get_request_paths():
+                local_file = os.path.join(self.new_data_folder, kegg_filename(path))
+                self.to_dump.append({"remote": BASE_URL + path, "local": local_file})
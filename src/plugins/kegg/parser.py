@@ -1,13 +1,16 @@
 #!/usr/bin/env python3
 
-import requests
+import os
+
 from biothings.utils.dataload import dict_sweep, unlist
 
 try:
     # Run as a data plugin module of Biothings SDK
     from biothings import config
+    from kegg.client import kegg_filename
     from kegg.species import organisms
     from utils.mygene_lookup import MyGeneLookup
+    from utils.parallel import iter_prepared
 
     logging = config.logger
 
@@ -16,37 +19,34 @@ except ImportError:
     import logging
     import sys
 
+    from client import kegg_filename
     from species import organisms
 
     sys.path.append("../../")
     from utils.mygene_lookup import MyGeneLookup
+    from utils.parallel import iter_prepared
 
     LOG_LEVEL = logging.DEBUG
     logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s: %(message)s")
 
-BASE_URL = "http://rest.kegg.jp/"
-
 
-def get_url_text_lines(url):
+def read_text_lines(data_dir, path):
     """
-    Send a request to `url` and return its plain text content
-    in multiple lines.
+    Return the plain text content of the response to the KEGG REST API
+    request `path`, saved in `data_dir` by the dumper, in multiple lines.
     """
-    resp = requests.get(url)
-    resp.raise_for_status()
-    text_lines = resp.text.strip("\n").split("\n")
-    return text_lines
+    with open(os.path.join(data_dir, kegg_filename(path))) as f:
+        return f.read().strip("\n").split("\n")
 
 
-def get_shared_genesets(geneset_type):
+def get_shared_genesets(geneset_type, data_dir):
     """
     Get genesets that are shared by all organisms and whose type is
     `geneset_type`, where geneset_type is one of: 'pathway' or 'module'.
     Each line is a disease/module id and name.
     Note that the contents of URL response are tab-delimited.
     """
-    url = BASE_URL + f"list/{geneset_type}"
-    text_lines = get_url_text_lines(url)
+    text_lines = read_text_lines(data_dir, f"list/{geneset_type}")
 
     shared_genesets = dict()
     for line in text_lines:
@@ -57,7 +57,7 @@ def get_shared_genesets(geneset_type):
     return shared_genesets
 
 
-def get_pathway_genesets(organism_code):
+def get_pathway_genesets(organism_code, data_dir):
     """
     Get pathway geneset names based on response from a request to KEGG
     list API.
@@ -65,14 +65,14 @@ def get_pathway_genesets(organism_code):
     """
     pathway_genesets = dict()
 
-    url = BASE_URL + f"list/pathway/{organism_code}"
-    text_lines = get_url_text_lines(url)
+    path = f"list/pathway/{organism_code}"
+    text_lines = read_text_lines(data_dir, path)
     for line in text_lines:
         tokens = line.split("\t")
         entry = tokens[0]
         name = tokens[1]
         if entry in pathway_genesets:
-            raise Exception(f"Duplicate entry in {url}: {entry}")
+            raise Exception(f"Duplicate entry in {path}: {entry}")
         pathway_genesets[entry] = {
             "id": tokens[0],
             "type": "pathway",
@@ -94,19 +94,65 @@ def get_unique_tokens(geneset_name):
     return "; ".join(uniq_tokens)
 
 
-def load_data(data_dir):
-    """The argument `data_dir` is not being used at this moment.
+def prepare_organism_genesets(conf, data_dir):
+    """
+    Read the genes of each geneset of the organism configured by `conf`
+    (see `species.py`), and look them all up in mygene.info.
+    Return (genes_in_gs, gene_lookup), where genes_in_gs is a dict of
+    geneset entry to its list of gene ids.
+    """
+    organism_code = conf["organism_code"]
+    uniq_genes = set()
+    genes_in_gs = dict()
+    for gs_type in conf["geneset_types"]:
+        # Fetch file with genes/genesets for each type
+        # Each row contains one geneset id and a single gene id
+        text_lines = read_text_lines(data_dir, f"link/{organism_code}/{gs_type}")
+        for line in text_lines:
+            tokens = line.split("\t")
+            # Get the geneset name
+            if gs_type == "module":
+                gs_entry = tokens[0].split(":")[1].split("_")[1]
+            else:
+                gs_entry = tokens[0].split(":")[1]
+
+            if gs_entry not in genes_in_gs:
+                genes_in_gs[gs_entry] = list()
+            # Append the gene id to the geneset dictionary
+            gene = tokens[1].split(":")[1]
+            genes_in_gs[gs_entry].append(gene)
+            uniq_genes.add(gene)
+
+    # Query mygene for all genes for this species
+    gene_id_types = ",".join(conf["gene_id_types"])
+    gene_lookup = MyGeneLookup(str(conf["tax_id"]))
+    gene_lookup.query_mygene(list(uniq_genes), gene_id_types)
+    return genes_in_gs, gene_lookup
+
+
+def load_data(data_dir, workers=1):
+    """
+    All the KEGG REST API responses are read from `data_dir`, where the
+    dumper saved them, so no request is sent while parsing.
     This dataset consists of three types of genesets:
     - disease: common disease-gene relationships found in all organisms
     - module: common "sub-pathways" found in all organisms
     - pathway: patways-gene relationships that can be organism specific
+
+    The genes of the next organisms are read and looked up in mygene.info by
+    `workers` threads, while the genesets of the current one are yielded
+    (see `iter_prepared()`). With `workers` = 0, organisms are processed one
+    after the other.
     """
-    diseases = get_shared_genesets("disease")
-    modules = get_shared_genesets("module")
+    diseases = get_shared_genesets("disease", data_dir)
+    modules = get_shared_genesets("module", data_dir)
     # Merge the two dictionaries
     shared_genesets = {**diseases, **modules}
 
-    for conf in organisms:
+    def prepare(conf):
+        return conf, prepare_organism_genesets(conf, data_dir)
+
+    for conf, (genes_in_gs, gene_lookup) in iter_prepared(prepare, organisms, workers):
         organism_name = conf["name"]
         tax_id = str(conf["tax_id"])
 
@@ -115,37 +161,10 @@ def load_data(data_dir):
 
         organism_code = conf["organism_code"]
 
-        pathway_genesets = get_pathway_genesets(organism_code)
+        pathway_genesets = get_pathway_genesets(organism_code, data_dir)
         # all_genesets is a dictionary containing geneset id, type, and name
         all_genesets = {**shared_genesets, **pathway_genesets}
 
-        uniq_genes = set()
-        genes_in_gs = dict()
-        for gs_type in conf["geneset_types"]:
-            # Fetch file with genes/genesets for each type
-            # Each row contains one geneset id and a single gene id
-            url = BASE_URL + f"link/{organism_code}/{gs_type}"
-            text_lines = get_url_text_lines(url)
-            for line in text_lines:
-                tokens = line.split("\t")
-                # Get the geneset name
-                if gs_type == "module":
-                    gs_entry = tokens[0].split(":")[1].split("_")[1]
-                else:
-                    gs_entry = tokens[0].split(":")[1]
-
-                if gs_entry not in genes_in_gs:
-                    genes_in_gs[gs_entry] = list()
-                # Append the gene id to the geneset dictionary
-                gene = tokens[1].split(":")[1]
-                genes_in_gs[gs_entry].append(gene)
-                uniq_genes.add(gene)
-
-        # Query mygene for all genes for this species
-        gene_id_types = ",".join(conf["gene_id_types"])
-        gene_lookup = MyGeneLookup(tax_id)
-        gene_lookup.query_mygene(list(uniq_genes), gene_id_types)
-
         for gs_entry, genes in genes_in_gs.items():
             gs_type = all_genesets[gs_entry]["type"]
             gs_name = all_genesets[gs_entry]["name"]
@@ -180,7 +199,31 @@ def load_data(data_dir):
 # Test harness
 if __name__ == "__main__":
     import json
+    import time
+
+    import config
+    import requests
+    from client import BASE_URL, MAX_REQUESTS_PER_SECOND, make_retry
+    from requests.adapters import HTTPAdapter
+    from species import get_request_paths
+    from version import get_release
+
+    # Get data dir, and download the missing responses there, one at a time,
+    # with the same files and retries as the dumper
+    version = get_release(None)
+    data_dir = os.path.join(config.DATA_ARCHIVE_ROOT, "kegg", version)
+    os.makedirs(data_dir, exist_ok=True)
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(max_retries=make_retry()))
+    for path in get_request_paths():
+        local_file = os.path.join(data_dir, kegg_filename(path))
+        if not os.path.exists(local_file):
+            time.sleep(1.0 / MAX_REQUESTS_PER_SECOND)
+            resp = session.get(BASE_URL + path)
+            resp.raise_for_status()
+            with open(local_file, "w") as f:
+                f.write(resp.text)
 
     # Time to create 9 organisms: 5-6 minutes (~5,300 genesets)
-    for gs in load_data(None):
+    for gs in load_data(data_dir):
         print(json.dumps(gs, indent=2))
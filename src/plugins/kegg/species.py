@@ -85,3 +85,18 @@ organisms = [
     # - frog (8364)
     # - pig (9823)
 ]
+
+
+def get_request_paths():
+    """
+    Return the paths of all the KEGG REST API requests whose responses
+    make up a release: the disease and module lists shared by all organisms,
+    and the pathway list and geneset links of each organism.
+    """
+    paths = ["list/disease", "list/module"]
+    for conf in organisms:
+        organism_code = conf["organism_code"]
+        paths.append(f"list/pathway/{organism_code}")
+        for gs_type in conf["geneset_types"]:
+            paths.append(f"link/{organism_code}/{gs_type}")
+    return paths
@@ -0,0 +1,27 @@
+import biothings.hub.dataload.uploader as uploader
+
+from .mapping import get_customized_mapping
+from .parser import load_data
+
+
+class KEGGUploader(uploader.BaseSourceUploader):
+
+    name = "kegg"
+    # Number of threads preparing the next organisms (see `parser.load_data()`)
+    workers = 1
+    __metadata__ = {
+        "src_meta": {
+            "license_url": "https://www.kegg.jp/kegg/legal.html",
+            "url": "https://www.kegg.jp",
+            "description": "Kyoto Encyclopedia of Genes and Genomes",
+        }
+    }
+
+    def load_data(self, data_folder):
+        self.logger.info("Load data from folder '%s'" % data_folder)
+        kegg_docs = load_data(data_folder, workers=self.workers)
+        return kegg_docs
+
+    @classmethod
+    def get_mapping(cls):
+        return get_customized_mapping(cls)
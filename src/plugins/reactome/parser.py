@@ -1,32 +1,23 @@
 import os
 
-from biothings.utils.dataload import tabfile_feeder
-
 if __name__ == "__main__":
     import sys
 
     sys.path.append("../../")
 
+from utils.gmt import GMTFile
 from utils.mygene_lookup import MyGeneLookup
 
 
 def load_data(data_folder):
     # Load .gmt (Gene Matrix Transposed) file with entrez ids
     f = os.path.join(data_folder, "ReactomePathways.gmt")
-    data = tabfile_feeder(f, header=0)
-    all_genes = set()
-    for rec in data:
-        genes = set(rec[2:])
-        all_genes = all_genes | genes
+    gmt = GMTFile.read(f)
     # Query gene info
     gene_lookup = MyGeneLookup("9606")  # Human genes
-    gene_lookup.query_mygene(list(all_genes), "symbol,alias")
+    gene_lookup.query_mygene(gmt.genes, "symbol,alias")
 
-    data = tabfile_feeder(f, header=0)
-    for rec in data:
-        name = rec[0]
-        _id = rec[1]
-        ncbigenes = rec[2:]
+    for name, _id, ncbigenes in gmt:
         lookup_results = gene_lookup.get_results(ncbigenes)
         # Format schema
         doc = {
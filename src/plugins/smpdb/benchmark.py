@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for the SMPDB plugin, run locally as a standalone script:
+
+    python benchmark.py [n_pathways] [data_folder]
+
+Synthetic "*_proteins.csv" and "*_metabolites.csv" files for `n_pathways`
+pathways (20,000 by default) are written to `data_folder` (in a temporary
+folder by default), and read the way the parser read them before, with two
+`pd.read_csv()` calls per file, and with `read_pathway_files()`. No
+mygene.info or mychem.info queries are sent.
+"""
+
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+from glob import glob
+
+import pandas as pd
+
+sys.path.append("../../")
+
+import parser as smpdb_parser
+
+PROTEIN_HEADER = [
+    "SMPDB ID",
+    "Pathway Name",
+    "Pathway Subject",
+    "Uniprot ID",
+    "Protein Name",
+    "HMDBP ID",
+    "DrugBank ID",
+    "GenBank ID",
+    "Gene Name",
+    "Locus",
+]
+METABOLITE_HEADER = [
+    "SMPDB ID",
+    "Pathway Name",
+    "Pathway Subject",
+    "Metabolite ID",
+    "Metabolite Name",
+    "HMDB ID",
+    "KEGG ID",
+    "ChEBI ID",
+    "DrugBank ID",
+    "CAS",
+    "Formula",
+    "IUPAC",
+    "SMILES",
+    "InChI",
+    "InChI Key",
+]
+
+
+def write_synthetic_files(data_folder, n_pathways, n_genes=5000, n_compounds=20000, seed=0):
+    """Write a protein and a metabolite file for each of `n_pathways` pathways."""
+    rng = random.Random(seed)
+    for i in range(n_pathways):
+        smpdb_id = f"SMP{i:07d}"
+        pathway = [smpdb_id, f"Pathway {i}", "Metabolic"]
+        with open(os.path.join(data_folder, f"{smpdb_id}_proteins.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(PROTEIN_HEADER)
+            # Some files only have a header
+            for _ in range(rng.randint(0, 30)):
+                g = rng.randrange(n_genes)
+                gene_name = f"GENE{g}" if g % 7 else ""
+                writer.writerow(pathway + [f"P{g:05d}", f"Protein {g}", f"HMDBP{g:05d}", "", f"AB{g}", gene_name, ""])
+        with open(os.path.join(data_folder, f"{smpdb_id}_metabolites.csv"), "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(METABOLITE_HEADER)
+            for _ in range(rng.randint(0, 40)):
+                c = rng.randrange(n_compounds)
+                chebi = str(c) if c % 5 else ""
+                writer.writerow(
+                    pathway
+                    + [f"PW_C{c:06d}", f"Metabolite, {c}", f"HMDB{c:07d}", f"C{c:05d}", chebi, ""]
+                    + ["50-00-0", "C6H12O6", f"compound {c}", "C(C)O", "InChI=1S/C", f"KEY{c:010d}-UHFFFAOYSA-N"]
+                )
+
+
+def legacy_read(data_folder, suffix, columns):
+    """Two-pass reader that the parser used before `read_pathway_files()`."""
+    # First pass: the universe of the first column to look up
+    universe = set()
+    for f in glob(os.path.join(data_folder, f"*_{suffix}.csv")):
+        tmp_df = pd.read_csv(f, usecols=columns[-1:]).fillna("")
+        if len(tmp_df) == 0:
+            continue
+        universe |= set(tmp_df[columns[-1]])
+    # Second pass: the rows of each pathway
+    groups = {}
+    for f in glob(os.path.join(data_folder, f"*_{suffix}.csv")):
+        data = pd.read_csv(f, usecols=columns, dtype=str).fillna("")
+        if len(data) == 0:
+            continue
+        groups[data["SMPDB ID"][0]] = data[columns].to_dict("records")
+    return universe, groups
+
+
+def new_read(data_folder, suffix, columns):
+    table = smpdb_parser.read_pathway_files(data_folder, suffix, columns)
+    return set(table[columns[-1]].to_pylist()), smpdb_parser.group_by_pathway(table.to_pylist())
+
+
+def bench_reading(data_folder):
+    print("Per-pathway files")
+    for suffix, columns in [
+        ("proteins", smpdb_parser.PROTEIN_COLUMNS),
+        ("metabolites", smpdb_parser.METABOLITE_COLUMNS),
+    ]:
+        results = {}
+        for label, read in [("two passes", legacy_read), ("single pass", new_read)]:
+            t0 = time.perf_counter()
+            results[label] = read(data_folder, suffix, columns)
+            print(f"  {suffix:<12} {label:<12} {time.perf_counter() - t0:8.3f}s")
+        assert results["two passes"] == results["single pass"], f"Results differ: {suffix}"
+    print("  Results are identical.")
+
+
+if __name__ == "__main__":
+    n_pathways = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_folder = sys.argv[2] if len(sys.argv) > 2 else tmp_dir
+        if not glob(os.path.join(data_folder, "*_proteins.csv")):
+            t0 = time.perf_counter()
+            write_synthetic_files(data_folder, n_pathways)
+            print(f"Wrote {n_pathways} pathways to {data_folder} in {time.perf_counter() - t0:.1f}s")
+        bench_reading(data_folder)
@@ -6,31 +6,53 @@ if __name__ == "__main__":
 
     sys.path.append("../../")
 
-import biothings_client
 import pandas as pd
+import pyarrow as pa
 from biothings.utils.dataload import dict_sweep
+from pyarrow import csv as pa_csv
+from utils.mychem_lookup import MyChemLookup
 from utils.mygene_lookup import MyGeneLookup
 
+# Columns read from the "*_proteins.csv" files
+PROTEIN_COLUMNS = ["SMPDB ID", "Uniprot ID", "Gene Name"]
+# Columns read from the "*_metabolites.csv" files
+METABOLITE_COLUMNS = [
+    "SMPDB ID",
+    "Metabolite ID",
+    "Metabolite Name",
+    "HMDB ID",
+    "KEGG ID",
+    "ChEBI ID",
+    "DrugBank ID",
+    "CAS",
+    "IUPAC",
+    "SMILES",
+    "InChI",
+    "InChI Key",
+]
+# MyChem.info results cache, kept next to the release folders
+MYCHEM_CACHE_FILE = "mychem_cache.json"
+
 
 def load_data(data_folder):
     genesets = parse_genes(data_folder)
     chemsets = parse_metabolites(data_folder)
     f = os.path.join(data_folder, "smpdb_pathways.csv")
     data = pd.read_csv(f, quotechar='"')
-    for i in range(len(data)):
-        smpdb_id = data["SMPDB ID"][i]
+    for pathway in data.to_dict("records"):
+        smpdb_id = pathway["SMPDB ID"]
         doc = {
             "_id": smpdb_id,
-            "name": data["Name"][i],
-            "description": data["Description"][i],
+            "name": pathway["Name"],
+            "description": pathway["Description"],
             "is_public": True,
             "source": "smpdb",
             "taxid": "9606",
             "smpdb": {
                 "id": smpdb_id,
-                "geneset_name": data["Name"][i],
-                "pw_id": data["PW ID"][i],
-                "pathway_subject": data["Subject"][i],
+                "geneset_name": pathway["Name"],
+                "pw_id": pathway["PW ID"],
+                "pathway_subject": pathway["Subject"],
             },
         }
         if genesets.get(smpdb_id):
@@ -43,81 +65,69 @@ def load_data(data_folder):
             yield doc
 
 
+def read_pathway_files(data_folder, suffix, columns):
+    """
+    Read `columns` of all the per-pathway "*_{suffix}.csv" files of
+    `data_folder`, each only once, and return them as a single Arrow table,
+    where the rows of each pathway are contiguous. All values are read as
+    strings, with "" for empty values.
+    """
+    read_options = pa_csv.ReadOptions(use_threads=False)
+    parse_options = pa_csv.ParseOptions(newlines_in_values=True)
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=columns,
+        column_types={column: pa.string() for column in columns},
+        strings_can_be_null=False,
+    )
+    tables = [
+        pa_csv.read_csv(f, read_options, parse_options, convert_options)
+        for f in sorted(glob(os.path.join(data_folder, f"*_{suffix}.csv")))
+    ]
+    if not tables:
+        return pa.table({column: pa.array([], pa.string()) for column in columns})
+    return pa.concat_tables(tables)
+
+
+def group_by_pathway(rows):
+    """Return a dict of SMPDB ID to the list of its `rows` (dicts), in order."""
+    groups = {}
+    for row in rows:
+        groups.setdefault(row["SMPDB ID"], []).append(row)
+    return groups
+
+
 def parse_genes(data_folder):
-    # Concatenate all unique genes in csv files and query gene information.
-    all_genes = set()
-    fields = ["Uniprot ID", "Gene Name"]
-    for f in glob(os.path.join(data_folder, "*_proteins.csv")):
-        tmp_df = pd.read_csv(f, usecols=fields).fillna("")
-        # Skip empty files
-        if len(tmp_df) == 0:
-            continue
-        all_genes = all_genes | set(zip(tmp_df["Uniprot ID"], tmp_df["Gene Name"]))
-    all_genes = list(all_genes)
+    # Every file contains a separate geneset
+    table = read_pathway_files(data_folder, "proteins", PROTEIN_COLUMNS)
+    genes = list(zip(table["Uniprot ID"].to_pylist(), table["Gene Name"].to_pylist()))
+    genes_in_gs = {}
+    for smpdb_id, gene in zip(table["SMPDB ID"].to_pylist(), genes):
+        genes_in_gs.setdefault(smpdb_id, []).append(gene)
+
+    # Query gene information for all unique genes at once
     gene_lookup = MyGeneLookup("9606")
-    gene_lookup.query_mygene(all_genes, ["uniprot", "symbol,alias"])
+    gene_lookup.query_mygene(list(set(genes)), ["uniprot", "symbol,alias"])
 
-    # Every file contains a separate geneset
-    # We must open each file again and add the genes to the correct set
     gene_sets = {}
-    fields = ["SMPDB ID", "Uniprot ID", "Gene Name", "GenBank ID", "Locus"]
-    for f in glob(os.path.join(data_folder, "*_proteins.csv")):
-        data = pd.read_csv(f, usecols=fields).fillna("")
-        if len(data) == 0:
-            continue
-        smpdb_id = data["SMPDB ID"][0]
-        genes = list(zip(data["Uniprot ID"], data["Gene Name"]))
+    for smpdb_id, genes in genes_in_gs.items():
         gene_sets[smpdb_id] = gene_lookup.get_results(genes)
     return gene_sets
 
 
 def parse_metabolites(data_folder):
-    all_compounds = set()
-    fields = ["InChI Key"]
-    for f in glob(os.path.join(data_folder, "*_metabolites.csv")):
-        tmp_df = pd.read_csv(f, usecols=fields).fillna("")
-        # Skip empty files
-        if len(tmp_df) == 0:
-            continue
-        all_compounds = all_compounds | set(tmp_df["InChI Key"])
-    # Query MyChem.info
-    mc = biothings_client.MyChemInfo()
-    resp = mc.getchems(
-        all_compounds, fields="pubchem.cid,chembl.molecule_chembl_id", dotfield=True
-    )
-    results = {}
-    not_found = []
-    for r in resp:
-        if r.get("notfound"):
-            not_found.append(r)
-        else:
-            results[r["query"]] = r
-    if len(not_found) > 0:
-        print("{} input query terms found no hit: {}".format(len(not_found), not_found))
+    table = read_pathway_files(data_folder, "metabolites", METABOLITE_COLUMNS)
+    all_compounds = list(set(table["InChI Key"].to_pylist()))
+    # Query MyChem.info, except for the compounds of previous releases
+    cache_file = os.path.join(os.path.dirname(os.path.abspath(data_folder)), MYCHEM_CACHE_FILE)
+    chem_lookup = MyChemLookup(cache_file=cache_file)
+    chem_lookup.query_mychem(all_compounds)
+    results = chem_lookup.get_results(all_compounds)
 
     metabolite_sets = {}
-    for f in glob(os.path.join(data_folder, "*_metabolites.csv")):
-        data = pd.read_csv(f).fillna("")
-        # Skip empty files
-        if len(data) == 0:
-            continue
-        # Columns from dataframe
-        smpdb_id = data["SMPDB ID"][0]
-        pw_id = data["Metabolite ID"]
-        metabolite_name = data["Metabolite Name"]
-        hmdb = data["HMDB ID"]
-        kegg = data["KEGG ID"]
-        chebi = data["ChEBI ID"]
-        drugbank = data["DrugBank ID"]
-        cas = data["CAS"]
-        iupac = data["IUPAC"]
-        smiles = data["SMILES"]
-        inchi = data["InChI"]
-        inchikey = data["InChI Key"]
-
+    for smpdb_id, rows in group_by_pathway(table.to_pylist()).items():
         metabolites = []
-        for i in range(len(data)):
-            query_results = results.get(inchikey[i])
+        for row in rows:
+            query_results = results.get(row["InChI Key"])
             if query_results:
                 mychemid = query_results["_id"]
                 pubchem_id = query_results.get("pubchem.cid")
@@ -129,17 +139,17 @@ def parse_metabolites(data_folder):
             metabolites.append(
                 {
                     "mychem_id": mychemid,
-                    "smpdb_metabolite": pw_id[i],
-                    "name": metabolite_name[i],
-                    "hmdb": hmdb[i],
-                    "kegg_cid": kegg[i],
-                    "chebi": str(chebi[i]),
-                    "drugbank": drugbank[i],
-                    "smiles": smiles[i],
-                    "iupac": iupac[i],
-                    "cas": cas[i],
-                    "inchi": inchi[i],
-                    "inchikey": inchikey[i],
+                    "smpdb_metabolite": row["Metabolite ID"],
+                    "name": row["Metabolite Name"],
+                    "hmdb": row["HMDB ID"],
+                    "kegg_cid": row["KEGG ID"],
+                    "chebi": row["ChEBI ID"],
+                    "drugbank": row["DrugBank ID"],
+                    "smiles": row["SMILES"],
+                    "iupac": row["IUPAC"],
+                    "cas": row["CAS"],
+                    "inchi": row["InChI"],
+                    "inchikey": row["InChI Key"],
                     "pubchem": pubchem_id,
                     "chembl": chembl_id,
                 }
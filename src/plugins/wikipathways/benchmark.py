@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark for the WikiPathways plugin, run locally as a standalone script:
+
+    python benchmark.py [workers] [latency]
+
+Synthetic GMT files are written for the 19 species of the parser, and
+`load_data()` is run serially (workers = 0) and with `workers` threads
+(4 by default). mygene.info isn't queried: each species lookup waits
+`latency` seconds (1.0 by default) plus 0.1 ms per gene, about what a
+`query_mygene()` call costs, so the benchmark measures how much lookup time
+is overlapped with building documents and across species.
+"""
+
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append("../../")
+
+import parser as wikipathways_parser
+
+SPECIES = [
+    "Anopheles gambiae",
+    "Arabidopsis thaliana",
+    "Bos taurus",
+    "Caenorhabditis elegans",
+    "Canis familiaris",
+    "Danio rerio",
+    "Drosophila melanogaster",
+    "Equus caballus",
+    "Gallus gallus",
+    "Homo sapiens",
+    "Mus musculus",
+    "Oryza sativa",
+    "Pan troglodytes",
+    "Populus trichocarpa",
+    "Rattus norvegicus",
+    "Saccharomyces cerevisiae",
+    "Solanum lycopersicum",
+    "Sus scrofa",
+    "Zea mays",
+]
+
+
+def write_synthetic_files(data_folder, n_pathways=300, n_genes=5000, seed=0):
+    rng = random.Random(seed)
+    for s, species in enumerate(SPECIES):
+        name = "wikipathways-20240110-gmt-" + species.replace(" ", "_") + ".gmt"
+        with open(os.path.join(data_folder, name), "w") as f:
+            for i in range(n_pathways):
+                wp_id = f"WP{s * n_pathways + i}"
+                genes = [str(rng.randrange(n_genes)) for _ in range(rng.randint(5, 100))]
+                header = f"Pathway {i}%WikiPathways_20240110%{wp_id}%{species}"
+                f.write("\t".join([header, f"https://www.wikipathways.org/{wp_id}"] + genes) + "\n")
+
+
+class SimulatedLookup:
+    """Stands in for MyGeneLookup, with the latency of a mygene.info query."""
+
+    latency = 1.0
+
+    def __init__(self, species):
+        self.species = species
+
+    def query_mygene(self, ids, id_types):
+        time.sleep(self.latency + 0.0001 * len(ids))
+
+    def get_results(self, ids):
+        return {"genes": [{"source_id": i, "mygene_id": i} for i in ids], "count": len(ids)}
+
+
+def bench_workers(data_folder, workers):
+    print(f"Species files (lookup latency {SimulatedLookup.latency}s)")
+    wikipathways_parser.MyGeneLookup = SimulatedLookup
+    results = {}
+    for label, n in [("serial", 0), (f"{workers} workers", workers)]:
+        t0 = time.perf_counter()
+        results[label] = list(wikipathways_parser.load_data(data_folder, workers=n))
+        elapsed = time.perf_counter() - t0
+        n_docs = len(results[label])
+        print(f"  {label:<12} {elapsed:8.3f}s  {n_docs / elapsed:8.1f} docs/s")
+    assert results["serial"] == results[f"{workers} workers"], "Documents differ"
+    print("  Documents are identical.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    SimulatedLookup.latency = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    with tempfile.TemporaryDirectory() as data_folder:
+        write_synthetic_files(data_folder)
+        bench_workers(data_folder, workers)
@@ -1,18 +1,27 @@
 import glob
 import logging
 import os
-
-from biothings.utils.dataload import tabfile_feeder
+import time
 
 if __name__ == "__main__":
     import sys
 
     sys.path.append("../../")
 
+from utils.gmt import GMTFile
 from utils.mygene_lookup import MyGeneLookup
+from utils.parallel import iter_prepared
+
 
+def load_data(data_folder, workers=1):
+    """
+    Yield the genesets of each species GMT file of `data_folder`.
+    The files of the next species are read and their genes looked up in
+    mygene.info by `workers` threads, while the genesets of the current one
+    are yielded (see `iter_prepared()`). With `workers` = 0, species are
+    processed one after the other.
+    """
 
-def load_data(data_folder):
     def get_taxid(species):
         taxids = {
             "Mus musculus": 10090,
@@ -40,32 +49,34 @@ def load_data(data_folder):
         else:
             logging.error("Taxid not found for species {}".format(species))
 
-    # Load .gmt (Gene Matrix Transposed) files
-    for f in glob.glob(os.path.join(data_folder, "*.gmt")):
+    def prepare_species(f):
         # Get species name from the filename and convert to taxid
         species = f.replace(".gmt", "").split("-")[-1].replace("_", " ")
         taxid = get_taxid(species)
         logging.info("Parsing data for {} ({})".format(species, taxid))
+        t0 = time.perf_counter()
         # Read entire file and fetch data for joint set of all genes
-        data = tabfile_feeder(f, header=0)
-        all_genes = []
-        for rec in data:
-            all_genes += rec[2:]
-        all_genes = list(set(all_genes))
+        gmt = GMTFile.read(f)
         gene_lookup = MyGeneLookup(taxid)
-        gene_lookup.query_mygene(all_genes, "entrezgene,retired")
+        gene_lookup.query_mygene(gmt.genes, "entrezgene,retired")
+        logging.info(
+            "Looked up {} genes of {} in {:.1f}s".format(
+                len(gmt.genes), species, time.perf_counter() - t0
+            )
+        )
+        return species, taxid, gmt, gene_lookup
 
+    # Load .gmt (Gene Matrix Transposed) files
+    files = glob.glob(os.path.join(data_folder, "*.gmt"))
+    for species, taxid, gmt, gene_lookup in iter_prepared(prepare_species, files, workers):
+        t0 = time.perf_counter()
         # Parse each individual document
-        data = tabfile_feeder(f, header=0)
-        for rec in data:
-            header = rec[0].split("%")
+        for name, url, ncbigenes in gmt:
+            header = name.split("%")
             # Get fields from header
             pathway_name = header[0]
             wikipathways_id = header[2]
             assert species == header[3], "Species does not match."
-            # Get URL and gene list
-            url = rec[1]
-            ncbigenes = rec[2:]
             # Format document
             doc = {
                 "_id": wikipathways_id,
@@ -79,6 +90,9 @@ def load_data(data_folder):
             lookup_results = gene_lookup.get_results(ncbigenes)
             doc.update(lookup_results)
             yield doc
+        logging.info(
+            "Built {} genesets of {} in {:.1f}s".format(len(gmt), species, time.perf_counter() - t0)
+        )
 
 
 if __name__ == "__main__":
@@ -6,6 +6,8 @@ from .parser import load_data
 class WikiPathwaysUploader(uploader.BaseSourceUploader):
 
     name = "wikipathways"
+    # Number of threads preparing the next species files (see `parser.load_data()`)
+    workers = 4
     __metadata__ = {
         "src_meta": {
             "license_url": "https://www.wikipathways.org/terms.html",
@@ -17,7 +19,7 @@ class WikiPathwaysUploader(uploader.BaseSourceUploader):
 
     def load_data(self, data_folder):
         self.logger.info("Load data from folder '%s'" % data_folder)
-        wikipathways_docs = load_data(data_folder)
+        wikipathways_docs = load_data(data_folder, workers=self.workers)
         return wikipathways_docs
 
     @classmethod
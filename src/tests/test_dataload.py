@@ -0,0 +1,44 @@
+# Test data file readers utils
+
+import gzip
+import os
+import sys
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from utils import dataload
+
+GMT_TEXT = (
+    "Pathway A%WikiPathways_20240110%WP1%Homo sapiens\thttps://www.wikipathways.org/WP1\t1\t2\n"
+    "Pathway B%WikiPathways_20240110%WP2%Homo sapiens\thttps://www.wikipathways.org/WP2\t3\n"
+)
+
+
+def write_files(tmp_path):
+    plain = os.path.join(tmp_path, "test.gmt")
+    with open(plain, "w") as f:
+        f.write(GMT_TEXT)
+    compressed = plain + ".gz"
+    with gzip.open(compressed, "wt") as f:
+        f.write(GMT_TEXT)
+    return plain, compressed
+
+
+class TestDataload:
+    def test_001_tabfile_feeder(self, tmp_path):
+        plain, _ = write_files(tmp_path)
+        rows = list(dataload.tabfile_feeder(plain, header=0))
+        assert len(rows) == 2
+        assert rows[0][2:] == ["1", "2"]
+        assert list(dataload.tabfile_feeder(plain)) == rows[1:]
+
+    def test_002_gzip_stream(self, tmp_path, monkeypatch):
+        plain, compressed = write_files(tmp_path)
+        expected = list(dataload.tabfile_feeder(plain, header=0))
+        assert list(dataload.tabfile_feeder(compressed, header=0)) == expected
+        # Without python-isal
+        monkeypatch.setattr(dataload, "igzip_threaded", None)
+        assert list(dataload.tabfile_feeder(compressed, header=0)) == expected
+        with dataload.open_binary(compressed) as f:
+            assert f.read() == GMT_TEXT.encode()
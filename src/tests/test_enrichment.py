@@ -0,0 +1,161 @@
+# Test the gene set enrichment analysis of the /enrich endpoint
+
+import copy
+import os
+import sys
+
+import pytest
+import numpy as np
+from scipy.stats import fisher_exact, hypergeom
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from web.enrichment import GenesetIndex, benjamini_hochberg, hypergeom_sf
+
+DOCS = [
+    {
+        "_id": "GS1",
+        "name": "Geneset 1",
+        "source": "go",
+        "taxid": "9606",
+        "genes": [{"mygene_id": str(i)} for i in range(1, 11)],
+    },
+    {
+        "_id": "GS2",
+        "name": "Geneset 2",
+        "source": "reactome",
+        "taxid": "9606",
+        "genes": [{"mygene_id": str(i)} for i in range(5, 40)],
+    },
+    {
+        "_id": "GS3",
+        "name": "Geneset 3",
+        "source": "go",
+        "taxid": "9606",
+        "genes": [{"mygene_id": str(i)} for i in range(40, 100)],
+    },
+    {
+        "_id": "GS4",
+        "name": "Geneset 4",
+        "source": "go",
+        "taxid": 10090,
+        "genes": {"mygene_id": ["1", "2"]},
+    },
+]
+
+
+class TestEnrichment:
+    def test_001_benjamini_hochberg(self):
+        pvalues = [0.01, 0.04, 0.03, 0.2]
+        expected = [0.04, 0.16 / 3, 0.16 / 3, 0.2]
+        assert benjamini_hochberg(pvalues) == pytest.approx(expected)
+        # Untested hypotheses count in the correction
+        assert benjamini_hochberg([0.01], 10) == pytest.approx([0.1])
+
+    def test_002_hypergeom_sf(self):
+        for M, N in [(20000, 500), (100, 7), (30, 30)]:
+            n = np.arange(1, min(M, 300), 7)
+            k = np.maximum(np.minimum(n, N) // 3, 1)
+            expected = hypergeom.sf(k - 1, M, n, N)
+            assert hypergeom_sf(k, M, n, N) == pytest.approx(expected, rel=1e-8)
+            assert hypergeom_sf(np.minimum(n, N), M, n, N) == pytest.approx(
+                hypergeom.pmf(np.minimum(n, N), M, n, N), rel=1e-8
+            )
+
+    def test_003_enrich(self):
+        genesets = GenesetIndex.from_documents(DOCS)
+        assert len(genesets) == 4
+        genes = ["1", "2", "3", "4", "5", "6", "50", "1", "none"]
+        results = genesets.enrich(genes, "9606", max_fdr=1)
+        assert results["query_size"] == 7
+        assert results["background_size"] == 99
+        assert results["not_found"] == ["none"]
+        assert [hit["_id"] for hit in results["hits"]] == ["GS1", "GS2", "GS3"]
+        gs1 = results["hits"][0]
+        assert gs1["count"] == 10
+        assert gs1["overlap"] == 6
+        assert gs1["genes"] == ["1", "2", "3", "4", "5", "6"]
+        # Same p-values as a one-sided Fisher's exact test
+        pvalues = []
+        for hit in results["hits"]:
+            table = [
+                [hit["overlap"], 7 - hit["overlap"]],
+                [hit["count"] - hit["overlap"], 99 - 7 - hit["count"] + hit["overlap"]],
+            ]
+            pvalues.append(fisher_exact(table, alternative="greater")[1])
+            assert hit["pvalue"] == pytest.approx(pvalues[-1])
+        fdr = benjamini_hochberg(pvalues)
+        assert [hit["fdr"] for hit in results["hits"]] == pytest.approx(fdr.tolist())
+
+    def test_004_filters(self):
+        genesets = GenesetIndex.from_documents(DOCS)
+        genes = ["1", "2", "3", "4", "5", "6", "50"]
+        results = genesets.enrich(genes, "9606", sources=["go"], max_fdr=1, size=1)
+        assert [hit["_id"] for hit in results["hits"]] == ["GS1"]
+        results = genesets.enrich(genes, "9606", max_fdr=0.01)
+        assert [hit["_id"] for hit in results["hits"]] == ["GS1"]
+        assert genesets.enrich(["1"], 10090)["background_size"] == 2
+        assert genesets.enrich(["1"], "7227") is None
+        results = genesets.enrich(["none"], "9606")
+        assert results["query_size"] == 0
+        assert results["hits"] == []
+
+    def test_005_find(self):
+        docs = copy.deepcopy(DOCS) + [
+            {
+                "_id": "GS5",
+                "name": "Geneset 5",
+                "source": "reactome",
+                "taxid": 9606,
+                "genes": [
+                    {"mygene_id": "1017", "symbol": "CDK2", "ensemblgene": "ENSG00000123374"},
+                    {"mygene_id": ["1", "2"], "symbol": "DUP", "uniprot": ["P1", "P2"]},
+                ],
+            },
+        ]
+        # Genes have the same ids in all the genesets
+        docs[0]["genes"][0:2] = docs[4]["genes"][1:2]
+        genesets = GenesetIndex.from_documents(docs)
+        results = genesets.find(["cdk2", "ENSG00000123374", "p2", "1", "none"])
+        assert results["cdk2"] == {"reactome": {"9606": [{"_id": "GS5", "name": "Geneset 5"}]}}
+        assert results["ENSG00000123374"] == results["cdk2"]
+        # Genes with several mygene ids have the genesets of all of them
+        assert [gs["_id"] for gs in results["p2"]["go"]["9606"]] == ["GS1"]
+        assert [gs["_id"] for gs in results["p2"]["reactome"]["9606"]] == ["GS5"]
+        # Ids of a gene in one species don't match its genes in the others
+        assert list(results["p2"]["go"]) == ["9606"]
+        assert [gs["_id"] for gs in results["1"]["go"]["10090"]] == ["GS4"]
+        assert results["none"] == {}
+        results = genesets.find(["1", "CDK2"], scopes=["mygene_id"], taxids=["9606"])
+        assert list(results["1"]) == ["go", "reactome"]
+        assert list(results["1"]["go"]) == ["9606"]
+        assert results["CDK2"] == {}
+        results = genesets.find(["1"], sources=["reactome"])
+        assert [gs["_id"] for gs in results["1"]["reactome"]["9606"]] == ["GS5"]
+
+    def test_006_multispecies(self):
+        docs = copy.deepcopy(DOCS) + [
+            {
+                "_id": "GS5",
+                "name": "Geneset 5",
+                "source": "wikipathways",
+                "taxid": ["9606", "10090"],
+                "genes": [
+                    {"mygene_id": "1", "taxid": 9606},
+                    {"mygene_id": "2", "taxid": 9606},
+                    {"mygene_id": "11", "taxid": 10090},
+                ],
+            },
+        ]
+        genesets = GenesetIndex.from_documents(docs)
+        # Each species has the genes of the geneset in that species
+        results = genesets.enrich(["1", "2"], "9606", max_fdr=1)
+        gs5 = [hit for hit in results["hits"] if hit["_id"] == "GS5"][0]
+        assert gs5["count"] == 2
+        results = genesets.enrich(["11"], "10090", max_fdr=1)
+        assert [hit["_id"] for hit in results["hits"]] == ["GS5"]
+        assert genesets.find(["11"], taxids=["10090"])["11"] == {
+            "wikipathways": {"10090": [{"_id": "GS5", "name": "Geneset 5"}]}
+        }
+        assert genesets.get_genes("GS5") == ("9606", ["1", "2"])
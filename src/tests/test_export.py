@@ -0,0 +1,87 @@
+# Test the streaming export of query results
+
+import asyncio
+import json
+import os
+import sys
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from web.export import iter_hits, to_gmt_line, to_ndjson_line
+
+
+class FakeClient:
+    """Serves `n_docs` hits sorted by _id with search_after, like a PIT search."""
+
+    def __init__(self, n_docs):
+        self.docs = [{"_id": str(i), "_source": {"name": f"Geneset {i}"}} for i in range(n_docs)]
+        self.open_pits = set()
+        self.searches = []
+
+    async def open_point_in_time(self, index, keep_alive):
+        self.open_pits.add("pit")
+        return {"id": "pit"}
+
+    async def close_point_in_time(self, id):
+        self.open_pits.remove(id)
+
+    async def search(self, **body):
+        assert "index" not in body and "from" not in body
+        assert body["sort"][-1] == "_shard_doc"
+        self.searches.append(dict(body))
+        start = body["search_after"][0] + 1 if "search_after" in body else 0
+        page = self.docs[start : start + body["size"]]
+        hits = [dict(hit, sort=[start + i]) for i, hit in enumerate(page)]
+        return {"pit_id": body["pit"]["id"], "hits": {"hits": hits}}
+
+
+class TestExport:
+    def test_001_iter_hits(self):
+        async def run(n_docs):
+            client = FakeClient(n_docs)
+            pages = []
+            body = {"query": {"match_all": {}}, "from": 20, "size": 10}
+            async for hits in iter_hits(client, "mygeneset_current", body, page_size=100):
+                pages.append(len(hits))
+            assert not client.open_pits
+            return pages, client
+
+        pages, client = asyncio.run(run(250))
+        assert pages == [100, 100, 50]
+        assert client.searches[0]["sort"] == ["_shard_doc"]
+        # No empty search is needed after a partial page, but is after a full one
+        assert asyncio.run(run(200))[0] == [100, 100]
+        assert len(asyncio.run(run(200))[1].searches) == 3
+        assert asyncio.run(run(0))[0] == []
+
+    def test_002_close_early(self):
+        async def run():
+            client = FakeClient(1000)
+            pages = iter_hits(client, "mygeneset_current", {}, page_size=10)
+            try:
+                async for hits in pages:
+                    break
+            finally:
+                await pages.aclose()
+            return client
+
+        assert not asyncio.run(run()).open_pits
+
+    def test_003_lines(self):
+        doc = {
+            "_id": "WP1",
+            "name": "Name\twith tab",
+            "genes": [
+                {"mygene_id": "1017", "symbol": "CDK2"},
+                {"mygene_id": ["1", "2"], "symbol": "A1BG"},
+                {"mygene_id": "3"},
+                {"mygene_id": "1017", "symbol": "CDK2"},
+            ],
+        }
+        assert to_gmt_line(doc) == "WP1\tName with tab\t1017\t1\t2\t3\n"
+        assert to_gmt_line(doc, "symbol") == "WP1\tName with tab\tCDK2\tA1BG\n"
+        assert to_gmt_line({"_id": "WP2", "name": "Empty"}) == "WP2\tEmpty\n"
+        line = to_ndjson_line(doc)
+        assert line.endswith("}\n") and line.count("\n") == 1
+        assert json.loads(line) == doc
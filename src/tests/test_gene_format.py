@@ -0,0 +1,72 @@
+# Test the compact gene formats of query results
+
+import os
+import sys
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from web.pipeline import MyGenesetResultFormatter, compact_genes, get_compact_source
+
+
+class TestGeneFormat:
+    def test_001_compact_source(self):
+        fields = ["_id", "genes", "name", "taxid"]
+        assert get_compact_source(fields, "ids") == ["_id", "name", "taxid", "genes.mygene_id"]
+        assert get_compact_source(fields, "summary") == ["_id", "name", "taxid", "count", "-genes"]
+        assert get_compact_source(["name", "genes.symbol"], "ids") == ["name", "genes.mygene_id"]
+        # Fields without genes are kept as they are
+        assert get_compact_source(["name", "count"], "ids") == ["name", "count"]
+        assert get_compact_source(["all"], "summary") == ["-genes"]
+        assert get_compact_source(None, "ids") == [
+            "-genes.source_id",
+            "-genes.symbol",
+            "-genes.name",
+            "-genes.ncbigene",
+            "-genes.ensemblgene",
+            "-genes.uniprot",
+            "-genes.taxid",
+        ]
+
+    def test_002_compact_genes(self):
+        doc = {"_id": "A", "genes": [{"mygene_id": "1"}, {"mygene_id": ["2", "3"]}, {}]}
+        assert compact_genes(doc, "ids") == {"_id": "A", "genes": ["1", "2", "3"]}
+        doc = {"_id": "A", "genes": {"mygene_id": "1"}}
+        assert compact_genes(doc, "ids") == {"_id": "A", "genes": ["1"]}
+        doc = {"_id": "A", "count": 2, "fields": {"gene_sample": ["CDK2", "A1BG"]}}
+        assert compact_genes(doc, "summary") == {
+            "_id": "A",
+            "count": 2,
+            "gene_sample": ["CDK2", "A1BG"],
+        }
+        assert compact_genes({"_id": "A"}, "summary") == {"_id": "A", "gene_sample": []}
+        doc = {"_id": "A", "genes": [{"mygene_id": "1"}]}
+        assert compact_genes(dict(doc), "full") == doc
+
+    def test_003_formatter(self):
+        response = {
+            "took": 1,
+            "hits": {
+                "total": 1,
+                "max_score": 1.0,
+                "hits": [
+                    {
+                        "_index": "mygeneset_current",
+                        "_id": "GO_0000082",
+                        "_score": 1.0,
+                        "_source": {"name": "G1/S transition", "count": 2},
+                        "fields": {"gene_sample": ["CDK2", "CCNE1"]},
+                    }
+                ],
+            },
+        }
+        result = MyGenesetResultFormatter().transform(response, gene_format="summary")
+        assert result["hits"] == [
+            {
+                "_id": "GO_0000082",
+                "_score": 1.0,
+                "name": "G1/S transition",
+                "count": 2,
+                "gene_sample": ["CDK2", "CCNE1"],
+            }
+        ]
@@ -0,0 +1,61 @@
+# Test the gene operations of user geneset updates
+
+import os
+import sys
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from utils.geneset_creation import (
+    GENE_UPDATE_SCRIPT,
+    add_genes,
+    gene_update_body,
+    remove_genes,
+    update_not_found,
+)
+
+
+def gene(mygene_id, taxid=9606, **kwargs):
+    return {"mygene_id": mygene_id, "source_id": mygene_id, "taxid": taxid, **kwargs}
+
+
+class TestGeneMerge:
+    def test_001_add_genes(self):
+        genes = [gene("1001"), gene("1002")]
+        # A known gene with other fields isn't added again
+        new_genes = [gene("1002", symbol="CDH4"), gene("1003"), gene("1003")]
+        merged, added = add_genes(genes, new_genes)
+        assert [g["mygene_id"] for g in merged] == ["1001", "1002", "1003"]
+        assert added == [gene("1003")]
+        assert "symbol" not in merged[1]
+        assert [g["mygene_id"] for g in genes] == ["1001", "1002"]
+
+    def test_002_remove_genes(self):
+        genes = [gene("1001"), gene("1002"), gene("1003")]
+        kept, removed = remove_genes(genes, ["1003", "1001", "1001", "9999"])
+        assert kept == [gene("1002")]
+        assert removed == ["1001", "1003"]
+
+    def test_003_update_not_found(self):
+        geneset = {"not_found": {"ids": "1", "count": 1}}
+        update_not_found(geneset, add=["2", "1", "3"], remove=["3"])
+        assert geneset["not_found"] == {"ids": ["1", "2"], "count": 2}
+        geneset = {"genes": []}
+        update_not_found(geneset, remove=["1"])
+        assert "not_found" not in geneset
+        update_not_found(geneset, add=["1"])
+        assert geneset["not_found"] == {"ids": ["1"], "count": 1}
+
+    def test_004_gene_update_body(self):
+        body = gene_update_body(
+            {"name": "Renamed"}, added=[gene("1003")], removed={"1001"}, not_found_add=("42",)
+        )
+        assert body["script"]["source"] == GENE_UPDATE_SCRIPT
+        assert body["script"]["lang"] == "painless"
+        assert body["script"]["params"] == {
+            "fields": {"name": "Renamed"},
+            "add": [gene("1003")],
+            "remove": ["1001"],
+            "not_found_add": ["42"],
+            "not_found_remove": [],
+        }
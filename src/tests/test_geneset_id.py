@@ -0,0 +1,91 @@
+# Test the allocation of user geneset ids
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from utils.geneset_creation import GenesetIdAllocator, generate_geneset_id, to_base62
+
+
+def create_ids(count):
+    return [generate_geneset_id() for _ in range(count)]
+
+
+class FrozenClock:
+    """A clock that only moves when told to, to create many ids in the same millisecond."""
+
+    def __init__(self, seconds=1700000000.0):
+        self.seconds = seconds
+
+    def __call__(self):
+        return self.seconds
+
+
+class TestGenesetIdAllocator:
+    def test_001_format(self):
+        _id = generate_geneset_id()
+        assert _id.startswith("mygst:")
+        assert len(_id) == len("mygst:") + 15
+        assert to_base62(0, 3) == "000"
+        assert to_base62(61, 2) == "0z"
+        assert to_base62(62, 2) == "10"
+
+    def test_002_sorted_by_time(self):
+        clock = FrozenClock()
+        allocate = GenesetIdAllocator(clock=clock)
+        ids = []
+        for step in (0.001, 0.5, 10, 86400 * 365):
+            ids.append(allocate())
+            ids.append(allocate())
+            clock.seconds += step
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+
+    def test_003_same_millisecond(self):
+        # More ids than the sequence numbers of a millisecond
+        allocate = GenesetIdAllocator(clock=FrozenClock())
+        ids = [allocate() for _ in range(10000)]
+        assert len(set(ids)) == 10000
+        assert ids == sorted(ids)
+
+    def test_004_clock_going_back(self):
+        clock = FrozenClock()
+        allocate = GenesetIdAllocator(clock=clock)
+        first = allocate()
+        clock.seconds -= 60
+        second = allocate()
+        assert second > first
+
+    def test_005_concurrent_workers(self):
+        # 8 workers, each with 4 threads creating genesets as fast as they can
+        workers = [GenesetIdAllocator() for _ in range(8)]
+        assert len({worker.worker_id for worker in workers}) == 8
+
+        def create(allocate):
+            return [allocate() for _ in range(10000)]
+
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            batches = list(executor.map(create, [w for w in workers for _ in range(4)]))
+        ids = [_id for batch in batches for _id in batch]
+        assert len(ids) == 320000
+        assert len(set(ids)) == len(ids)
+
+    def test_006_forked_worker(self):
+        allocate = GenesetIdAllocator()
+        worker_id = allocate.worker_id
+        # What a forked process sees: the same allocator in another process
+        allocate._pid = -1
+        assert allocate.worker_id != worker_id
+        assert GenesetIdAllocator(worker_id="abcdef").worker_id == "abcdef"
+
+    def test_007_forked_processes(self):
+        # Worker processes forked after the parent created ids, like tornado's
+        generate_geneset_id()
+        with multiprocessing.get_context("fork").Pool(4) as pool:
+            batches = pool.map(create_ids, [20000] * 8)
+        ids = [_id for batch in batches for _id in batch]
+        assert len(set(ids)) == len(ids) == 160000
@@ -0,0 +1,33 @@
+# Test GMT file reader utils
+
+import os
+import sys
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from utils.gmt import GMTFile
+
+GMT_TEXT = (
+    "Pathway A\tR-HSA-1\tABL1\tJAK2\tTP53\n"
+    "Pathway B\tR-HSA-2\tJAK2\n"
+    "Pathway C\tR-HSA-3\n"
+    "Pathway D\tR-HSA-4\tTP53\tBRCA1\tABL1\n"
+)
+
+
+class TestGMT:
+    def test_001_read(self, tmp_path):
+        filename = os.path.join(tmp_path, "test.gmt")
+        with open(filename, "w") as f:
+            f.write(GMT_TEXT)
+        gmt = GMTFile.read(filename)
+        assert len(gmt) == 4
+        # Unique genes, in the order they are first seen
+        assert gmt.genes == ["ABL1", "JAK2", "TP53", "BRCA1"]
+        assert gmt.offsets.tolist() == [0, 3, 4, 4, 7]
+        assert list(gmt) == [
+            (line.split("\t")[0], line.split("\t")[1], line.split("\t")[2:])
+            for line in GMT_TEXT.splitlines()
+        ]
+        assert gmt.get_genes(2) == []
@@ -0,0 +1,78 @@
+# Test the cache of the /metadata geneset counts
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from web.handlers.metadata import GenesetStatsCache
+
+
+class FakeCounts:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"curated": 6, "user": 4, "anonymous": self.calls}
+
+
+class TestGenesetStatsCache:
+    def test_001_concurrent_requests(self):
+        async def run():
+            cache = GenesetStatsCache()
+            count_stats = FakeCounts()
+            results = await asyncio.gather(*[cache.get(count_stats, ttl=60) for _ in range(5)])
+            assert count_stats.calls == 1
+            assert all(stats["anonymous"] == 1 for stats in results)
+            assert (await cache.get(count_stats, ttl=60))["anonymous"] == 1
+            assert count_stats.calls == 1
+
+        asyncio.run(run())
+
+    def test_002_refresh_in_background(self):
+        async def run():
+            cache = GenesetStatsCache()
+            count_stats = FakeCounts()
+            await cache.get(count_stats, ttl=0)
+            # Expired counts are served while new ones are fetched
+            assert (await cache.get(count_stats, ttl=0))["anonymous"] == 1
+            await cache.refreshing
+            assert count_stats.calls == 2
+            assert (await cache.get(count_stats, ttl=60))["anonymous"] == 2
+
+        asyncio.run(run())
+
+    def test_003_invalidate(self):
+        async def run():
+            cache = GenesetStatsCache()
+            count_stats = FakeCounts()
+            await cache.get(count_stats, ttl=60)
+            cache.invalidate()
+            assert (await cache.get(count_stats, ttl=60))["anonymous"] == 2
+
+        asyncio.run(run())
+
+    def test_004_failed_refresh(self):
+        async def run():
+            cache = GenesetStatsCache()
+            count_stats = FakeCounts()
+            await cache.get(count_stats, ttl=0)
+
+            async def fail():
+                raise ConnectionError("Elasticsearch is unavailable")
+
+            # The stale counts are served, and the error is handled in the background
+            assert (await cache.get(fail, ttl=0))["anonymous"] == 1
+            assert (await cache.refreshing)["anonymous"] == 1
+            assert cache.refreshing is None
+            cache.invalidate()
+            with pytest.raises(ConnectionError):
+                await cache.get(fail, ttl=60)
+
+        asyncio.run(run())
@@ -0,0 +1,77 @@
+# Test MyChem.info lookup utils, with a local transport instead of mychem.info
+
+import os
+import sys
+
+import pytest
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from utils.mychem_lookup import MyChemLookup, ReplayTransport
+
+CHEMICALS = {
+    "BSYNRYMUTXBXSQ-UHFFFAOYSA-N": [{"_id": "BSYNRYMUTXBXSQ-UHFFFAOYSA-N", "pubchem.cid": 2244}],
+    "RZVAJINKPMORJF-UHFFFAOYSA-N": [{"_id": "RZVAJINKPMORJF-UHFFFAOYSA-N", "pubchem.cid": 1983}],
+}
+
+
+class FakeTransport:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, ids, fields):
+        self.batches.append(list(ids))
+        response = []
+        for i in ids:
+            hits = CHEMICALS.get(i, [{"notfound": True}])
+            response.extend({"query": i, **hit} for hit in hits)
+        return response
+
+
+class TestMyChemLookup:
+    def test_001_batches(self):
+        transport = FakeTransport()
+        ids = list(CHEMICALS) + ["NOTFOUND1", "NOTFOUND2", "NOTFOUND3"]
+        lookup = MyChemLookup(batch_size=2, workers=2, transport=transport)
+        lookup.query_mychem(ids)
+        assert sorted(len(batch) for batch in transport.batches) == [1, 2, 2]
+        results = lookup.get_results(ids)
+        assert sorted(results) == sorted(CHEMICALS)
+        assert results["BSYNRYMUTXBXSQ-UHFFFAOYSA-N"]["pubchem.cid"] == 2244
+        # Found and not found ids are cached
+        lookup.query_mychem(ids)
+        assert len(transport.batches) == 3
+
+    def test_002_cache_file(self, tmp_path):
+        cache_file = os.path.join(tmp_path, "mychem_cache.json")
+        ids = list(CHEMICALS) + ["NOTFOUND1"]
+        MyChemLookup(cache_file=cache_file, transport=FakeTransport()).query_mychem(ids)
+
+        transport = FakeTransport()
+        lookup = MyChemLookup(cache_file=cache_file, transport=transport)
+        lookup.query_mychem(ids + ["NOTFOUND2"])
+        assert transport.batches == [["NOTFOUND2"]]
+        assert sorted(lookup.get_results(ids)) == sorted(CHEMICALS)
+
+        # Ids that weren't found are queried again after `not_found_ttl` days
+        transport = FakeTransport()
+        MyChemLookup(cache_file=cache_file, not_found_ttl=0, transport=transport).query_mychem(ids)
+        assert transport.batches == [["NOTFOUND1"]]
+
+        # The cache is ignored if it has other fields
+        transport = FakeTransport()
+        MyChemLookup(fields="pubchem.cid", cache_file=cache_file, transport=transport).query_mychem(ids)
+        assert len(transport.batches[0]) == 3
+
+    def test_003_replay(self, tmp_path):
+        filename = os.path.join(tmp_path, "mychem_responses.json")
+        ids = list(CHEMICALS) + ["NOTFOUND1"]
+        recording = MyChemLookup(transport=ReplayTransport(filename, FakeTransport()))
+        recording.query_mychem(ids)
+
+        replaying = MyChemLookup(transport=ReplayTransport(filename))
+        replaying.query_mychem(ids)
+        assert replaying.get_results(ids) == recording.get_results(ids)
+        with pytest.raises(KeyError):
+            replaying.query_mychem(["NOTRECORDED"])
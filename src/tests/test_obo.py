@@ -0,0 +1,68 @@
+# Test OBO parser utils
+
+import os
+import sys
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from utils.obo import parse_obo
+
+OBO_TEXT = """format-version: 1.2
+data-version: doid/releases/2024-01-01/doid-non-classified.obo
+
+[Term]
+id: DOID:4
+name: disease
+def: "A disease is a \\"disposition\\" to undergo pathological processes." [url:http://example.org]
+xref: MESH:D004194
+
+[Term]
+id: DOID:1612  ! breast cancer
+name: breast cancer
+namespace: disease_ontology
+alt_id: DOID:1614
+is_a: DOID:4 ! disease
+relationship: part_of DOID:4 ! disease
+relationship: has_part DOID:9
+synonym: "breast tumor" EXACT []
+xref: MIM:114480
+xref: MIM:PS114480 {source="MIM"}
+
+[Term]
+id: DOID:9
+name: obsolete term
+is_obsolete: true
+
+[Typedef]
+id: part_of
+name: part of
+xref: BFO:0000050
+"""
+
+
+class TestOboParser:
+    def test_001_only_term_stanzas(self):
+        terms = list(parse_obo(OBO_TEXT.splitlines(keepends=True)))
+        assert [term.id for term in terms] == ["DOID:4", "DOID:1612", "DOID:9"]
+
+    def test_002_term_fields(self):
+        terms = list(parse_obo(OBO_TEXT.splitlines(keepends=True)))
+        term = terms[1]
+        assert term.name == "breast cancer"
+        assert term.namespace == "disease_ontology"
+        assert term.alt_ids == ["DOID:1614"]
+        assert term.is_a == ["DOID:4"]
+        assert term.relationships == [("part_of", "DOID:4"), ("has_part", "DOID:9")]
+        assert term.is_obsolete is False
+        assert terms[2].is_obsolete is True
+
+    def test_003_definition_with_escaped_quotes(self):
+        term = next(parse_obo(OBO_TEXT.splitlines(keepends=True)))
+        assert term.definition == 'A disease is a "disposition" to undergo pathological processes.'
+
+    def test_004_xrefs_with_prefix(self):
+        terms = list(parse_obo(OBO_TEXT.splitlines(keepends=True)))
+        assert terms[0].xrefs_with_prefix("MIM") == []
+        assert terms[1].xrefs == ["MIM:114480", "MIM:PS114480"]
+        assert terms[1].xrefs_with_prefix("MIM") == ["114480", "PS114480"]
@@ -0,0 +1,53 @@
+# Test parser pipelining utils
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from utils.parallel import iter_prepared
+
+
+def slow_square(x):
+    time.sleep(0.01 * (x % 3))
+    return x * x
+
+
+class TestParallel:
+    def test_001_order(self):
+        expected = [x * x for x in range(10)]
+        for workers in [0, 1, 3]:
+            assert list(iter_prepared(slow_square, range(10), workers=workers)) == expected
+
+    def test_002_bounded(self):
+        started = []
+        lock = threading.Lock()
+
+        def prepare(x):
+            with lock:
+                started.append(x)
+            return x
+
+        results = iter_prepared(prepare, range(100), workers=2, max_pending=3)
+        assert next(results) == 0
+        # The consumer holds result 0: no more than 3 items were submitted
+        assert len(started) <= 3
+        results.close()
+        assert len(started) <= 3
+
+    def test_003_error(self):
+        def prepare(x):
+            if x == 2:
+                raise ValueError(x)
+            return x
+
+        results = iter_prepared(prepare, range(5), workers=2)
+        assert next(results) == 0
+        assert next(results) == 1
+        with pytest.raises(ValueError):
+            next(results)
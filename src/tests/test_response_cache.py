@@ -0,0 +1,122 @@
+# Test the in-process cache of /geneset and /query responses
+
+import asyncio
+import os
+import sys
+import time
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from web.cache import BuildVersion, ResponseCache
+
+
+class FakeIndices:
+    def __init__(self, indices):
+        self.indices = indices
+        self.calls = 0
+
+    async def get_alias(self, index):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.indices is None:
+            raise ConnectionError("Elasticsearch is unavailable")
+        return {name: {"aliases": {index: {}}} for name in self.indices}
+
+
+class FakeClient:
+    def __init__(self, indices):
+        self.indices = FakeIndices(indices)
+
+
+class TestResponseCache:
+    def test_001_get_set(self):
+        cache = ResponseCache(max_bytes=1000)
+        assert cache.get("a") is None
+        cache.set("a", '"etag-a"', b"x" * 10, "application/json; charset=UTF-8")
+        entry = cache.get("a")
+        assert entry.etag == '"etag-a"'
+        assert entry.body == b"x" * 10
+        assert entry.content_type == "application/json; charset=UTF-8"
+        # Replacing an entry doesn't count its size twice
+        cache.set("a", '"etag-b"', b"x" * 20, "application/json; charset=UTF-8")
+        assert cache.get("a").etag == '"etag-b"'
+        assert cache.size == 20
+
+    def test_002_evict_least_recently_used(self):
+        cache = ResponseCache(max_bytes=800)
+        for key in "abcd":
+            cache.set(key, key, b"x" * 100, "text/plain")
+        cache.get("a")
+        for key in "efghi":
+            cache.set(key, key, b"x" * 100, "text/plain")
+        # b was the least recently used
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.size == 800
+        assert len(cache) == 8
+
+    def test_003_skip_large_bodies(self):
+        cache = ResponseCache(max_bytes=800)
+        cache.set("a", "a", b"x" * 101, "text/plain")
+        assert cache.get("a") is None
+        assert cache.size == 0
+
+    def test_004_ttl(self):
+        cache = ResponseCache(max_bytes=1000)
+        cache.set("a", "a", b"x", "text/plain", ttl=0)
+        cache.set("b", "b", b"x", "text/plain", ttl=60)
+        time.sleep(0.01)
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
+        assert cache.size == 1
+
+    def test_005_invalidate_user(self):
+        cache = ResponseCache(max_bytes=1000)
+        generation = cache.user_generation
+        cache.set("a", "a", b"x", "text/plain", user_generation=generation)
+        cache.set("b", "b", b"x", "text/plain")
+        cache.invalidate_user()
+        assert cache.user_generation == generation + 1
+        # Stale entries are dropped, and free their bytes
+        assert cache.get("a") is None
+        assert cache.get("b") is not None
+        assert cache.size == 1
+
+
+class TestBuildVersion:
+    def test_001_get(self):
+        async def run():
+            client = FakeClient(["mygeneset_20230102", "mygeneset_20230101"])
+            build_version = BuildVersion(client, "mygeneset_current", check_interval=60)
+            results = await asyncio.gather(*[build_version.get() for _ in range(5)])
+            assert results == ["mygeneset_20230101,mygeneset_20230102"] * 5
+            assert client.indices.calls == 1
+            await build_version.get()
+            assert client.indices.calls == 1
+
+        asyncio.run(run())
+
+    def test_002_new_build(self):
+        async def run():
+            client = FakeClient(["mygeneset_20230101"])
+            build_version = BuildVersion(client, "mygeneset_current", check_interval=0)
+            assert await build_version.get() == "mygeneset_20230101"
+            client.indices.indices = ["mygeneset_20230201"]
+            # The known build is served while the new one is checked
+            assert await build_version.get() == "mygeneset_20230101"
+            await build_version.checking
+            assert await build_version.get() == "mygeneset_20230201"
+
+        asyncio.run(run())
+
+    def test_003_unavailable(self):
+        async def run():
+            client = FakeClient(None)
+            build_version = BuildVersion(client, "mygeneset_current", check_interval=60)
+            assert await build_version.get() is None
+            client.indices.indices = ["mygeneset_20230101"]
+            # Failed checks are retried
+            assert await build_version.get() == "mygeneset_20230101"
+
+        asyncio.run(run())
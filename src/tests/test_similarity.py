@@ -0,0 +1,73 @@
+# Test the MinHash/LSH search of similar genesets
+
+import os
+import random
+import sys
+
+import numpy as np
+import pytest
+
+_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.append("{}/..".format(_path))
+
+from web.enrichment import GenesetIndex
+from web.similarity import NUM_PERM, MinHashLSH
+
+
+def make_documents(n_genesets=500, n_genes=2000, seed=0):
+    rng = random.Random(seed)
+    genesets = [rng.sample(range(n_genes), rng.randint(10, 100)) for _ in range(n_genesets)]
+    # GS0 and GS1 are near duplicates, GS2 has three quarters of GS0
+    genesets[1] = genesets[0][:-2] + [n_genes, n_genes + 1]
+    genesets[2] = genesets[0][: len(genesets[0]) * 3 // 4] + [n_genes + 2]
+    return [
+        {
+            "_id": f"GS{i}",
+            "name": f"Geneset {i}",
+            "source": "go" if i % 2 else "reactome",
+            "taxid": 9606,
+            "genes": [{"mygene_id": str(gene)} for gene in genes],
+        }
+        for i, genes in enumerate(genesets)
+    ]
+
+
+def jaccard(a, b):
+    return len(set(a) & set(b)) / len(set(a) | set(b))
+
+
+class TestSimilarity:
+    def test_001_signatures(self):
+        gene_ids = ["1017", "1018", "1019", "1020"]
+        offsets = np.array([0, 2, 2, 4])
+        gene_idx = np.array([0, 1, 3, 2])
+        lsh = MinHashLSH(gene_ids, offsets, gene_idx)
+        assert lsh.signatures.shape == (3, NUM_PERM)
+        assert (lsh.signatures[0] == lsh.signature(["1018", "1017"])).all()
+        assert (lsh.signatures[2] == lsh.signature(["1019", "1020"])).all()
+        # Empty genesets aren't candidates
+        assert lsh.candidates(lsh.signature([])).tolist() == []
+        assert lsh.candidates(lsh.signature(["1017", "1018"])).tolist() == [0]
+
+    def test_002_similar(self):
+        docs = make_documents()
+        genesets = GenesetIndex.from_documents(docs)
+        genes = [gene["mygene_id"] for gene in docs[0]["genes"]]
+        hits = genesets.similar(genes, "9606", min_jaccard=0.3)
+        assert [hit["_id"] for hit in hits] == ["GS0", "GS1", "GS2"]
+        for hit in hits:
+            other = [gene["mygene_id"] for gene in docs[int(hit["_id"][2:])]["genes"]]
+            assert hit["jaccard"] == pytest.approx(jaccard(genes, other))
+            assert hit["overlap"] == len(set(genes) & set(other))
+            assert hit["count"] == len(set(other))
+        hits = genesets.similar(genes, "9606", exclude="GS0", sources=["go"], min_jaccard=0.3)
+        assert [hit["_id"] for hit in hits] == ["GS1"]
+        assert genesets.similar(genes, "10090") is None
+
+    def test_003_get_genes(self):
+        docs = make_documents(n_genesets=10)
+        genesets = GenesetIndex.from_documents(docs)
+        taxid, genes = genesets.get_genes("GS3")
+        assert taxid == "9606"
+        assert sorted(genes) == sorted(gene["mygene_id"] for gene in docs[3]["genes"])
+        assert genesets.get_genes("WP1") is None
@@ -691,3 +691,87 @@ class TestUserGenesets(MyGenesetLocalTestBase):
         assert res.json()["genes"][1]["mygene_id"] == "507781"
         assert res.json()["genes"][1]["taxid"] == 9913
         assert len(res.json()["taxid"]) == 2
+
+    def test_bulk_create_update_genesets(self):
+        headers = {
+            "Cookie": "user=%s" % open("user_cookie.txt").read(),
+            "Content-Type": "application/json",
+        }
+        # Create a geneset to update
+        payload = json.dumps({"name": "Test bulk geneset to update", "genes": ["1001"]})
+        res = self.request(
+            f"{self.HOST}/v1/user_geneset", method="POST", headers=headers, data=payload
+        )
+        _id = res.json()["_id"]
+        time.sleep(2)
+        payload = json.dumps(
+            [
+                {"name": "Test bulk geneset 1", "genes": ["1001", "1002"]},
+                {"name": "Test bulk geneset 2", "genes": ["1002", "1003"], "is_public": False},
+                {"_id": _id, "gene_operation": "add", "genes": ["1003"]},
+                {"_id": "fake-id", "gene_operation": "add", "genes": ["1003"]},
+                {"genes": ["1001"]},
+                {"_id": _id, "gene_operation": "remove", "genes": ["1001"]},
+            ]
+        )
+        res = self.request(
+            f"{self.HOST}/v1/user_geneset/bulk", method="POST", headers=headers, data=payload
+        )
+        results = res.json()
+        assert results["success"] is False
+        items = results["items"]
+        assert len(items) == 6
+        assert items[0]["success"]
+        assert items[0]["result"] == "created"
+        assert items[0]["count"] == 2
+        assert items[1]["result"] == "created"
+        assert items[1]["name"] == "Test bulk geneset 2"
+        assert items[2]["result"] == "updated"
+        assert items[2]["_id"] == _id
+        assert items[2]["count"] == 2
+        assert items[3]["code"] == 404
+        assert items[3]["error"] == "Document does not exist."
+        assert items[4]["code"] == 400
+        assert items[4]["error"] == "Missing required body element 'name'."
+        assert items[5]["code"] == 400
+        assert items[5]["error"] == "A geneset can only be updated once per request."
+        time.sleep(2)
+        # Query to make sure they're written
+        res = self.request(f'{self.HOST}/v1/geneset/{items[0]["_id"]}', method="GET")
+        assert res.json()["name"] == "Test bulk geneset 1"
+        assert res.json()["author"] == self.ORCID_USERNAME
+        res = self.request(f"{self.HOST}/v1/geneset/{_id}", method="GET")
+        assert res.json()["genes"][1]["mygene_id"] == "1003"
+
+    def test_bulk_create_genesets_anonymous(self):
+        payload = json.dumps(
+            [
+                {"name": "Test anonymous bulk geneset", "genes": ["1001"]},
+                {"name": "Test private bulk geneset", "genes": ["1001"], "is_public": False},
+                {"_id": "fake-id", "name": "Renamed geneset"},
+            ]
+        )
+        res = self.request(
+            f"{self.HOST}/v1/user_geneset/bulk?dry_run=true", method="POST", data=payload
+        )
+        items = res.json()["items"]
+        assert items[0]["new_document"]["name"] == "Test anonymous bulk geneset"
+        assert items[0]["new_document"]["count"] == 1
+        assert items[1]["code"] == 403
+        assert items[2]["code"] == 401
+
+    def test_bulk_create_genesets_too_large(self):
+        genes = [str(i) for i in range(1, 2002)]
+        payload = json.dumps(
+            [
+                {"name": "Test oversized bulk geneset", "genes": genes},
+                {"name": "Test bulk geneset", "genes": ["1001"]},
+            ]
+        )
+        res = self.request(
+            f"{self.HOST}/v1/user_geneset/bulk?dry_run=true", method="POST", data=payload
+        )
+        items = res.json()["items"]
+        assert items[0]["code"] == 400
+        assert items[0]["error"] == "A geneset can have at most 2000 genes."
+        assert items[1]["new_document"]["count"] == 1
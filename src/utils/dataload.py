@@ -0,0 +1,53 @@
+"""Readers for local data files that may be gzip-compressed.
+
+Plugins can read ".gz" downloads directly, without the dumper uncompressing
+them to disk first:
+
+    >>> from utils.dataload import tabfile_feeder
+    >>> for row in tabfile_feeder("goa_human.gaf.gz", header=0):
+    ...     print(row[4])
+
+When python-isal is installed, it is used to decompress, in a separate thread
+so that decompression runs while the file is parsed. Otherwise the standard
+`gzip` module is used.
+"""
+
+import csv
+import gzip
+import io
+
+try:
+    from isal import igzip_threaded
+except ImportError:
+    igzip_threaded = None
+
+# Read buffer size for data files
+READ_BUFFER_SIZE = 1 << 20
+
+
+def open_binary(path, buffering=READ_BUFFER_SIZE):
+    """Open `path` for reading bytes, decompressing it on the fly if it ends with ".gz"."""
+    if path.endswith(".gz"):
+        if igzip_threaded is not None:
+            return igzip_threaded.open(path, "rb", threads=1, block_size=buffering)
+        return io.BufferedReader(gzip.GzipFile(path, "rb"), buffer_size=buffering)
+    return open(path, "rb", buffering=buffering)
+
+
+def open_text(path, encoding="utf-8", buffering=READ_BUFFER_SIZE):
+    """Open `path` for reading text, decompressing it on the fly if it ends with ".gz"."""
+    return io.TextIOWrapper(open_binary(path, buffering), encoding=encoding, newline="")
+
+
+def tabfile_feeder(datafile, header=1, sep="\t"):
+    """
+    Generator that yields each row of `datafile` as a list of fields,
+    like `biothings.utils.dataload.tabfile_feeder()`, but with a large read
+    buffer and ".gz" files decompressed as they are read (see `open_text()`).
+    The first `header` lines are skipped.
+    """
+    with open_text(datafile) as in_f:
+        reader = csv.reader(in_f, delimiter=sep)
+        for _ in range(header):
+            next(reader, None)
+        yield from reader
@@ -1,16 +1,89 @@
 """Utility functions for creating and editing user genesets."""
 
+import os
 import random
+import threading
+import time
 
+# In ASCII order, so that encoded numbers of the same width sort as the numbers do
+BASE62 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
 
-def generate_geneset_id():
-    """Generate short random geneset ids."""
-    # Generate six random integers between 0 and 61
-    random_ints = [random.randint(0, 61) for _ in range(6)]
-    # Convert to BASE62
-    alphabet = "0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    base62str = "".join([alphabet[i] for i in random_ints])
-    return f"mygst:{base62str}"
+
+def to_base62(number, width):
+    """Encode a non-negative integer as a base62 string of `width` characters."""
+    chars = []
+    for _ in range(width):
+        number, digit = divmod(number, 62)
+        chars.append(BASE62[digit])
+    if number:
+        raise ValueError("Number too large for {} base62 characters.".format(width))
+    return "".join(reversed(chars))
+
+
+class GenesetIdAllocator:
+    """Allocate unique geneset ids without checking Elasticsearch.
+
+    An id is made of the time of its creation in milliseconds, a sequence
+    number within the millisecond and the id of the worker process:
+
+        mygst:<7 chars time><2 chars sequence><6 chars worker>
+
+    Ids are unique within a worker as long as it doesn't create more than
+    3844 genesets per millisecond, beyond which it borrows the next
+    milliseconds, and between workers as long as their random worker ids
+    differ (about 1 in 57 billion for two workers). They sort by creation time.
+    """
+
+    # 2021-01-01T00:00:00Z, the time part overflows after 111 years
+    EPOCH_MS = 1609459200000
+    TIME_WIDTH = 7
+    SEQUENCE_WIDTH = 2
+    WORKER_WIDTH = 6
+
+    def __init__(self, worker_id=None, clock=time.time):
+        """`worker_id` is a fixed worker id, by default a random one is drawn for each process."""
+        self.clock = clock
+        self.fixed_worker_id = worker_id
+        self._worker_id = None
+        self._pid = None
+        self._last_ms = -1
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    @property
+    def worker_id(self):
+        if self.fixed_worker_id is not None:
+            return self.fixed_worker_id
+        if self._pid != os.getpid():
+            # A forked process must not share the worker id of its parent
+            self._pid = os.getpid()
+            self._worker_id = to_base62(
+                random.SystemRandom().randrange(62**self.WORKER_WIDTH), self.WORKER_WIDTH
+            )
+        return self._worker_id
+
+    def __call__(self):
+        """Return a new geneset id."""
+        with self._lock:
+            worker_id = self.worker_id
+            now_ms = int(self.clock() * 1000) - self.EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # Same millisecond, or the clock went back
+                self._sequence += 1
+                if self._sequence == 62**self.SEQUENCE_WIDTH:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return "mygst:{}{}{}".format(
+                to_base62(self._last_ms, self.TIME_WIDTH),
+                to_base62(self._sequence, self.SEQUENCE_WIDTH),
+                worker_id,
+            )
+
+
+generate_geneset_id = GenesetIdAllocator()
 
 
 def get_gene_list(geneset):
@@ -38,3 +111,111 @@ def update_taxid(geneset):
     else:
         geneset["taxid"] = list(unique_species)
     return geneset
+
+
+def add_genes(genes, new_genes):
+    """Add the genes of `new_genes` whose mygene_id isn't in `genes` yet.
+    Return the merged gene list, and the list of added genes."""
+    present = {gene["mygene_id"] for gene in genes}
+    added = []
+    for gene in new_genes:
+        if gene["mygene_id"] not in present:
+            present.add(gene["mygene_id"])
+            added.append(gene)
+    return genes + added, added
+
+
+def remove_genes(genes, gene_ids):
+    """Remove the genes whose mygene_id is in `gene_ids`.
+    Return the remaining gene list, and the list of removed mygene_ids."""
+    gene_ids = set(gene_ids)
+    kept = []
+    removed = []
+    for gene in genes:
+        if gene["mygene_id"] in gene_ids:
+            removed.append(gene["mygene_id"])
+        else:
+            kept.append(gene)
+    return kept, list(dict.fromkeys(removed))
+
+
+def get_not_found_ids(geneset):
+    """Get the ids of the 'not_found' field of a geneset, always return a list."""
+    ids = (geneset.get("not_found") or {}).get("ids") or []
+    if not isinstance(ids, list):
+        ids = [ids]
+    return ids
+
+
+def update_not_found(geneset, add=(), remove=()):
+    """Add and remove ids from the 'not_found' field of a geneset document.
+    The field is only created when there are ids to add."""
+    if geneset.get("not_found") is None and not add:
+        return geneset
+    ids = get_not_found_ids(geneset)
+    remove = set(remove)
+    ids = [_id for _id in dict.fromkeys(ids + list(add)) if _id not in remove]
+    geneset["not_found"] = {"ids": ids, "count": len(ids)}
+    return geneset
+
+
+# Makes the same changes as add_genes(), remove_genes(), update_taxid() and update_not_found()
+# to a geneset document in Elasticsearch, so that an update only sends the changed genes.
+GENE_UPDATE_SCRIPT = """
+def doc = ctx._source;
+for (entry in params.fields.entrySet()) {
+    doc[entry.getKey()] = entry.getValue();
+}
+def genes = doc.genes;
+if (genes == null) {
+    genes = new ArrayList();
+} else if (!(genes instanceof List)) {
+    genes = [genes];
+}
+Set removed = new HashSet(params.remove);
+genes.removeIf(gene -> removed.contains(gene.mygene_id));
+Set present = new HashSet();
+for (gene in genes) {
+    present.add(gene.mygene_id);
+}
+for (gene in params.add) {
+    if (present.add(gene.mygene_id)) {
+        genes.add(gene);
+    }
+}
+doc.genes = genes;
+doc.count = genes.size();
+Set taxids = new LinkedHashSet();
+for (gene in genes) {
+    taxids.add(gene.taxid);
+}
+doc.taxid = taxids.size() == 1 ? taxids.iterator().next() : new ArrayList(taxids);
+if (doc.not_found != null || params.not_found_add.size() > 0) {
+    Set ids = new LinkedHashSet();
+    if (doc.not_found != null && doc.not_found.ids != null) {
+        def old_ids = doc.not_found.ids;
+        ids.addAll(old_ids instanceof List ? old_ids : [old_ids]);
+    }
+    ids.addAll(params.not_found_add);
+    ids.removeAll(params.not_found_remove);
+    doc.not_found = ['ids': new ArrayList(ids), 'count': ids.size()];
+}
+"""
+
+
+def gene_update_body(fields, added=(), removed=(), not_found_add=(), not_found_remove=()):
+    """Return the body of an Elasticsearch update request that sets the metadata `fields` of a
+    geneset, adds the genes `added`, and removes the genes with a mygene_id in `removed`."""
+    return {
+        "script": {
+            "source": GENE_UPDATE_SCRIPT,
+            "lang": "painless",
+            "params": {
+                "fields": fields,
+                "add": list(added),
+                "remove": list(removed),
+                "not_found_add": list(not_found_add),
+                "not_found_remove": list(not_found_remove),
+            },
+        }
+    }
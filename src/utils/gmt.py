@@ -0,0 +1,77 @@
+"""Reader for GMT (Gene Matrix Transposed) files, shared by the GMT-based plugins.
+
+Each line of a GMT file is a geneset: its name, a description (or URL), and
+its gene ids, separated by tabs. `GMTFile.read()` parses a file in a single
+pass, collecting the unique gene ids of all genesets on the way, so that they
+can be looked up at once before the documents are built:
+
+    >>> gmt = GMTFile.read("ReactomePathways.gmt")
+    >>> gene_lookup.query_mygene(gmt.genes, "symbol,alias")
+    >>> for name, description, genes in gmt:
+    ...     lookup_results = gene_lookup.get_results(genes)
+"""
+
+import numpy as np
+
+from utils.dataload import tabfile_feeder
+
+
+class GMTFile:
+    """
+    Genesets of a GMT file, with gene membership stored in CSR form: the
+    genes of the i-th geneset are `genes[gene_idx[offsets[i]:offsets[i + 1]]]`.
+
+    Attributes:
+        names (list): Name (first column) of each geneset, in file order.
+        descriptions (list): Description (second column) of each geneset.
+        genes (list): Unique gene ids (str) of all genesets, in file order.
+        offsets (numpy.ndarray): Start of the genes of each geneset in
+            `gene_idx`, with one more value for the end of the last one.
+        gene_idx (numpy.ndarray): Positions in `genes` of the genes of each
+            geneset, in file order.
+    """
+
+    __slots__ = ("names", "descriptions", "genes", "offsets", "gene_idx")
+
+    def __init__(self, names, descriptions, genes, offsets, gene_idx):
+        self.names = names
+        self.descriptions = descriptions
+        self.genes = genes
+        self.offsets = offsets
+        self.gene_idx = gene_idx
+
+    @classmethod
+    def read(cls, filename):
+        """Parse the GMT file `filename` (which may be gzip-compressed) in a single pass."""
+        names = []
+        descriptions = []
+        gene_positions = {}
+        offsets = [0]
+        gene_idx = []
+        for rec in tabfile_feeder(filename, header=0):
+            names.append(rec[0])
+            descriptions.append(rec[1])
+            for gene in rec[2:]:
+                # Number each gene id the first time it is seen
+                gene_idx.append(gene_positions.setdefault(gene, len(gene_positions)))
+            offsets.append(len(gene_idx))
+        return cls(
+            names=names,
+            descriptions=descriptions,
+            genes=list(gene_positions),
+            offsets=np.array(offsets, dtype=np.int64),
+            gene_idx=np.array(gene_idx, dtype=np.int32),
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_genes(self, i):
+        """Return the gene ids (str) of the i-th geneset, as listed in the file."""
+        genes = self.genes
+        return [genes[j] for j in self.gene_idx[self.offsets[i] : self.offsets[i + 1]].tolist()]
+
+    def __iter__(self):
+        """Yield (name, description, gene ids) tuples of the genesets, in file order."""
+        for i in range(len(self)):
+            yield self.names[i], self.descriptions[i], self.get_genes(i)
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import biothings_client
+
+
+def mychem_transport(ids, fields):
+    """Get the chemicals with `ids` from mychem.info, as `MyChemInfo.getchems()` returns them."""
+    mc = biothings_client.MyChemInfo()
+    return mc.getchems(ids, fields=fields, dotfield=True)
+
+
+class ReplayTransport:
+    """Transport that answers from the mychem.info responses recorded in a file.
+    Attributes:
+        filename (str): JSON file of recorded responses, by query.
+        transport (callable, optional): Transport used for the queries that
+            aren't recorded yet, whose responses are then added to the file.
+            Without it, querying an id that isn't recorded raises a KeyError.
+    Usage:
+        Record the responses while building a source once:
+
+        >>> transport = ReplayTransport("mychem_responses.json", mychem_transport)
+        >>> chem_lookup = MyChemLookup(transport=transport)
+
+        Then build it again offline, with the same responses:
+
+        >>> chem_lookup = MyChemLookup(transport=ReplayTransport("mychem_responses.json"))
+    """
+
+    def __init__(self, filename, transport=None):
+        self.filename = filename
+        self.transport = transport
+        self.responses = {}
+        # Batches may be sent by several threads at once
+        self.lock = threading.Lock()
+        if os.path.exists(filename):
+            with open(filename) as f:
+                self.responses = json.load(f)
+
+    def __call__(self, ids, fields):
+        missing = [i for i in ids if i not in self.responses]
+        if missing:
+            if self.transport is None:
+                raise KeyError(f"{len(missing)} queries aren't recorded in {self.filename}")
+            recorded = {i: [] for i in missing}
+            for response in self.transport(missing, fields):
+                recorded[response["query"]].append(response)
+            with self.lock:
+                self.responses.update(recorded)
+                self.save()
+        return [response for i in ids for response in self.responses[i]]
+
+    def save(self):
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, "w") as f:
+            json.dump(self.responses, f)
+        os.replace(tmp_filename, self.filename)
+
+
+class MyChemLookup:
+    """Query a list of chemical IDs against mychem.info, the counterpart of MyGeneLookup.
+    Attributes:
+        fields (str): Comma-separated fields to get for each chemical.
+        cache_file (str, optional): JSON file where the results are kept
+            between runs, so that each chemical is only queried once.
+            It is ignored if it was written for other `fields`.
+        batch_size (int): Number of ids sent in each request.
+        workers (int): Number of requests sent at the same time.
+        not_found_ttl (float): Days after which ids that weren't found are
+            queried again, since mychem.info is updated.
+        transport (callable, optional): Function that takes a list of ids and
+            `fields`, and returns the mychem.info responses. Defaults to
+            `mychem_transport()`; see `ReplayTransport` to record or replay them.
+    Usage:
+        >>> inchikeys = ["BSYNRYMUTXBXSQ-UHFFFAOYSA-N", "RZVAJINKPMORJF-UHFFFAOYSA-N"]
+        >>> chem_lookup = MyChemLookup(cache_file="mychem_cache.json")
+        >>> chem_lookup.query_mychem(inchikeys)
+        >>> results = chem_lookup.get_results(inchikeys)
+        >>> results["BSYNRYMUTXBXSQ-UHFFFAOYSA-N"]["_id"]
+    """
+
+    def __init__(
+        self,
+        fields="pubchem.cid,chembl.molecule_chembl_id",
+        cache_file=None,
+        batch_size=1000,
+        workers=2,
+        not_found_ttl=30,
+        transport=None,
+    ):
+        self.fields = fields
+        self.cache_file = cache_file
+        self.batch_size = batch_size
+        self.workers = workers
+        self.not_found_ttl = not_found_ttl
+        self.transport = transport or mychem_transport
+        self.clear_cache()
+        if cache_file and os.path.exists(cache_file):
+            self.load_cache()
+
+    def clear_cache(self):
+        """Clear the query cache."""
+        # Hits, by query
+        self._hits = {}
+        # Time when each query was found to have no hit
+        self._not_found = {}
+
+    def load_cache(self):
+        with open(self.cache_file) as f:
+            cache = json.load(f)
+        if cache.get("fields") != self.fields:
+            logging.info(f"Ignoring {self.cache_file}, which has other fields.")
+            return
+        self._hits = cache["hits"]
+        expiry = time.time() - self.not_found_ttl * 86400
+        self._not_found = {k: t for k, t in cache["not_found"].items() if t > expiry}
+
+    def save_cache(self):
+        cache = {"fields": self.fields, "hits": self._hits, "not_found": self._not_found}
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, self.cache_file)
+
+    def is_cached(self, chem_id):
+        return chem_id in self._hits or chem_id in self._not_found
+
+    def query_mychem(self, ids):
+        """Query information from mychem.info about each chemical in `ids`.
+        Ids already in the cache, found or not, aren't queried again.
+        The others are sent in batches of `batch_size`, by `workers` threads.
+        """
+        new_ids = [i for i in dict.fromkeys(ids) if i and not self.is_cached(i)]
+        diff = len(set(ids)) - len(new_ids)
+        if diff > 0:
+            logging.info(f"Found {diff} chemicals in query cache.")
+        if len(new_ids) == 0:
+            return self
+        logging.info(f"Searching for {len(new_ids)} chemicals...")
+        batches = [
+            new_ids[i : i + self.batch_size] for i in range(0, len(new_ids), self.batch_size)
+        ]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            responses = executor.map(lambda batch: self.transport(batch, self.fields), batches)
+            now = time.time()
+            for batch, response in zip(batches, responses):
+                found = set()
+                for out in response:
+                    if out.get("notfound"):
+                        continue
+                    # The last hit of a query is kept
+                    self._hits[out["query"]] = out
+                    self._not_found.pop(out["query"], None)
+                    found.add(out["query"])
+                for chem_id in batch:
+                    if chem_id not in found:
+                        self._not_found[chem_id] = now
+        logging.info(f"Could not find {sum(i in self._not_found for i in new_ids)} chemicals.")
+        if self.cache_file:
+            self.save_cache()
+        return self
+
+    def get_results(self, ids):
+        """Return a dict of the ids in `ids` that were found to their mychem.info hit."""
+        return {i: self._hits[i] for i in ids if i in self._hits}
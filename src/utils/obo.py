@@ -0,0 +1,121 @@
+"""Streaming parser for OBO ontology files.
+
+Only [Term] stanzas are returned. Each one is read in a single pass into an
+`OboTerm` with the tags used by our ontology-based plugins:
+
+    >>> from utils.obo import read_obo
+    >>> for term in read_obo("HumanDO.obo"):
+    ...     print(term.id, term.name, term.is_a, term.xrefs_with_prefix("MIM"))
+"""
+
+import re
+
+# "[Term]", "[Typedef]", "[Instance]"
+STANZA = re.compile(r"^\[(\w+)\]")
+# Tags read into `OboTerm`, all others are skipped
+TAGS = frozenset(
+    ["id", "name", "def", "namespace", "alt_id", "is_a", "relationship", "xref", "is_obsolete"]
+)
+# Quoted text at the start of a value, with escaped quotes, e.g. in "def:"
+QUOTED = re.compile(r'^"((?:[^"\\]|\\.)*)"')
+ESCAPE = re.compile(r"\\(.)")
+
+
+class OboTerm:
+    """A [Term] stanza of an OBO file.
+
+    Attributes:
+        id (str): Term id, e.g. "DOID:4".
+        name (str): Term name.
+        definition (str): Text of the "def:" tag, without quotes and xrefs.
+        namespace (str): Term namespace.
+        alt_ids (list): Alternative ids of this term.
+        is_a (list): Ids of the parent terms in "is_a:" tags.
+        relationships (list): (relationship type, parent id) tuples.
+        xrefs (list): Cross-references, e.g. "MIM:601665".
+        is_obsolete (bool): True if the term is marked as obsolete.
+    """
+
+    __slots__ = (
+        "id",
+        "name",
+        "definition",
+        "namespace",
+        "alt_ids",
+        "is_a",
+        "relationships",
+        "xrefs",
+        "is_obsolete",
+    )
+
+    def __init__(self):
+        self.id = None
+        self.name = None
+        self.definition = None
+        self.namespace = None
+        self.alt_ids = []
+        self.is_a = []
+        self.relationships = []
+        self.xrefs = []
+        self.is_obsolete = False
+
+    def __repr__(self):
+        return f"OboTerm({self.id!r}, {self.name!r})"
+
+    def xrefs_with_prefix(self, prefix):
+        """Return the local ids of the cross-references to `prefix`, e.g. "MIM"."""
+        prefix += ":"
+        return [xref[len(prefix) :] for xref in self.xrefs if xref.startswith(prefix)]
+
+
+def parse_obo(lines):
+    """Yield an `OboTerm` for each [Term] stanza in `lines`."""
+    term = None
+    for line in lines:
+        if line.startswith("["):
+            if term is not None and term.id is not None:
+                yield term
+            stanza = STANZA.match(line)
+            term = OboTerm() if stanza and stanza.group(1) == "Term" else None
+            continue
+        if term is None:
+            # Header or a stanza we don't read
+            continue
+        tag, sep, value = line.partition(":")
+        if not sep or tag not in TAGS:
+            continue
+        # The value may be followed by a "! comment", which is dropped
+        # by only reading its first token, except for names and definitions.
+        value = value.strip()
+        if not value:
+            continue
+        if tag == "id":
+            term.id = value.split(None, 1)[0]
+        elif tag == "name":
+            term.name = value
+        elif tag == "def":
+            quoted = QUOTED.match(value)
+            if quoted:
+                term.definition = ESCAPE.sub(r"\1", quoted.group(1))
+        elif tag == "namespace":
+            term.namespace = value.split(None, 1)[0]
+        elif tag == "alt_id":
+            term.alt_ids.append(value.split(None, 1)[0])
+        elif tag == "is_a":
+            term.is_a.append(value.split(None, 1)[0])
+        elif tag == "relationship":
+            tokens = value.split(None, 2)
+            if len(tokens) >= 2:
+                term.relationships.append((tokens[0], tokens[1]))
+        elif tag == "xref":
+            term.xrefs.append(value.split(None, 1)[0])
+        elif tag == "is_obsolete":
+            term.is_obsolete = value.split(None, 1)[0] == "true"
+    if term is not None and term.id is not None:
+        yield term
+
+
+def read_obo(path, buffering=1 << 20):
+    """Open the OBO file at `path` and yield its terms (see `parse_obo()`)."""
+    with open(path, "r", buffering=buffering) as obo_fh:
+        yield from parse_obo(obo_fh)
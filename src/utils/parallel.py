@@ -0,0 +1,49 @@
+"""Helpers to overlap the slow steps of a parser with the upload of its documents.
+
+A parser that builds documents in independent units (e.g. one organism at a
+time) can prepare the next units in worker threads while the documents of the
+current one are yielded and indexed:
+
+    >>> def load_data(data_dir):
+    ...     for prepared in iter_prepared(prepare_organism, organisms, workers=2):
+    ...         yield from build_documents(prepared)
+
+Threads suit steps that mostly wait on the network or on disk, such as
+mygene.info queries.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+def iter_prepared(func, items, workers=1, max_pending=None):
+    """
+    Generator that yields `func(item)` for each of `items`, in order.
+
+    With `workers` > 0, `func` runs in that many threads, ahead of the
+    consumer: up to `max_pending` results (2 per worker by default) are
+    computed or waiting while the consumer handles the previous one.
+    With `workers` = 0, each item is only prepared when it is consumed.
+    An exception raised by `func` is raised when its result is reached.
+    """
+    if workers < 1:
+        for item in items:
+            yield func(item)
+        return
+
+    max_pending = max_pending or 2 * workers
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Don't start the items left if the consumer stops early
+        # (shutdown(cancel_futures=True) needs Python 3.9)
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark of the gene_format option of /query, run locally as a standalone
+script:
+
+    python benchmark.py [hits] [genes]
+
+Elasticsearch isn't queried: a response of `hits` genesets (50 by default)
+of `genes` genes each (2000 by default, a large GO term) is generated with
+what Elasticsearch returns for each gene_format, and the time to format and
+serialize it is measured, with the size of the payload.
+"""
+
+import random
+import sys
+import time
+
+sys.path.append("../")
+
+from biothings.utils import serializer
+from web.pipeline import MyGenesetResultFormatter
+
+
+def make_gene(i):
+    return {
+        "mygene_id": str(i),
+        "source_id": f"UniProtKB:P{i:05d}",
+        "symbol": f"GENE{i}",
+        "name": f"gene {i} involved in some biological process",
+        "ncbigene": str(i),
+        "ensemblgene": f"ENSG{i:011d}",
+        "uniprot": f"P{i:05d}",
+        "taxid": 9606,
+    }
+
+
+def make_response(n_hits, n_genes, gene_format, seed=0):
+    rng = random.Random(seed)
+    hits = []
+    for i in range(n_hits):
+        genes = [make_gene(rng.randrange(60000)) for _ in range(n_genes)]
+        source = {
+            "name": f"GO term {i}",
+            "description": "A large Gene Ontology term",
+            "source": "go",
+            "taxid": 9606,
+            "count": n_genes,
+        }
+        hit = {"_index": "mygeneset_current", "_id": f"GO_{i:07d}", "_score": 1.0}
+        if gene_format == "full":
+            source["genes"] = genes
+        elif gene_format == "ids":
+            source["genes"] = [{"mygene_id": gene["mygene_id"]} for gene in genes]
+        else:
+            hit["fields"] = {"gene_sample": [gene["symbol"] for gene in genes[:10]]}
+        hit["_source"] = source
+        hits.append(hit)
+    return {"took": 1, "hits": {"total": n_hits, "max_score": 1.0, "hits": hits}}
+
+
+def bench_gene_formats(n_hits, n_genes, repeat=5):
+    print(f"{n_hits} hits of {n_genes} genes")
+    formatter = MyGenesetResultFormatter()
+    for gene_format in ("full", "ids", "summary"):
+        elapsed = 0
+        for _ in range(repeat):
+            response = make_response(n_hits, n_genes, gene_format)
+            t0 = time.perf_counter()
+            payload = serializer.to_json(formatter.transform(response, gene_format=gene_format))
+            elapsed += time.perf_counter() - t0
+        print(
+            f"  {gene_format:<8} {len(payload) / 1e6:8.3f} MB  {elapsed / repeat * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    n_hits = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    n_genes = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    bench_gene_formats(n_hits, n_genes)
@@ -0,0 +1,119 @@
+"""
+In-process cache of API responses.
+
+Curated genesets only change with a new build of the curated index, so their
+responses are cached under the concrete indices of the build, and served
+again, or answered with 304 Not Modified, without querying Elasticsearch.
+Responses that can include user genesets are also keyed on the user, and
+dropped when they are requested again after a user geneset write of this
+process (which increments a generation counter), or after a short time for
+the writes of other processes.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+
+class CachedResponse:
+    __slots__ = ("etag", "body", "content_type", "expires", "user_generation")
+
+    def __init__(self, etag, body, content_type, expires=None, user_generation=None):
+        self.etag = etag
+        self.body = body
+        self.content_type = content_type
+        self.expires = expires
+        self.user_generation = user_generation
+
+
+class ResponseCache:
+    """
+    LRU cache of response bodies, bounded by their total size in bytes.
+
+    Attributes:
+        max_bytes (int): Largest total size of the cached bodies.
+        user_generation (int): Incremented by `invalidate_user()`, the
+            responses that can include user genesets cached with a previous
+            generation are stale.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.user_generation = 0
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the `CachedResponse` of `key`, or None if it isn't cached or is stale."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if (entry.expires is not None and entry.expires < time.monotonic()) or (
+            entry.user_generation is not None and entry.user_generation != self.user_generation
+        ):
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def set(self, key, etag, body, content_type, ttl=None, user_generation=None):
+        """
+        Cache a response body, for `ttl` seconds if given, evicting the least
+        recently used. A response that can include user genesets is given
+        the `user_generation` it was made with.
+        """
+        # A single large response shouldn't flush most of the cache
+        if len(body) > self.max_bytes // 8:
+            return
+        if key in self.entries:
+            self._remove(key)
+        expires = time.monotonic() + ttl if ttl is not None else None
+        self.entries[key] = CachedResponse(etag, body, content_type, expires, user_generation)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        self.size -= len(self.entries.pop(key).body)
+
+    def invalidate_user(self):
+        """Make the cached responses that can include user genesets stale."""
+        self.user_generation += 1
+
+
+class BuildVersion:
+    """
+    Concrete indices of the index (or alias) `index`, checked again in the
+    background every `check_interval` seconds.
+    """
+
+    def __init__(self, client, index, check_interval=60):
+        self.client = client
+        self.index = index
+        self.check_interval = check_interval
+        self.build = None
+        self.checked = 0
+        self.checking = None
+
+    async def _check(self):
+        try:
+            response = await self.client.indices.get_alias(index=self.index)
+            self.build = ",".join(sorted(response))
+            self.checked = time.monotonic()
+        except Exception:
+            logging.exception("Could not get the build of %s", self.index)
+        finally:
+            self.checking = None
+        return self.build
+
+    async def get(self):
+        """Return the build, or None if it can't be found."""
+        if self.checking is None and time.monotonic() - self.checked > self.check_interval:
+            self.checking = asyncio.ensure_future(self._check())
+        if self.build is None and self.checking is not None:
+            return await asyncio.shield(self.checking)
+        return self.build
@@ -1,8 +1,24 @@
 import config
 from biothings.web.query import AsyncESQueryBackend
+from web.cache import BuildVersion, ResponseCache
+from web.enrichment import EnrichmentIndexService
+from web.export import iter_hits
 
 
 class MyGenesetQueryBackend(AsyncESQueryBackend):
+    def __init__(self, client, *args, **kwargs):
+        super().__init__(client, *args, **kwargs)
+        # Build of the curated genesets, for the response cache and /enrich
+        self.build_version = BuildVersion(
+            client, config.ES_CURATED_INDEX, config.CURATED_BUILD_CHECK_INTERVAL
+        )
+        # In-memory index of the curated genesets for /enrich
+        self.enrichment = EnrichmentIndexService(
+            client, self.build_version, config.ENRICH_INDEX_CHECK_INTERVAL
+        )
+        # Cache of GET responses, keyed on the build of the curated genesets
+        self.response_cache = ResponseCache(config.RESPONSE_CACHE_MAX_BYTES)
+
     def adjust_index(self, original_index, query, **options):
 
         index = original_index  # keep original if include is public
@@ -15,3 +31,11 @@ class MyGenesetQueryBackend(AsyncESQueryBackend):
                 index = config.ES_USER_INDEX
 
         return index
+
+    def iter_hits(self, query, **options):
+        """
+        Iterate over all the hits of a query built by the query builder, in
+        pages of ES_SCROLL_SIZE hits, without the limit of the result window.
+        """
+        index = self.adjust_index(self.indices[options.get("biothing_type")], query, **options)
+        return iter_hits(self.client, index, query.to_dict(), self.scroll_size, self.scroll_time)
@@ -0,0 +1,514 @@
+"""
+Gene set enrichment (over-representation) analysis against curated genesets.
+
+The curated index is loaded in memory as an inverted index from each gene to
+the genesets that contain it, one per species. A query only visits the
+genesets of its genes, and the p-values of all of them are computed at once:
+
+    >>> genesets = GenesetIndex.from_documents(docs)
+    >>> results = genesets.enrich(["1017", "1018", "1019"], taxid="9606")
+
+The same index finds the genesets of genes, by any of their ids, and the
+genesets most similar to a geneset:
+
+    >>> memberships = genesets.find(["CDK2", "ENSG00000123374"])
+    >>> hits = genesets.similar(["1017", "1018", "1019"], taxid="9606")
+"""
+
+import asyncio
+import logging
+import time
+from array import array
+
+import numpy as np
+from biothings.utils.common import get_loop
+from elasticsearch.helpers import async_scan
+from scipy.special import gammaln
+from web.similarity import MinHashLSH, csr_positions
+
+# Gene fields that genes can be looked up with, case-insensitively
+GENE_SCOPES = ["mygene_id", "symbol", "ensemblgene", "uniprot"]
+# Fields of the curated genesets read to build the index
+ENRICH_SOURCE_FIELDS = ["name", "source", "taxid", "genes.taxid"] + [
+    "genes." + scope for scope in GENE_SCOPES
+]
+
+
+def _log_binom(n, k):
+    return gammaln(n + 1) - gammaln(k + 1) - gammaln(n - k + 1)
+
+
+def hypergeom_sf(k, M, n, N):
+    """
+    Return P(X >= k), where X ~ Hypergeom(M, n, N) is the number of genes of a
+    geneset of `n` genes among `N` genes drawn from `M`, for arrays `k` and `n`.
+
+    It gives the same values as `scipy.stats.hypergeom.sf(k - 1, M, n, N)`, but
+    much faster: the pmf is summed from k up with the ratio of consecutive
+    terms, and only until the terms past the mode are negligible.
+    """
+    k = np.asarray(k, dtype=np.float64)
+    n = np.asarray(n, dtype=np.float64)
+    # Below its lowest possible value, X >= k is certain
+    k = np.maximum(k, np.maximum(N - (M - n), 0))
+    upper = np.minimum(n, N)
+    mode = np.floor((n + 1) * (N + 1) / (M + 2))
+    log_term = _log_binom(n, k) + _log_binom(M - n, N - k) - _log_binom(M, N)
+    total = np.exp(log_term)
+    x = k.copy()
+    active = np.flatnonzero(x < upper)
+    while len(active):
+        xi = x[active]
+        ni = n[active]
+        log_term[active] += np.log((ni - xi) * (N - xi) / ((xi + 1) * (M - ni - N + xi + 1)))
+        x[active] = xi + 1
+        term = np.exp(log_term[active])
+        total[active] += term
+        # Stop at the last possible value, or when the terms only decrease and are negligible
+        negligible = (xi + 1 > mode[active]) & (term <= total[active] * 1e-17)
+        keep = (xi + 1 < upper[active]) & ~negligible
+        active = active[keep]
+    return np.minimum(total, 1.0)
+
+
+def benjamini_hochberg(pvalues, n_tests=None):
+    """
+    Return the Benjamini-Hochberg adjusted p-values (FDR) of `pvalues`, out
+    of `n_tests` tests (len(pvalues) by default). The tests that aren't in
+    `pvalues` are assumed to have larger p-values, e.g. 1.
+    """
+    pvalues = np.asarray(pvalues, dtype=np.float64)
+    n_tests = n_tests or len(pvalues)
+    order = np.argsort(pvalues, kind="stable")
+    ranks = np.arange(1, len(pvalues) + 1)
+    adjusted = pvalues[order] * n_tests / ranks
+    # Make them monotonic, from the largest p-value down
+    adjusted = np.minimum.accumulate(adjusted[::-1])[::-1]
+    fdr = np.empty_like(adjusted)
+    fdr[order] = np.minimum(adjusted, 1.0)
+    return fdr
+
+
+def as_list(value):
+    """Return `value` as a list: [] for None, [value] for a single value."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+class SpeciesIndexBuilder:
+    """
+    Genesets of one species to build a `SpeciesIndex` with, added one at a
+    time. Only the numbers of their genes are kept, not the gene documents,
+    so that genesets can be added as they are read from Elasticsearch.
+    """
+
+    def __init__(self):
+        self.genes = {}
+        self.aliases = {scope: {} for scope in GENE_SCOPES}
+        self.geneset_ids = []
+        self.names = []
+        self.sources = []
+        self.gene_codes = array("q")
+        self.geneset_codes = array("i")
+
+    def add(self, _id, name, source, genes):
+        """Add a geneset, with its list of gene documents."""
+        i = len(self.geneset_ids)
+        self.geneset_ids.append(_id)
+        self.names.append(name)
+        self.sources.append(source)
+        codes = set()
+        for gene in genes:
+            for mygene_id in as_list(gene.get("mygene_id")):
+                if mygene_id not in self.genes:
+                    # Curated genes all come from the same mygene.info fields,
+                    # so the first geneset of a gene has all its ids
+                    self._add_aliases(gene, len(self.genes))
+                    self.genes[mygene_id] = len(self.genes)
+                codes.add(self.genes[mygene_id])
+        self.gene_codes.extend(codes)
+        self.geneset_codes.extend([i] * len(codes))
+
+    def _add_aliases(self, gene, code):
+        for scope, aliases in self.aliases.items():
+            for alias in as_list(gene.get(scope)):
+                aliases.setdefault(str(alias).lower(), []).append(code)
+
+    def build(self):
+        return SpeciesIndex(self)
+
+
+class SpeciesIndex:
+    """
+    Curated genesets of one species, with an inverted index in CSR form: the
+    genesets that contain the gene numbered i are
+    `geneset_idx[offsets[i]:offsets[i + 1]]`.
+
+    Attributes:
+        genes (dict): Gene id to its number, for all the genes in the
+            genesets of the species (the background of the tests).
+        gene_ids (list): Gene ids, by number.
+        geneset_ids (list): Geneset _id of each geneset.
+        names (list): Name of each geneset.
+        sources (numpy.ndarray): Source of each geneset.
+        sizes (numpy.ndarray): Number of unique genes of each geneset.
+        offsets (numpy.ndarray): Start of the genesets of each gene in
+            `geneset_idx`, with one more value for the end of the last one.
+        geneset_idx (numpy.ndarray): Positions of the genesets of each gene.
+        aliases (dict): For each of GENE_SCOPES, lowercase id to the numbers
+            of the genes that have it.
+        member_offsets (numpy.ndarray): Start of the genes of each geneset in
+            `member_idx`, with one more value for the end of the last one.
+        member_idx (numpy.ndarray): Numbers of the genes of each geneset.
+        lsh (MinHashLSH): MinHash signatures of the genesets.
+    """
+
+    __slots__ = (
+        "genes",
+        "gene_ids",
+        "geneset_ids",
+        "names",
+        "sources",
+        "sizes",
+        "offsets",
+        "geneset_idx",
+        "aliases",
+        "member_offsets",
+        "member_idx",
+        "lsh",
+    )
+
+    def __init__(self, builder):
+        """Build the index from the genesets added to a `SpeciesIndexBuilder`."""
+        self.genes = builder.genes
+        self.aliases = builder.aliases
+        self.geneset_ids = builder.geneset_ids
+        self.names = builder.names
+        self.gene_ids = list(self.genes)
+        self.sources = np.array(builder.sources, dtype=object)
+
+        gene_codes = np.frombuffer(builder.gene_codes, dtype=np.int64)
+        geneset_codes = np.frombuffer(builder.geneset_codes, dtype=np.int32)
+        self.sizes = np.bincount(geneset_codes, minlength=len(self.geneset_ids))
+        order = np.argsort(gene_codes, kind="stable")
+        self.geneset_idx = geneset_codes[order]
+        self.offsets = np.zeros(len(self.genes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(gene_codes, minlength=len(self.genes)), out=self.offsets[1:])
+        # Genes are listed geneset by geneset, which is already the transposed index
+        self.member_idx = gene_codes.astype(np.int32)
+        self.member_offsets = np.zeros(len(self.geneset_ids) + 1, dtype=np.int64)
+        np.cumsum(self.sizes, out=self.member_offsets[1:])
+        self.lsh = MinHashLSH(self.gene_ids, self.member_offsets, self.member_idx)
+
+    def find(self, gene, scopes=GENE_SCOPES):
+        """Return the positions of the genesets of the genes with the id `gene` in `scopes`."""
+        gene = str(gene).lower()
+        codes = {code for scope in scopes for code in self.aliases[scope].get(gene, ())}
+        if not codes:
+            return np.empty(0, dtype=self.geneset_idx.dtype)
+        return np.unique(
+            np.concatenate(
+                [self.geneset_idx[self.offsets[code] : self.offsets[code + 1]] for code in codes]
+            )
+        )
+
+    def enrich(self, genes, sources=None, max_fdr=0.05, size=100):
+        """
+        Test each geneset for the over-representation of `genes`, with the
+        hypergeometric test (one-sided Fisher's exact test), against all the
+        genes of the species. Only the genesets from `sources` are tested
+        when it is given. Return the results of the `size` most significant
+        genesets with a Benjamini-Hochberg FDR of at most `max_fdr`.
+        """
+        query = [gene for gene in dict.fromkeys(genes) if gene in self.genes]
+        not_found = [gene for gene in dict.fromkeys(genes) if gene not in self.genes]
+        codes = np.array([self.genes[gene] for gene in query], dtype=np.int64)
+        results = {
+            "query_size": len(query),
+            "background_size": len(self.genes),
+            "not_found": not_found,
+            "hits": [],
+        }
+        if len(codes) == 0:
+            return results
+
+        # Positions in `geneset_idx` of the genesets of each query gene
+        positions, lengths = csr_positions(self.offsets, codes)
+        hit_genesets = self.geneset_idx[positions]
+        hit_genes = np.repeat(codes, lengths)
+        overlaps = np.bincount(hit_genesets, minlength=len(self.geneset_ids))
+
+        if sources:
+            in_scope = np.isin(self.sources, list(sources))
+        else:
+            in_scope = np.ones(len(self.geneset_ids), dtype=bool)
+        tested = np.flatnonzero((overlaps > 0) & in_scope)
+        n_tests = int(in_scope.sum())
+        # P(X >= overlap) where X ~ Hypergeom(background, geneset size, query size)
+        pvalues = hypergeom_sf(overlaps[tested], len(self.genes), self.sizes[tested], len(codes))
+        # Genesets without any query gene have a p-value of 1
+        fdr = benjamini_hochberg(pvalues, n_tests)
+
+        significant = np.flatnonzero(fdr <= max_fdr)
+        significant = significant[
+            np.lexsort((-overlaps[tested[significant]], pvalues[significant]))
+        ]
+        for j in significant[:size]:
+            i = tested[j]
+            overlap_genes = hit_genes[hit_genesets == i]
+            results["hits"].append(
+                {
+                    "_id": self.geneset_ids[i],
+                    "name": self.names[i],
+                    "source": self.sources[i],
+                    "count": int(self.sizes[i]),
+                    "overlap": int(overlaps[i]),
+                    "pvalue": float(pvalues[j]),
+                    "fdr": float(fdr[j]),
+                    "genes": [self.gene_ids[code] for code in overlap_genes.tolist()],
+                }
+            )
+        return results
+
+    def get_genes(self, i):
+        """Return the gene ids of the geneset at position `i`."""
+        codes = self.member_idx[self.member_offsets[i] : self.member_offsets[i + 1]]
+        return [self.gene_ids[code] for code in codes.tolist()]
+
+    def similar(self, genes, sources=None, min_jaccard=0.2, size=10, exclude=None):
+        """
+        Find the genesets most similar to `genes`, by Jaccard index. The
+        candidates of the LSH index are ranked by their estimated Jaccard
+        index, and the best of them by their exact one. Return the `size`
+        genesets from `sources` (all by default) other than `exclude`, with
+        a Jaccard index of at least `min_jaccard`.
+        """
+        genes = list(dict.fromkeys(genes))
+        signature = self.lsh.signature(genes)
+        candidates = self.lsh.candidates(signature)
+        if sources:
+            candidates = candidates[np.isin(self.sources[candidates], list(sources))]
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if len(candidates) == 0:
+            return []
+        # Only re-rank the candidates that can make it to the results
+        estimates = self.lsh.estimate(signature, candidates)
+        candidates = candidates[np.argsort(-estimates, kind="stable")[: max(4 * size, 100)]]
+
+        in_query = np.zeros(len(self.genes), dtype=bool)
+        in_query[[self.genes[gene] for gene in genes if gene in self.genes]] = True
+        positions, lengths = csr_positions(self.member_offsets, candidates)
+        overlaps = np.add.reduceat(
+            in_query[self.member_idx[positions]], np.cumsum(lengths) - lengths
+        )
+        jaccard = overlaps / (len(genes) + lengths - overlaps)
+
+        best = np.flatnonzero(jaccard >= min_jaccard)
+        best = best[np.argsort(-jaccard[best], kind="stable")[:size]]
+        return [
+            {
+                "_id": self.geneset_ids[candidates[j]],
+                "name": self.names[candidates[j]],
+                "source": self.sources[candidates[j]],
+                "count": int(lengths[j]),
+                "overlap": int(overlaps[j]),
+                "jaccard": float(jaccard[j]),
+            }
+            for j in best.tolist()
+        ]
+
+
+class GenesetIndex:
+    """
+    Curated genesets, as a `SpeciesIndex` per taxid.
+
+    Attributes:
+        species (dict): `SpeciesIndex` of each taxid.
+        positions (dict): Position in the `SpeciesIndex` of each of its taxids, of
+            each geneset _id.
+    """
+
+    def __init__(self, species):
+        self.species = species
+        self.positions = {}
+        for taxid, index in species.items():
+            for i, _id in enumerate(index.geneset_ids):
+                self.positions.setdefault(_id, {})[taxid] = i
+
+    @classmethod
+    def from_documents(cls, docs):
+        """Build the index from geneset documents, with the ENRICH_SOURCE_FIELDS fields."""
+        builder = GenesetIndexBuilder()
+        builder.add_all(docs)
+        return builder.build()
+
+    def __len__(self):
+        return sum(len(species.geneset_ids) for species in self.species.values())
+
+    def enrich(self, genes, taxid, **kwargs):
+        """Run `SpeciesIndex.enrich()` on the genesets of `taxid`, or return None if it has none."""
+        species = self.species.get(str(taxid))
+        if species is None:
+            return None
+        return species.enrich(genes, **kwargs)
+
+    def get_genes(self, _id):
+        """
+        Return the taxid and gene ids of the geneset `_id`, or None if it isn't
+        curated. A geneset of several species has the taxid with the most genes.
+        """
+        if _id not in self.positions:
+            return None
+        genes = [
+            (taxid, self.species[taxid].get_genes(i)) for taxid, i in self.positions[_id].items()
+        ]
+        return max(genes, key=lambda species_genes: len(species_genes[1]))
+
+    def similar(self, genes, taxid, exclude=None, **kwargs):
+        """
+        Run `SpeciesIndex.similar()` on the genesets of `taxid`, other than
+        the geneset _id `exclude`, or return None if it has none.
+        """
+        species = self.species.get(str(taxid))
+        if species is None:
+            return None
+        kwargs["exclude"] = self.positions.get(exclude, {}).get(str(taxid))
+        return species.similar(genes, **kwargs)
+
+    def find(self, genes, scopes=GENE_SCOPES, taxids=None, sources=None):
+        """
+        Find the genesets of each of `genes`, from `taxids` and `sources`
+        only when they are given. Return a dict of each gene to its genesets
+        grouped by source and taxid, e.g.
+        {"CDK2": {"go": {"9606": [{"_id": "GO_0000082", "name": "..."}]}}}.
+        """
+        results = {gene: {} for gene in genes}
+        for taxid, species in self.species.items():
+            if taxids and taxid not in taxids:
+                continue
+            for gene, memberships in results.items():
+                for i in species.find(gene, scopes).tolist():
+                    source = species.sources[i]
+                    if sources and source not in sources:
+                        continue
+                    memberships.setdefault(source, {}).setdefault(taxid, []).append(
+                        {"_id": species.geneset_ids[i], "name": species.names[i]}
+                    )
+        return results
+
+
+class GenesetIndexBuilder:
+    """Geneset documents to build a `GenesetIndex` with, added one at a time."""
+
+    def __init__(self):
+        self.species = {}
+
+    def add(self, doc):
+        """Add a geneset document, with the ENRICH_SOURCE_FIELDS fields."""
+        genes = as_list(doc.get("genes"))
+        taxids = as_list(doc.get("taxid"))
+        if len(taxids) == 1:
+            genes_by_taxid = {str(taxids[0]): genes}
+        else:
+            # A geneset of several species is split in a geneset for each of them,
+            # so that it's found with the genes of each species
+            genes_by_taxid = {}
+            for gene in genes:
+                if gene.get("taxid") is not None:
+                    genes_by_taxid.setdefault(str(gene["taxid"]), []).append(gene)
+        for taxid, species_genes in genes_by_taxid.items():
+            if taxid not in self.species:
+                self.species[taxid] = SpeciesIndexBuilder()
+            self.species[taxid].add(doc["_id"], doc.get("name"), doc.get("source"), species_genes)
+
+    def add_all(self, docs):
+        for doc in docs:
+            self.add(doc)
+
+    def build(self):
+        return GenesetIndex({taxid: builder.build() for taxid, builder in self.species.items()})
+
+
+class EnrichmentIndexService:
+    """
+    Keep a `GenesetIndex` of the curated Elasticsearch index in memory.
+
+    The index is loaded when the service is created, at startup. Every
+    `check_interval` seconds, a request checks in the background whether the
+    `BuildVersion` of the curated index (shared with the response cache) has
+    changed, and reloads it if so. Requests use the previous `GenesetIndex`
+    until the new one is ready.
+    """
+
+    # Hits added to the index at a time while the curated index is scanned
+    page_size = 1000
+
+    def __init__(self, client, build_version, check_interval=600):
+        self.client = client
+        self.build_version = build_version
+        self.index = build_version.index
+        self.check_interval = check_interval
+        self.genesets = None
+        # Concrete indices of the loaded build
+        self.build = None
+        self.checked = 0
+        self.loading = get_loop().create_task(self.refresh())
+
+    async def _load(self):
+        # Hits are reduced to gene numbers as they're scanned, a page at a time, so that
+        # only one page of documents is in memory
+        loop = asyncio.get_running_loop()
+        builder = GenesetIndexBuilder()
+        page = []
+        async for hit in async_scan(
+            self.client, index=self.index, query={"_source": ENRICH_SOURCE_FIELDS}
+        ):
+            hit["_source"]["_id"] = hit["_id"]
+            page.append(hit["_source"])
+            if len(page) == self.page_size:
+                # Outside of the event loop, like the arrays
+                await loop.run_in_executor(None, builder.add_all, page)
+                page = []
+        await loop.run_in_executor(None, builder.add_all, page)
+        return await loop.run_in_executor(None, builder.build)
+
+    async def refresh(self):
+        """Load the index again if it points to a new build."""
+        try:
+            self.checked = time.monotonic()
+            build = await self.build_version.get()
+            if build is None:
+                raise RuntimeError("The build of {} is unknown".format(self.index))
+            if build != self.build:
+                t0 = time.monotonic()
+                self.genesets = await self._load()
+                self.build = build
+                logging.info(
+                    "Loaded %d genesets of %s for enrichment in %.1fs",
+                    len(self.genesets),
+                    build,
+                    time.monotonic() - t0,
+                )
+        except Exception:
+            # Keep serving the previous index, if any
+            logging.exception("Could not load genesets of %s for enrichment", self.index)
+        finally:
+            self.loading = None
+        return self.genesets
+
+    async def get(self):
+        """
+        Return the current `GenesetIndex`, waiting for it only if it isn't
+        loaded yet, or None if it can't be loaded.
+        """
+        if self.loading is None and (
+            self.genesets is None or time.monotonic() - self.checked > self.check_interval
+        ):
+            self.loading = asyncio.ensure_future(self.refresh())
+        if self.genesets is None:
+            return await asyncio.shield(self.loading)
+        return self.genesets
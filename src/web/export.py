@@ -0,0 +1,67 @@
+"""
+Streaming export of query results, as NDJSON or GMT.
+
+Hits are read page by page with `search_after` in a point in time (PIT), so
+an export isn't limited by the result window of Elasticsearch and only holds
+one page in memory:
+
+    >>> async for hits in iter_hits(client, index, query.to_dict()):
+    ...     handler.write("".join(to_gmt_line(hit["_source"]) for hit in hits))
+    ...     await handler.flush()
+"""
+
+import json
+
+from web.enrichment import as_list
+
+# Gene fields that GMT files can list genes with
+GMT_GENE_FIELDS = ("mygene_id", "symbol", "ncbigene", "ensemblgene", "uniprot")
+
+
+async def iter_hits(client, index, body, page_size=1000, keep_alive="1m"):
+    """
+    Iterate over all the hits of the search `body` in `index`, yielding them
+    as lists of up to `page_size` hits. `from` and `size` of `body` are
+    ignored. The PIT is closed even if the iteration is interrupted.
+    """
+    body = dict(body)
+    body.pop("from", None)
+    body["size"] = page_size
+    # A PIT search needs a unique sort, which _shard_doc is
+    body["sort"] = as_list(body.get("sort")) + ["_shard_doc"]
+    pit_id = (await client.open_point_in_time(index=index, keep_alive=keep_alive))["id"]
+    try:
+        while True:
+            body["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+            response = await client.search(**body)
+            hits = response["hits"]["hits"]
+            if not hits:
+                break
+            # The PIT id may change from a page to the next
+            pit_id = response.get("pit_id", pit_id)
+            yield hits
+            if len(hits) < page_size:
+                break
+            body["search_after"] = hits[-1]["sort"]
+    finally:
+        await client.close_point_in_time(id=pit_id)
+
+
+def to_ndjson_line(doc):
+    """Return a document as a line of NDJSON."""
+    return json.dumps(doc, separators=(",", ":")) + "\n"
+
+
+def to_gmt_line(doc, gene_field="mygene_id"):
+    """
+    Return a geneset document as a line of a GMT file: its _id, its name,
+    and the `gene_field` ids of its genes.
+    """
+    genes = []
+    for gene in as_list(doc.get("genes")):
+        for gene_id in as_list(gene.get(gene_field)):
+            genes.append(str(gene_id))
+    genes = list(dict.fromkeys(genes))
+    # Tabs and newlines would break the line in columns or lines
+    name = " ".join(str(doc.get("name") or "").split())
+    return "\t".join([str(doc["_id"]), name] + genes) + "\n"
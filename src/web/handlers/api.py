@@ -3,6 +3,8 @@ API handler for MyGeneset submit/ endpoint
 """
 
 import json
+import logging
+from collections import Counter
 from datetime import datetime, timezone
 
 import elasticsearch
@@ -10,21 +12,219 @@ from biothings.utils.dataload import dict_sweep, unlist
 from biothings.web.auth.authn import BioThingsAuthnMixin
 from biothings.web.handlers import BaseAPIHandler
 from biothings.web.handlers.query import BiothingHandler, QueryHandler
-from tornado.web import HTTPError
-from utils.geneset_creation import generate_geneset_id, get_gene_list, update_taxid
+from elasticsearch.helpers import async_scan
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
+from tornado.escape import utf8
+from tornado.web import HTTPError, RequestHandler
+from utils.geneset_creation import (
+    add_genes,
+    gene_update_body,
+    generate_geneset_id,
+    get_gene_list,
+    get_not_found_ids,
+    remove_genes,
+    update_not_found,
+    update_taxid,
+)
 from utils.mygene_lookup import MyGeneLookup
+from web.enrichment import GENE_SCOPES, as_list
+from web.export import GMT_GENE_FIELDS, to_gmt_line, to_ndjson_line
+from web.pipeline import compact_genes
+from web.handlers.metadata import geneset_stats
 
 
-class MyGenesetQueryHandler(BioThingsAuthnMixin, QueryHandler):
+class CachedResponseMixin:
+    """
+    Serve GET responses from the response cache of the query backend, and
+    answer conditional requests with 304 Not Modified when the ETag matches.
+    Handlers also need `ResponseBodyRecorder` as their last base class.
+    """
+
+    _cache_key = None
+    # Generation of the user genesets the response was made with, None if it has none
+    _cache_generation = None
+
+    def _is_curated(self):
+        """Return True if the response can only include curated genesets."""
+        return self.args.get("include") == "curated"
+
+    async def _get_cache_key(self):
+        """Return the cache key of the request, or None if it can't be cached."""
+        if self.request.method != "GET":
+            return None
+        backend = self.biothings.elasticsearch.pipeline.backend
+        build = await backend.build_version.get()
+        if build is None:
+            return None
+        query_args = tuple(sorted((k, tuple(v)) for k, v in self.request.query_arguments.items()))
+        key = (self.name, self.request.path, query_args, build)
+        if not self._is_curated():
+            key += (self.current_user["username"] if self.current_user else None,)
+            self._cache_generation = backend.response_cache.user_generation
+        return key
+
+    async def _serve_from_cache(self):
+        """Finish the request with its cached response, returning False on a miss."""
+        self._cache_key = await self._get_cache_key()
+        if self._cache_key is None:
+            return False
+        entry = self.biothings.elasticsearch.pipeline.backend.response_cache.get(self._cache_key)
+        if entry is None:
+            # Record the serialized body of the response to cache it
+            self._recorded_chunks = []
+            return False
+        self._cache_key = None
+        self.set_header("Etag", entry.etag)
+        if self.check_etag_header():
+            self.set_status(304)
+        else:
+            self.set_header("Content-Type", entry.content_type)
+            # Write the cached bytes as they are, without serializing them again
+            RequestHandler.write(self, entry.body)
+        self.finish()
+        return True
+
+    def finish(self, chunk=None):
+        key, self._cache_key = self._cache_key, None
+        if key is None or self.get_status() != 200:
+            return super().finish(chunk)
+        if chunk is not None:
+            self.write(chunk)
+        # A 200 response gets its ETag in finish(), which can turn it into a 304
+        future = super().finish()
+        etag = self._headers.get("Etag")
+        if etag is not None and self._recorded_chunks is not None:
+            # Responses that can include user genesets may be changed by other processes
+            ttl = None if self._is_curated() else self.biothings.config.RESPONSE_CACHE_USER_TTL
+            self.biothings.elasticsearch.pipeline.backend.response_cache.set(
+                key,
+                etag,
+                b"".join(self._recorded_chunks),
+                self._headers.get("Content-Type"),
+                ttl,
+                user_generation=self._cache_generation,
+            )
+        return future
+
+
+class ResponseBodyRecorder(RequestHandler):
+    """
+    Keep the serialized chunks written to the response once `_recorded_chunks`
+    is set to a list. It must come after the biothings handler in the base
+    classes, to get the bytes serialized by its write().
+    """
+
+    _recorded_chunks = None
+
+    def write(self, chunk):
+        if self._recorded_chunks is not None:
+            if isinstance(chunk, dict):
+                # Left to tornado to serialize, not cached
+                self._recorded_chunks = None
+            else:
+                self._recorded_chunks.append(utf8(chunk))
+        super().write(chunk)
+
+
+class MyGenesetQueryHandler(
+    CachedResponseMixin, BioThingsAuthnMixin, QueryHandler, ResponseBodyRecorder
+):
     """ "Handler for /{ver}/query endpoint."""
 
+    kwargs = {
+        "*": {
+            "format": {
+                "type": str,
+                "default": "json",
+                "enum": ("json", "yaml", "html", "msgpack", "ndjson", "gmt"),
+            },
+        },
+        "GET": {
+            "gmt_genes": {"type": str, "default": "mygene_id", "enum": GMT_GENE_FIELDS},
+        },
+    }
+    # Formats that export all the hits of a query, one page at a time
+    export_formats = {
+        "ndjson": "application/x-ndjson; charset=UTF-8",
+        "gmt": "text/tab-separated-values; charset=UTF-8",
+    }
+
     def prepare(self):
         super().prepare()
         if self.current_user:
             self.args["current_user"] = self.current_user["username"]
 
+    async def _export(self):
+        """Stream all the hits of the query, as NDJSON or GMT lines."""
+        if self.args.scroll_id:
+            raise HTTPError(
+                400, reason="scroll_id can't be used with format={}.".format(self.format)
+            )
+        options = dict(self.args)
+        q = options.pop("q", None)
+        options.pop("from", None)
+        options.pop("size", None)
+        if self.format == "gmt":
+            options["_source"] = ["name", "genes." + self.args.gmt_genes]
+            options["gene_format"] = "full"
+        try:
+            query = self.pipeline.builder.build(q, **options)
+        except (ValueError, TypeError) as exc:
+            raise HTTPError(400, reason=str(exc))
+
+        self.clear_header("Cache-Control")
+        self.set_header("Content-Type", self.export_formats[self.format])
+        written = False
+        try:
+            pages = self.pipeline.backend.iter_hits(query, **options)
+            try:
+                async for hits in pages:
+                    lines = []
+                    for hit in hits:
+                        doc = {"_id": hit["_id"], **hit["_source"]}
+                        if self.format == "gmt":
+                            lines.append(to_gmt_line(doc, self.args.gmt_genes))
+                            continue
+                        if "fields" in hit:
+                            doc["fields"] = hit["fields"]
+                        lines.append(to_ndjson_line(compact_genes(doc, self.args.gene_format)))
+                    self.write("".join(lines))
+                    # Send each page as a chunk, so that only one is in memory
+                    await self.flush()
+                    written = True
+            finally:
+                # Close the PIT even if the client went away
+                await pages.aclose()
+        except StreamClosedError:
+            # The client went away, the PIT is closed anyway
+            return
+        except elasticsearch.ApiError as exc:
+            if written:
+                # Too late for an error status, cut the response short instead
+                logging.exception("Export of %s failed", self.request.uri)
+                self.request.connection.close()
+                return
+            raise HTTPError(getattr(exc, "status_code", 500), reason=str(exc.message))
+        self.finish()
+
+    async def get(self, *args, **kwargs):
+        if self.format in self.export_formats:
+            return await self._export()
+        # Scrolls move on with each request
+        if not (self.args.fetch_all or self.args.scroll_id) and await self._serve_from_cache():
+            return
+        return await super().get(*args, **kwargs)
 
-class MyGenesetBiothingHandler(BioThingsAuthnMixin, BiothingHandler):
+    async def post(self, *args, **kwargs):
+        if self.format in self.export_formats:
+            raise HTTPError(400, reason="format={} is only supported by GET.".format(self.format))
+        return await super().post(*args, **kwargs)
+
+
+class MyGenesetBiothingHandler(
+    CachedResponseMixin, BioThingsAuthnMixin, BiothingHandler, ResponseBodyRecorder
+):
     """ "Handler for /{ver}/geneset endpoint."""
 
     def prepare(self):
@@ -32,6 +232,16 @@ class MyGenesetBiothingHandler(BioThingsAuthnMixin, BiothingHandler):
         if self.current_user:
             self.args["current_user"] = self.current_user["username"]
 
+    def _is_curated(self):
+        # User geneset ids all start with "mygst:", other ids can only be curated genesets
+        _id = self.args.get("id")
+        return super()._is_curated() or (isinstance(_id, str) and not _id.startswith("mygst:"))
+
+    async def get(self, *args, **kwargs):
+        if await self._serve_from_cache():
+            return
+        return await super().get(*args, **kwargs)
+
 
 class UserGenesetHandler(BioThingsAuthnMixin, BaseAPIHandler):
     """
@@ -69,18 +279,29 @@ class UserGenesetHandler(BioThingsAuthnMixin, BaseAPIHandler):
             raise HTTPError(404, None, {"id": _id}, reason="Document does not exist.")
         return document
 
-    async def _query_mygene(self, genes):
-        """ "Take a list of mygene.info ids and return a list of gene objects."""
+    def _lookup_mygene(self, genes):
+        """Query a list of mygene.info ids, and return the MyGeneLookup with their results."""
         mygene = MyGeneLookup(species="all", cache_dict={})
         mygene.fields_to_query.append("taxid")  # We need the taxid to generate the species list.
         mygene.query_mygene(genes, id_types="_id")
-        results = mygene.get_results(genes)
+        return mygene
+
+    async def _query_mygene(self, genes, lookup=None):
+        """ "Take a list of mygene.info ids and return a list of gene objects.
+        `lookup` is a MyGeneLookup that already queried the ids, shared between genesets."""
+        if lookup is None:
+            # The mygene client blocks, keep the IOLoop serving other requests
+            lookup = await IOLoop.current().run_in_executor(None, self._lookup_mygene, genes)
+        # get_results() turns the ids into tuples in place
+        results = lookup.get_results(list(genes))
         return results
 
-    async def _create_user_geneset(self, name, author, genes=[], is_public=True, description=""):
+    async def _create_user_geneset(
+        self, name, author, genes=[], is_public=True, description="", lookup=None
+    ):
         """ "Create a user geneset document.
         Used by POST ./user_geneset/ and PUT ./user_geneset/<_id> when gene_opertation is 'replace'."""
-        geneset = await self._query_mygene(genes)  # Generate gene list
+        geneset = await self._query_mygene(genes, lookup)  # Generate gene list
         # Update metadata
         geneset.update(
             {"name": name, "author": author, "description": description, "is_public": is_public}
@@ -90,6 +311,79 @@ class UserGenesetHandler(BioThingsAuthnMixin, BaseAPIHandler):
         geneset = unlist(geneset)  # Flatten lists with one element
         return geneset
 
+    async def _update_user_geneset(
+        self, geneset, payload, gene_operation, user, lookup=None, updated=None
+    ):
+        """Apply the changes of an update request body to a user geneset document.
+        Used by PUT ./user_geneset/<_id> and POST ./user_geneset/bulk.
+        Returns the updated document, and the body of the Elasticsearch update request
+        that makes the same changes, which only has the added and removed genes for
+        the 'add' and 'remove' gene operations."""
+        # Update metadata
+        fields = {}
+        for elem in ["name", "description", "is_public"]:
+            if payload.get(elem) is not None:
+                fields[elem] = payload[elem]
+        if updated is not None:
+            fields["updated"] = updated
+        geneset.update(fields)
+        body = {"doc": fields}
+        # Update genes
+        if payload.get("genes") is not None:
+            if gene_operation is None:
+                raise HTTPError(400, reason="Missing argument 'gene_operation'.")
+            if gene_operation == "replace":
+                # HACK: this method only overwrites fields, it doesn't delete them
+                # The only way to empty the not_found, duplicates, and gene lists is to overwrite them with empty lists.
+                # There may be a way to delete fields on edit, it would be cleaner if someone can figure it out:
+                # https://stackoverflow.com/questions/29002215/remove-a-field-from-a-elasticsearch-document
+                if geneset.get("not_found"):
+                    geneset["not_found"]["ids"] = []
+                    geneset["not_found"]["count"] = 0
+                if geneset.get("duplicates"):
+                    geneset["duplicates"]["ids"] = []
+                    geneset["duplicates"]["count"] = 0
+                if len(payload["genes"]) == 0:
+                    geneset["genes"] = []
+                    geneset["count"] = 0
+                else:
+                    new_geneset = await self._create_user_geneset(
+                        name=geneset["name"],
+                        genes=payload["genes"],
+                        author=user,
+                        description=geneset.get("description"),
+                        is_public=geneset["is_public"],
+                        lookup=lookup,
+                    )
+                    geneset.update(new_geneset)
+                body = {"doc": geneset}
+            elif gene_operation == "remove":
+                if geneset.get("genes"):
+                    genes, removed = remove_genes(get_gene_list(geneset), payload["genes"])
+                    geneset.update({"genes": genes, "count": len(genes)})
+                    geneset = update_taxid(geneset)
+                    # Remove genes from not_found list
+                    not_found = set(get_not_found_ids(geneset)).intersection(payload["genes"])
+                    geneset = update_not_found(geneset, remove=not_found)
+                    if removed or not_found:
+                        body = gene_update_body(fields, removed=removed, not_found_remove=not_found)
+            elif gene_operation == "add":
+                query_results = await self._query_mygene(payload["genes"], lookup)
+                genes, added = add_genes(get_gene_list(geneset), get_gene_list(query_results))
+                geneset.update({"genes": genes, "count": len(genes)})
+                geneset = update_taxid(geneset)
+                # Add not_found to not_found list
+                not_found = query_results.get("not_found", {}).get("ids", [])
+                geneset = update_not_found(geneset, add=not_found)
+                if added or not_found:
+                    body = gene_update_body(fields, added=added, not_found_add=not_found)
+            else:
+                raise HTTPError(
+                    400,
+                    reason="Argument 'gene operation' must be one of: 'replace', 'add', 'remove'.",
+                )
+        return geneset, body
+
     def _validate_input(self, request_type, payload):
         """Validate request body."""
         # name
@@ -132,10 +426,13 @@ class UserGenesetHandler(BioThingsAuthnMixin, BaseAPIHandler):
         elif request_type == "PUT":
             if payload.get("genes") is not None and not isinstance(payload["genes"], list):
                 raise HTTPError(400, reason="Body element 'genes' must be a list.")
-        if len(payload["genes"]) > 0 and not all(
+        if len(payload.get("genes") or []) > 0 and not all(
             isinstance(gene, str) for gene in payload["genes"]
         ):
             raise HTTPError(400, reason="All gene ids must be strings.")
+        max_size = self.biothings.config.MAX_GENESET_SIZE
+        if len(payload.get("genes") or []) > max_size:
+            raise HTTPError(400, reason=f"A geneset can have at most {max_size} genes.")
         return payload
 
     async def post(self):
@@ -167,20 +464,16 @@ class UserGenesetHandler(BioThingsAuthnMixin, BaseAPIHandler):
             _now = str(datetime.now(timezone.utc).replace(microsecond=0).isoformat())
             geneset.update({"created": _now})
             geneset.update({"updated": _now})
-            while True:
-                try:
-                    _id = generate_geneset_id()
-                    # The param op_type=create indexes the document only if _id doesn't exist
-                    response = await self.biothings.elasticsearch.async_client.index(
-                        id=_id,
-                        body=geneset,
-                        index=self.biothings.config.ES_USER_INDEX,
-                        op_type="create",
-                    )
-                    break
-                except elasticsearch.exceptions.ConflictError:
-                    # Keep generating new ids until we get a unique one
-                    continue
+            # Generated ids are unique, op_type=create only guards against overwriting a document
+            response = await self.biothings.elasticsearch.async_client.index(
+                id=generate_geneset_id(),
+                body=geneset,
+                index=self.biothings.config.ES_USER_INDEX,
+                op_type="create",
+            )
+            # Updates don't change the author, so only creation and deletion change the counts
+            geneset_stats.invalidate()
+            self.biothings.elasticsearch.pipeline.backend.response_cache.invalidate_user()
             self.finish(
                 {
                     "success": True,
@@ -211,87 +504,21 @@ class UserGenesetHandler(BioThingsAuthnMixin, BaseAPIHandler):
         document_owner = document["_source"].get("author")
         geneset = document["_source"]
         if document_owner == user:
-            # Update metadata
-            for elem in ["name", "description", "is_public"]:
-                if payload.get(elem) is not None:
-                    geneset.update({elem: payload[elem]})
-            # Update genes
-            if payload.get("genes") is not None:
-                gene_operation = self.get_argument("gene_operation", None)
-                if gene_operation is None:
-                    raise HTTPError(400, reason="Missing argument 'gene_operation'.")
-                if gene_operation == "replace":
-                    # HACK: this method only overwrites fields, it doesn't delete them
-                    # The only way to empty the not_found, duplicates, and gene lists is to overwrite them with empty lists.
-                    # There may be a way to delete fields on edit, it would be cleaner if someone can figure it out:
-                    # https://stackoverflow.com/questions/29002215/remove-a-field-from-a-elasticsearch-document
-                    if geneset.get("not_found"):
-                        geneset["not_found"]["ids"] = []
-                        geneset["not_found"]["count"] = 0
-                    if geneset.get("duplicates"):
-                        geneset["duplicates"]["ids"] = []
-                        geneset["duplicates"]["count"] = 0
-                    if len(payload["genes"]) == 0:
-                        geneset["genes"] = []
-                        geneset["count"] = 0
-                    else:
-                        new_geneset = await self._create_user_geneset(
-                            name=geneset["name"],
-                            genes=payload["genes"],
-                            author=user,
-                            description=geneset.get("description"),
-                            is_public=geneset["is_public"],
-                        )
-                        geneset.update(new_geneset)
-                elif gene_operation == "remove":
-                    if geneset.get("genes"):
-                        gene_dict = {gene["mygene_id"]: gene for gene in geneset["genes"]}
-                        for geneid in payload["genes"]:
-                            gene_dict.pop(geneid, None)
-                        geneset.update({"genes": list(gene_dict.values())})
-                        # Update count
-                        geneset["count"] = len(geneset["genes"])
-                        # Remove genes from not_found list
-                        if geneset.get("not_found"):
-                            geneset["not_found"]["ids"] = list(
-                                set(geneset["not_found"]["ids"]) - set(payload["genes"])
-                            )
-                            geneset["not_found"]["count"] = len(geneset["not_found"]["ids"])
-                        geneset = update_taxid(geneset)
-                elif gene_operation == "add":
-                    query_results = await self._query_mygene(payload["genes"])
-                    new_genes = get_gene_list(query_results)
-                    old_genes = get_gene_list(geneset)
-                    geneset.update(
-                        {
-                            "genes": old_genes
-                            + [gene for gene in new_genes if gene not in old_genes]
-                        }
-                    )
-                    # Update count
-                    geneset["count"] = len(geneset["genes"])
-                    # Add not_found to not_found list
-                    if query_results.get("not_found"):
-                        if geneset.get("not_found") is None:
-                            geneset["not_found"] = {}
-                        geneset["not_found"]["ids"] = list(
-                            set(geneset.get("not_found", {}).get("ids", []))
-                            | set(query_results["not_found"]["ids"])
-                        )
-                        geneset["not_found"]["count"] = len(geneset["not_found"]["ids"])
-                    geneset = update_taxid(geneset)
-                else:
-                    raise HTTPError(
-                        400,
-                        reason="Argument 'gene operation' must be one of: 'replace', 'add', 'remove'.",
-                    )
+            gene_operation = self.get_argument("gene_operation", None)
             dry_run = self.get_argument("dry_run", default=None)
             if dry_run is None or dry_run.lower() == "false":
                 _now = datetime.now(timezone.utc).isoformat()
-                geneset.update({"updated": _now})
+                geneset, body = await self._update_user_geneset(
+                    geneset, payload, gene_operation, user, updated=_now
+                )
+                # Return the count of genes after the update, which a script computes in place
                 response = await self.biothings.elasticsearch.async_client.update(
-                    id=_id, body={"doc": geneset}, index=self.biothings.config.ES_USER_INDEX
+                    id=_id,
+                    body=body,
+                    index=self.biothings.config.ES_USER_INDEX,
+                    source_includes=["count"],
                 )
+                self.biothings.elasticsearch.pipeline.backend.response_cache.invalidate_user()
                 self.finish(
                     {
                         "success": True,
@@ -299,10 +526,15 @@ class UserGenesetHandler(BioThingsAuthnMixin, BaseAPIHandler):
                         "_id": response["_id"],
                         "name": document_name,
                         "author": document_owner,
-                        "count": geneset["count"],
+                        "count": response.get("get", {}).get("_source", {}).get(
+                            "count", geneset["count"]
+                        ),
                     }
                 )
             else:
+                geneset, _ = await self._update_user_geneset(
+                    geneset, payload, gene_operation, user
+                )
                 self.finish({"new_document": geneset})
         else:
             raise HTTPError(403, reason="You don't have permission to modify this document.")
@@ -320,6 +552,8 @@ class UserGenesetHandler(BioThingsAuthnMixin, BaseAPIHandler):
             response = await self.biothings.elasticsearch.async_client.delete(
                 id=_id, index=self.biothings.config.ES_USER_INDEX
             )
+            geneset_stats.invalidate()
+            self.biothings.elasticsearch.pipeline.backend.response_cache.invalidate_user()
             self.finish(
                 {
                     "success": True,
@@ -331,3 +565,361 @@ class UserGenesetHandler(BioThingsAuthnMixin, BaseAPIHandler):
             )
         else:
             raise HTTPError(403, reason="You don't have permission to delete this document.")
+
+
+class UserGenesetBulkHandler(UserGenesetHandler):
+    """
+    Create or update many user genesets with one request.
+    Bulk - POST ./user_geneset/bulk/
+
+    The body is a list of genesets, each with the body elements of
+    POST ./user_geneset/ to create it, or with its "_id", "gene_operation" and
+    the body elements of PUT ./user_geneset/<_id> to update it, at most once per
+    request. The genes of all the genesets are looked up with one mygene.info
+    query, and the genesets are written with one bulk request. Each geneset gets
+    its own result, in order.
+    """
+
+    SUPPORTED_METHODS = ("POST", "OPTIONS")
+
+    def _error_result(self, exc, item):
+        """Format an HTTPError as the result of a geneset, like BaseAPIHandler.write_error."""
+        result = {"code": exc.status_code, "success": False, "error": exc.reason}
+        if isinstance(item, dict) and item.get("_id") is not None:
+            result["_id"] = item["_id"]
+        return result
+
+    async def post(self):
+        """Create or update a list of user genesets."""
+        if self.current_user:
+            user = self.current_user["username"]
+        else:
+            user = None
+        if not self.request.body:
+            raise HTTPError(400, reason="Expecting a JSON body.")
+        try:
+            payload = json.loads(self.request.body)
+        except json.decoder.JSONDecodeError:
+            raise HTTPError(400, reason="Invalid JSON.")
+        if not isinstance(payload, list):
+            raise HTTPError(400, reason="Expecting a list of genesets.")
+        max_size = self.biothings.config.USER_GENESET_BULK_MAX_SIZE
+        if len(payload) > max_size:
+            raise HTTPError(400, reason=f"At most {max_size} genesets can be sent at once.")
+        client = self.biothings.elasticsearch.async_client
+        index = self.biothings.config.ES_USER_INDEX
+
+        results = [None] * len(payload)
+        items = {}
+        updated_ids = set()
+        for i, item in enumerate(payload):
+            try:
+                if not isinstance(item, dict):
+                    raise HTTPError(400, reason="Expecting a JSON object for each geneset.")
+                request_type = "PUT" if "_id" in item else "POST"
+                item = self._validate_input(request_type, item)
+                if request_type == "PUT" and not user:
+                    raise HTTPError(401, reason="You must log in first.")
+                if request_type == "POST" and not user and not item.get("is_public", True):
+                    raise HTTPError(403, reason="Anonymous users can only create public genesets.")
+                # Updates of the same geneset would all start from the same document
+                if request_type == "PUT" and item["_id"] in updated_ids:
+                    raise HTTPError(400, reason="A geneset can only be updated once per request.")
+            except HTTPError as exc:
+                results[i] = self._error_result(exc, item)
+                continue
+            items[i] = item
+            if "_id" in item:
+                updated_ids.add(item["_id"])
+
+        # Retrieve the documents to update in one request
+        ids = list(dict.fromkeys(item["_id"] for item in items.values() if "_id" in item))
+        documents = {}
+        if ids:
+            response = await client.mget(index=index, ids=ids)
+            documents = {doc["_id"]: doc["_source"] for doc in response["docs"] if doc.get("found")}
+        for i, item in list(items.items()):
+            if "_id" not in item:
+                continue
+            if item["_id"] not in documents:
+                exc = HTTPError(404, reason="Document does not exist.")
+            elif documents[item["_id"]].get("author") != user:
+                exc = HTTPError(403, reason="You don't have permission to modify this document.")
+            else:
+                continue
+            results[i] = self._error_result(exc, item)
+            del items[i]
+
+        # Look up the genes of all the genesets at once, removed genes don't need a lookup
+        genes = []
+        for item in items.values():
+            if "_id" not in item or item.get("gene_operation") in ("replace", "add"):
+                genes += item.get("genes") or []
+        lookup = await IOLoop.current().run_in_executor(
+            None, self._lookup_mygene, list(dict.fromkeys(genes))
+        )
+        dry_run = self.get_argument("dry_run", default=None)
+        dry_run = dry_run is not None and dry_run.lower() != "false"
+        _now = None
+        if not dry_run:
+            _now = str(datetime.now(timezone.utc).replace(microsecond=0).isoformat())
+        genesets = {}
+        operations = []
+        for i, item in items.items():
+            try:
+                if "_id" in item:
+                    genesets[i], body = await self._update_user_geneset(
+                        documents[item["_id"]],
+                        item,
+                        item.get("gene_operation"),
+                        user,
+                        lookup=lookup,
+                        updated=_now,
+                    )
+                    operations.append(({"update": {"_id": item["_id"]}}, body))
+                else:
+                    genesets[i] = await self._create_user_geneset(
+                        item["name"],
+                        user,
+                        item["genes"],
+                        item.get("is_public", True),
+                        item.get("description"),
+                        lookup=lookup,
+                    )
+                    if not dry_run:
+                        genesets[i].update({"created": _now, "updated": _now})
+                    operations.append(({"create": {"_id": generate_geneset_id()}}, genesets[i]))
+            except HTTPError as exc:
+                results[i] = self._error_result(exc, item)
+
+        if dry_run:
+            for i, geneset in genesets.items():
+                results[i] = {"new_document": geneset}
+            self.finish({"success": all("code" not in r for r in results), "items": results})
+            return
+
+        created = False
+        if operations:
+            response = await client.bulk(
+                operations=[line for operation in operations for line in operation], index=index
+            )
+            for i, response_item in zip(genesets, response["items"]):
+                ((action, status),) = response_item.items()
+                if "error" in status:
+                    exc = HTTPError(status["status"], reason=status["error"].get("reason"))
+                    results[i] = self._error_result(exc, items[i])
+                else:
+                    created = created or action == "create"
+                    results[i] = {
+                        "success": True,
+                        "result": status["result"],
+                        "_id": status["_id"],
+                        "name": genesets[i]["name"],
+                        "author": genesets[i].get("author"),
+                        "count": genesets[i]["count"],
+                    }
+        if genesets:
+            # Updates don't change the author, so only creation and deletion change the counts
+            if created:
+                geneset_stats.invalidate()
+            self.biothings.elasticsearch.pipeline.backend.response_cache.invalidate_user()
+        self.finish({"success": all("code" not in r for r in results), "items": results})
+
+
+class MyGenesetEnrichHandler(BaseAPIHandler):
+    """
+    Gene set enrichment analysis of a list of genes.
+    POST ./enrich
+    """
+
+    name = "enrich"
+
+    async def post(self):
+        genesets = await self.biothings.elasticsearch.pipeline.backend.enrichment.get()
+        if genesets is None:
+            raise HTTPError(503, reason="Genesets are not available for enrichment yet.")
+        if not self.args.species.isdigit():
+            raise HTTPError(400, reason="Body element 'species' must be a taxid or a species name.")
+        if not 0 <= self.args.max_fdr <= 1:
+            raise HTTPError(400, reason="Body element 'max_fdr' must be between 0 and 1.")
+        sources = None if "all" in self.args.source else self.args.source
+        results = genesets.enrich(
+            [str(gene) for gene in self.args.genes],
+            self.args.species,
+            sources=sources,
+            max_fdr=self.args.max_fdr,
+            size=self.args.size,
+        )
+        if results is None:
+            raise HTTPError(
+                404, None, {"species": self.args.species}, reason="No genesets for species."
+            )
+        self.finish(results)
+
+
+class MyGenesetGene2GenesetsHandler(BioThingsAuthnMixin, BaseAPIHandler):
+    """
+    Genesets that contain each of a list of genes.
+    GET ./gene2genesets?ids=<ids>
+    POST ./gene2genesets
+    """
+
+    name = "gene2genesets"
+
+    def _validate_input(self):
+        for scope in self.args.scopes:
+            if scope not in GENE_SCOPES:
+                raise HTTPError(
+                    400, reason="Scopes must be some of: {}.".format(", ".join(GENE_SCOPES))
+                )
+        if "all" not in self.args.species and not all(
+            taxid.isdigit() for taxid in self.args.species
+        ):
+            raise HTTPError(400, reason="cannot map some species to taxids.")
+
+    async def _find_user_genesets(self, ids, results):
+        """Add the user genesets of `ids` to `results`, from Elasticsearch."""
+        queries = {}
+        for gene in ids:
+            queries.setdefault(gene.lower(), []).append(gene)
+        query = {
+            "bool": {
+                "should": [{"terms": {"genes." + scope: ids}} for scope in self.args.scopes],
+                "minimum_should_match": 1,
+                "filter": [{"term": {"is_public": True}}],
+            }
+        }
+        if self.current_user:
+            query["bool"]["filter"] = [
+                {
+                    "bool": {
+                        "should": [
+                            {"term": {"is_public": True}},
+                            {"term": {"author": self.current_user["username"]}},
+                        ]
+                    }
+                }
+            ]
+        if "all" not in self.args.species:
+            query["bool"]["filter"].append({"terms": {"taxid": self.args.species}})
+        fields = ["name", "taxid", "genes.taxid"] + ["genes." + scope for scope in self.args.scopes]
+        async for hit in async_scan(
+            self.biothings.elasticsearch.async_client,
+            index=self.biothings.config.ES_USER_INDEX,
+            query={"query": query, "_source": fields},
+        ):
+            geneset = {"_id": hit["_id"], "name": hit["_source"].get("name")}
+            for gene in as_list(hit["_source"].get("genes")):
+                taxid = str(gene.get("taxid", hit["_source"].get("taxid")))
+                if "all" not in self.args.species and taxid not in self.args.species:
+                    continue
+                for scope in self.args.scopes:
+                    for alias in as_list(gene.get(scope)):
+                        for query_gene in queries.get(str(alias).lower(), []):
+                            genesets = results[query_gene].setdefault("user", {})
+                            genesets = genesets.setdefault(taxid, [])
+                            if geneset not in genesets:
+                                genesets.append(geneset)
+
+    async def post(self):
+        self._validate_input()
+        ids = [str(gene) for gene in self.args.ids]
+        taxids = None if "all" in self.args.species else self.args.species
+        sources = None if "all" in self.args.source else self.args.source
+        results = {gene: {} for gene in ids}
+        if self.args.include in ("all", "curated"):
+            genesets = await self.biothings.elasticsearch.pipeline.backend.enrichment.get()
+            if genesets is None:
+                raise HTTPError(503, reason="Curated genesets are not available yet.")
+            results = genesets.find(ids, self.args.scopes, taxids=taxids, sources=sources)
+        # User genesets change all the time, so they are always read from Elasticsearch
+        if self.args.include in ("all", "user") and (sources is None or "user" in sources):
+            await self._find_user_genesets(ids, results)
+        response = []
+        for gene in ids:
+            memberships = results[gene]
+            if memberships:
+                count = sum(
+                    len(genesets)
+                    for by_taxid in memberships.values()
+                    for genesets in by_taxid.values()
+                )
+                response.append({"query": gene, "count": count, "genesets": memberships})
+            else:
+                response.append({"query": gene, "notfound": True})
+        self.finish(response)
+
+    get = post
+
+
+class MyGenesetSimilarHandler(BioThingsAuthnMixin, BaseAPIHandler):
+    """
+    Curated genesets most similar to a geneset, by Jaccard index.
+    GET ./geneset/<_id>/similar
+    POST ./similar
+    """
+
+    name = "similar"
+
+    async def _get_user_geneset_genes(self, _id):
+        """Return the taxid and mygene ids of a user geneset the user can see."""
+        try:
+            document = await self.biothings.elasticsearch.async_client.get(
+                id=_id,
+                index=self.biothings.config.ES_USER_INDEX,
+                _source=["is_public", "author", "taxid", "genes.mygene_id", "genes.taxid"],
+            )
+        except elasticsearch.exceptions.NotFoundError:
+            raise HTTPError(404, None, {"id": _id}, reason="Document does not exist.")
+        geneset = document["_source"]
+        user = self.current_user["username"] if self.current_user else None
+        if not geneset.get("is_public") and (user is None or geneset.get("author") != user):
+            raise HTTPError(404, None, {"id": _id}, reason="Document does not exist.")
+        genes = as_list(geneset.get("genes"))
+        if not genes:
+            raise HTTPError(400, None, {"id": _id}, reason="Geneset has no genes.")
+        # Multi-species genesets are compared in their main species
+        taxids = Counter(str(gene.get("taxid", geneset.get("taxid"))) for gene in genes)
+        taxid = taxids.most_common(1)[0][0]
+        mygene_ids = [
+            mygene_id
+            for gene in genes
+            if str(gene.get("taxid", geneset.get("taxid"))) == taxid
+            for mygene_id in as_list(gene.get("mygene_id"))
+        ]
+        return taxid, mygene_ids
+
+    async def _get_similar(self, genes, taxid, exclude=None):
+        genesets = await self.biothings.elasticsearch.pipeline.backend.enrichment.get()
+        if genesets is None:
+            raise HTTPError(503, reason="Curated genesets are not available yet.")
+        hits = genesets.similar(
+            genes,
+            taxid,
+            exclude=exclude,
+            sources=None if "all" in self.args.source else self.args.source,
+            min_jaccard=self.args.min_jaccard,
+            size=self.args.size,
+        )
+        return {"taxid": taxid, "hits": hits or []}
+
+    async def get(self, _id=None):
+        if _id is None:
+            raise HTTPError(405)
+        genesets = await self.biothings.elasticsearch.pipeline.backend.enrichment.get()
+        curated = genesets.get_genes(_id) if genesets is not None else None
+        if curated is not None:
+            taxid, genes = curated
+        else:
+            taxid, genes = await self._get_user_geneset_genes(_id)
+        results = await self._get_similar(genes, taxid, exclude=_id)
+        results["query"] = _id
+        self.finish(results)
+
+    async def post(self, _id=None):
+        if _id is not None:
+            raise HTTPError(405)
+        if not self.args.species.isdigit():
+            raise HTTPError(400, reason="Body element 'species' must be a taxid or a species name.")
+        genes = [str(gene) for gene in self.args.genes]
+        self.finish(await self._get_similar(genes, self.args.species))
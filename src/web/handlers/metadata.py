@@ -2,11 +2,97 @@
 API handler for MyGeneset submit/ endpoint
 """
 
+import asyncio
+import functools
+import logging
+import time
 
 from biothings.web.handlers import MetadataSourceHandler
 from elasticsearch.exceptions import NotFoundError
 
 
+class GenesetStatsCache:
+    """
+    Geneset counts shared by all the requests of this process.
+
+    Counts are served from memory for `ttl` seconds. After that, the cached
+    counts are still served while new ones are fetched in the background.
+    Only the first request after `invalidate()`, or on startup, waits for
+    the counts, and concurrent requests share the same fetch.
+    """
+
+    def __init__(self):
+        self.stats = None
+        self.updated = 0
+        # Incremented by `invalidate()`, so that counts fetched before are dropped
+        self.generation = 0
+        self.refreshing = None
+
+    def invalidate(self):
+        """Drop the cached counts, e.g. after a user geneset is created or deleted."""
+        self.stats = None
+        self.generation += 1
+        self.refreshing = None
+
+    async def _refresh(self, count_stats):
+        generation = self.generation
+        try:
+            stats = await count_stats()
+            if generation == self.generation:
+                self.stats = stats
+                self.updated = time.monotonic()
+            return stats
+        except Exception:
+            if self.stats is None:
+                # Raised to the requests waiting for the counts
+                raise
+            # Nobody awaits a background refresh, the stale counts are served until the next one
+            logging.exception("Could not refresh the geneset counts")
+            return self.stats
+        finally:
+            if generation == self.generation:
+                self.refreshing = None
+
+    async def get(self, count_stats, ttl):
+        """
+        Return the cached counts, calling the coroutine function `count_stats`
+        to fetch them when they're missing or older than `ttl` seconds.
+        """
+        if self.refreshing is None and (
+            self.stats is None or time.monotonic() - self.updated > ttl
+        ):
+            self.refreshing = asyncio.ensure_future(self._refresh(count_stats))
+        if self.stats is None:
+            return await asyncio.shield(self.refreshing)
+        return self.stats
+
+
+geneset_stats = GenesetStatsCache()
+
+
+async def count_geneset_stats(biothings):
+    """Count the curated, user and anonymous genesets, with concurrent requests."""
+    client = biothings.elasticsearch.async_client
+    config = biothings.config
+
+    async def count(index, body=None):
+        try:
+            result = await client.count(index=index, body=body)
+            return result["count"]
+        except NotFoundError:
+            return 0
+
+    curated, user, anonymous = await asyncio.gather(
+        count(config.ES_CURATED_INDEX),
+        count(config.ES_USER_INDEX),
+        count(
+            config.ES_USER_INDEX,
+            body='{"query": {"bool": {"must_not": {"exists": {"field": "author"}}}}}',
+        ),
+    )
+    return {"curated": curated, "user": user, "anonymous": anonymous}
+
+
 class MyGenesetMetadataSourceHandler(MetadataSourceHandler):
     """ "
     Handler for GET /metadata
@@ -23,37 +109,6 @@ class MyGenesetMetadataSourceHandler(MetadataSourceHandler):
     }
     """
 
-    async def _count_curated(self):
-        """Fetch a geneset document from Elasticsearch"""
-        try:
-            result = await self.biothings.elasticsearch.async_client.count(
-                index=self.biothings.config.ES_CURATED_INDEX
-            )
-            return result["count"]
-        except NotFoundError:
-            return 0
-
-    async def _count_user(self):
-        """Fetch a geneset document from Elasticsearch"""
-        try:
-            result = await self.biothings.elasticsearch.async_client.count(
-                index=self.biothings.config.ES_USER_INDEX
-            )
-            return result["count"]
-        except NotFoundError:
-            return 0
-
-    async def _count_anonymous(self):
-        """Fetch a geneset document from Elasticsearch"""
-        try:
-            result = await self.biothings.elasticsearch.async_client.count(
-                body='{"query": {"bool": {"must_not": {"exists": {"field": "author"}}}}}',
-                index=self.biothings.config.ES_USER_INDEX,
-            )
-            return result["count"]
-        except NotFoundError:
-            return 0
-
     async def get(self):
         info = await self.metadata.refresh(self.biothing_type)
         meta = self.metadata.get_metadata(self.biothing_type)
@@ -73,8 +128,11 @@ class MyGenesetMetadataSourceHandler(MetadataSourceHandler):
         self.finish(dict(sorted(meta.items())))
 
     async def extras(self, _meta):
-        _meta["stats"]["curated"] = await self._count_curated()
-        _meta["stats"]["user"] = await self._count_user()
-        _meta["stats"]["anonymous"] = await self._count_anonymous()
+        # The counts may be refreshed after this request is finished, so they must not need it
+        stats = await geneset_stats.get(
+            functools.partial(count_geneset_stats, self.biothings),
+            ttl=self.biothings.config.METADATA_STATS_TTL,
+        )
+        _meta["stats"].update(stats)
 
         return _meta
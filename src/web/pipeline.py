@@ -1,8 +1,88 @@
 import config
-from biothings.web.query import ESQueryBuilder
+from biothings.web.query import ESQueryBuilder, ESResultFormatter
 from elasticsearch_dsl import Q, Search
 from tornado.web import HTTPError
 
+# Fields of the gene objects of genesets
+GENE_FIELDS = [
+    "mygene_id",
+    "source_id",
+    "symbol",
+    "name",
+    "ncbigene",
+    "ensemblgene",
+    "uniprot",
+    "taxid",
+]
+
+# First `size` symbols of the genes of a geneset, read on the Elasticsearch nodes
+GENE_SAMPLE_SCRIPT = """
+def genes = params['_source']['genes'];
+List sample = new ArrayList();
+if (genes == null) {
+    return sample;
+}
+if (!(genes instanceof List)) {
+    genes = [genes];
+}
+for (def gene : genes) {
+    if (sample.size() >= params.size) {
+        break;
+    }
+    if (gene['symbol'] != null) {
+        sample.add(gene['symbol']);
+    }
+}
+return sample;
+"""
+
+
+def _is_gene_field(field):
+    return field == "genes" or field.startswith("genes.")
+
+
+def get_compact_source(fields, gene_format):
+    """
+    Return the `_source` fields to fetch for `gene_format`: "ids" only
+    fetches the mygene ids of the genes, and "summary" none of them.
+    """
+    if isinstance(fields, list) and "all" not in fields:
+        includes = [field for field in fields if not field.startswith("-")]
+        if includes and not any(_is_gene_field(field) for field in includes):
+            return fields
+        fields = [field for field in fields if not _is_gene_field(field.lstrip("-"))]
+        if gene_format == "ids":
+            return fields + ["genes.mygene_id"]
+        if includes and "count" not in fields:
+            fields.append("count")
+        return fields + ["-genes"]
+    if gene_format == "ids":
+        return ["-genes." + field for field in GENE_FIELDS if field != "mygene_id"]
+    return ["-genes"]
+
+
+def compact_genes(doc, gene_format):
+    """
+    Replace the genes of a geneset hit fetched for `gene_format`: a list of
+    mygene ids for "ids", and the sample of symbols of GENE_SAMPLE_SCRIPT
+    for "summary".
+    """
+    if gene_format == "ids":
+        if "genes" in doc:
+            genes = doc["genes"] if isinstance(doc["genes"], list) else [doc["genes"]]
+            mygene_ids = []
+            for gene in genes:
+                mygene_id = gene.get("mygene_id")
+                if isinstance(mygene_id, list):
+                    mygene_ids.extend(mygene_id)
+                elif mygene_id is not None:
+                    mygene_ids.append(mygene_id)
+            doc["genes"] = mygene_ids
+    elif gene_format == "summary":
+        fields = doc.pop("fields", None) or {}
+        doc["gene_sample"] = fields.get("gene_sample", [])
+    return doc
+
 
 class MyGenesetQueryBuilder(ESQueryBuilder):
     def apply_extras(self, search, options):
@@ -56,4 +136,23 @@ class MyGenesetQueryBuilder(ESQueryBuilder):
             elif options.include == "anonymous":
                 search = search.query().exclude("exists", field="author")
 
+        if options.gene_format in ("summary", "ids"):
+            # Leave the gene objects in Elasticsearch, they can be megabytes per hit
+            options._source = get_compact_source(options._source, options.gene_format)
+            if options.gene_format == "summary":
+                search = search.script_fields(
+                    gene_sample={
+                        "script": {
+                            "source": GENE_SAMPLE_SCRIPT,
+                            "params": {"size": options.gene_sample},
+                        }
+                    }
+                )
+
         return super().apply_extras(search, options)
+
+
+class MyGenesetResultFormatter(ESResultFormatter):
+    def _transform_hit(self, doc, options):
+        compact_genes(doc, options.get("gene_format"))
+        super()._transform_hit(doc, options)